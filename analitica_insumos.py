@@ -0,0 +1,88 @@
+from cache_backend import cache_compartido, invalidar, invalidar_todo
+from database import get_db_cursor, fetch_frame, ttl_lecturas
+
+# ==========================================
+# 📊 ANALÍTICA DE INSUMOS
+# ==========================================
+# Gasto, consumo y precio promedio por producto, tipo y lote, mes a mes.
+# Se lee de resumen_mensual_insumos (una fila por owner/mes/lote/producto/tipo,
+# que add_insumo va sumando), no de la tabla cruda: planificar compras sobre
+# varias temporadas no recorre miles de registros. Las cuatro vistas salen de
+# una sola consulta con GROUPING SETS.
+
+DIMENSIONES = ("producto", "tipo", "lote")
+
+_SQL_ANALITICA = """
+    SELECT mes AS "Mes",
+           CASE GROUPING(producto, tipo, lote)
+               WHEN 3 THEN 'producto' WHEN 5 THEN 'tipo' WHEN 6 THEN 'lote' ELSE 'total'
+           END AS "Dimensión",
+           COALESCE(producto, tipo, lote, 'Total') AS "Valor",
+           SUM(cantidad) AS "Cantidad", SUM(gasto) AS "Gasto", SUM(registros) AS "Registros",
+           SUM(gasto) / NULLIF(SUM(cantidad), 0) AS "Precio Medio",
+           MIN(precio_min) AS "Precio Mín", MAX(precio_max) AS "Precio Máx",
+           SUM(gasto) / NULLIF(SUM(cantidad), 0)
+               - LAG(SUM(gasto) / NULLIF(SUM(cantidad), 0)) OVER (
+                   PARTITION BY GROUPING(producto, tipo, lote), producto, tipo, lote ORDER BY mes
+               ) AS "Var. Precio"
+    FROM resumen_mensual_insumos
+    WHERE owner = %s AND mes >= date_trunc('month', %s::date) AND mes <= %s
+    GROUP BY GROUPING SETS ((mes, producto), (mes, tipo), (mes, lote), (mes))
+    ORDER BY "Dimensión", "Valor", mes
+"""
+
+@cache_compartido(ttl=ttl_lecturas, tablas=("insumos",))
+def analitica_insumos(owner, desde, hasta):
+    """
+    DataFrame largo: una fila por (Mes, Dimensión, Valor) con cantidad, gasto,
+    precio medio/mín/máx y variación del precio medio contra el mes anterior.
+    Dimensión ∈ producto | tipo | lote | total.
+    """
+    return fetch_frame(_SQL_ANALITICA, (owner, desde, hasta))
+
+def vista(df, dimension, medida="Gasto"):
+    """Tabla Mes x Valor de una dimensión (para gráficos)."""
+    parte = df[df["Dimensión"] == dimension]
+    return parte.pivot_table(index="Mes", columns="Valor", values=medida, aggfunc="sum")
+
+def resumen_por(df, dimension):
+    """Totales del periodo por valor de la dimensión, con el último precio medio."""
+    parte = df[df["Dimensión"] == dimension]
+    if parte.empty:
+        return parte
+    ultimo = parte.groupby("Valor").tail(1).set_index("Valor")
+    total = parte.groupby("Valor")[["Cantidad", "Gasto", "Registros"]].sum()
+    total["Precio Medio"] = total["Gasto"] / total["Cantidad"].where(total["Cantidad"] != 0)
+    total["Último Precio"] = ultimo["Precio Medio"]
+    total["Var. Último Mes"] = ultimo["Var. Precio"]
+    return total.sort_values("Gasto", ascending=False).reset_index()
+
+def reconstruir_resumen_insumos(owner=None):
+    """
+    Rehace resumen_mensual_insumos desde la tabla cruda (para datos viejos o
+    cargados por fuera de add_insumo). Solo toca los meses que siguen en
+    insumos: los de temporadas ya archivadas (archivar.py) se conservan.
+    Retorna cuántas filas quedaron.
+    """
+    filtro = "WHERE owner = %(o)s" if owner else ""
+    with get_db_cursor(clase="masiva") as (cur, conn):
+        cur.execute(f"""
+            DELETE FROM resumen_mensual_insumos r
+            USING (SELECT DISTINCT owner, date_trunc('month', fecha)::date AS mes FROM insumos {filtro}) m
+            WHERE r.owner = m.owner AND r.mes = m.mes
+        """, {"o": owner})
+        cur.execute(f"""
+            INSERT INTO resumen_mensual_insumos (owner, mes, lote, producto, tipo, cantidad, gasto, registros, precio_min, precio_max)
+            SELECT owner, date_trunc('month', fecha)::date, COALESCE(lote, ''), COALESCE(producto, ''), COALESCE(tipo, ''),
+                   SUM(cantidad), SUM(costo_total), COUNT(*), MIN(precio_unitario), MAX(precio_unitario)
+            FROM insumos {filtro}
+            GROUP BY 1, 2, 3, 4, 5
+        """, {"o": owner})
+        filas = cur.rowcount
+        conn.commit()
+    # Con backend compartido (SQLite) también lo ve la app si esto corre desde archivar.py
+    if owner:
+        invalidar(owner, "insumos")
+    else:
+        invalidar_todo()
+    return filas
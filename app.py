@@ -1,6 +1,10 @@
 import streamlit as st
 import datetime
-from database import verify_user, create_user
+from auth import verificar, iniciar_sesion, restaurar_sesion, cerrar_sesion
+from perfilador import perfilar_pagina
+
+# Modo perfil (?perfil=1): vuelve a correr esta página dentro de cProfile
+perfilar_pagina(__file__)
 
 # 1. CONFIGURACIÓN
 st.set_page_config(
@@ -78,6 +82,8 @@ st.markdown("""
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
     st.session_state.user = ""
+    # Reconexión del navegador: el token firmado de la URL evita otro bcrypt
+    restaurar_sesion()
 
 if not st.session_state.logged_in:
     st.markdown("<br><br>", unsafe_allow_html=True)
@@ -88,12 +94,12 @@ if not st.session_state.logged_in:
         st.markdown("<br>", unsafe_allow_html=True)
         st.markdown("""<style>div.stButton > button { height: 45px !important; justify-content: center !important; padding-left: 0 !important;}</style>""", unsafe_allow_html=True)
         if st.button("ENTRAR", type="primary", use_container_width=True):
-            if verify_user(u, p):
-                st.session_state.logged_in = True
-                st.session_state.user = u
+            ok, mensaje = verificar(u, p)
+            if ok:
+                iniciar_sesion(u)
                 st.rerun()
             else:
-                st.error("Error")
+                st.error(mensaje)
     st.stop()
 
 # 4. ENCABEZADO
@@ -128,5 +134,8 @@ col_salir, _ = st.columns([1, 2])
 with col_salir:
     st.markdown("""<style>div.row-widget.stButton > button[kind="secondary"] { height: 40px !important; border-color: #555 !important; justify-content: center !important; padding-left: 0 !important; }</style>""", unsafe_allow_html=True)
     if st.button("🔒 Salir", type="secondary"):
-        st.session_state.logged_in = False
+        cerrar_sesion()
+        st.rerun()
+    if st.button("🔒 Salir de todos los equipos", type="secondary"):
+        cerrar_sesion(todas=True)
         st.rerun()
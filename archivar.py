@@ -0,0 +1,94 @@
+"""
+Mantenimiento de particiones por temporada de cosecha.
+
+Ejemplos:
+    python archivar.py crear                      # tablas nuevas ya particionadas
+    python archivar.py migrar                     # convierte tablas existentes
+    python archivar.py particiones 2026           # pre-crea la temporada 2026
+    python archivar.py archivar 2023 --destino parquet --dir archivo/
+    python archivar.py resumen 2023 2024          # acumulado diario para rentabilidad
+    python archivar.py resumen-insumos            # rehace el acumulado mensual de insumos
+    python archivar.py recomendaciones            # llena/rehace las recomendaciones de suelo
+"""
+import argparse
+import logging
+
+from database import (
+    TABLAS_PARTICIONABLES, create_all_tables, migrar_a_particionado,
+    asegurar_particiones, archivar_temporada, get_db_cursor, rango_temporada
+)
+from rentabilidad import refrescar_resumen_diario
+from analitica_insumos import reconstruir_resumen_insumos
+from suelos import recalcular_recomendaciones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Particiones y archivo de temporadas")
+    parser.add_argument("--tablas", nargs="+", default=list(TABLAS_PARTICIONABLES), choices=TABLAS_PARTICIONABLES)
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    sub.add_parser("crear", help="Crea todas las tablas con las operativas particionadas")
+    sub.add_parser("migrar", help="Convierte tablas operativas existentes a particionadas")
+
+    p_part = sub.add_parser("particiones", help="Asegura particiones para temporadas dadas")
+    p_part.add_argument("temporadas", nargs="+", type=int)
+
+    p_arch = sub.add_parser("archivar", help="Saca una temporada cerrada de las tablas calientes")
+    p_arch.add_argument("temporada", type=int)
+    p_arch.add_argument("--destino", choices=["particion", "parquet"], default="particion")
+    p_arch.add_argument("--dir", default="archivo", help="Carpeta destino para Parquet")
+
+    p_res = sub.add_parser("resumen", help="Recalcula el acumulado diario por lote de temporadas dadas")
+    p_res.add_argument("temporadas", nargs="+", type=int)
+    p_res.add_argument("--owner", help="Solo este usuario (por defecto todos)")
+
+    p_ins = sub.add_parser("resumen-insumos", help="Rehace resumen_mensual_insumos desde la tabla cruda")
+    p_ins.add_argument("--owner", help="Solo este usuario (por defecto todos)")
+
+    p_rec = sub.add_parser("recomendaciones", help="Recalcula recomendaciones_suelo de todos los lotes con análisis")
+    p_rec.add_argument("--owner", help="Solo este usuario (por defecto todos)")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.comando == "crear":
+        create_all_tables(particionado=True)
+        print("✅ Tablas creadas (operativas particionadas por temporada).")
+
+    elif args.comando == "migrar":
+        for tabla in args.tablas:
+            try:
+                cambiada = migrar_a_particionado(tabla)
+            except ValueError as e:
+                print(f"❌ {e}")
+                continue
+            print(f"{'✅' if cambiada else '·'} {tabla}: {'migrada' if cambiada else 'ya estaba particionada'}")
+
+    elif args.comando == "particiones":
+        with get_db_cursor(clase="masiva") as (cur, conn):
+            for tabla in args.tablas:
+                creadas = asegurar_particiones(cur, tabla, args.temporadas)
+                print(f"✅ {tabla}: {', '.join(creadas)}")
+            conn.commit()
+
+    elif args.comando == "archivar":
+        for tabla in args.tablas:
+            destino = archivar_temporada(tabla, args.temporada, args.destino, args.dir)
+            print(f"📦 {tabla} temporada {args.temporada} -> {destino}")
+
+    elif args.comando == "resumen":
+        for temporada in args.temporadas:
+            filas = refrescar_resumen_diario(*rango_temporada(temporada), owner=args.owner)
+            print(f"📊 temporada {temporada}: {filas} filas en resumen_diario_lote")
+
+    elif args.comando == "resumen-insumos":
+        filas = reconstruir_resumen_insumos(args.owner)
+        print(f"📊 {filas} filas en resumen_mensual_insumos")
+
+    elif args.comando == "recomendaciones":
+        filas = recalcular_recomendaciones(args.owner)
+        print(f"🧪 {filas} recomendaciones de suelo al día")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import os
+import hmac
+import time
+import base64
+import hashlib
+import logging
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturoVencido
+
+import bcrypt
+import streamlit as st
+
+from database import (
+    get_password_hash, set_password_hash, create_user,
+    get_sesion_version, cerrar_sesiones, revocar_sesion, sesion_revocada,
+)
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# 🔐 AUTENTICACIÓN (BCRYPT FUERA DEL SCRIPT)
+# ==========================================
+# bcrypt.checkpw cuesta ~250 ms de CPU por intento. Corre en un pool acotado
+# de hilos (bcrypt suelta el GIL mientras hashea): las demás sesiones siguen
+# atendiendo y los intentos simultáneos no pasan de FINCA_BCRYPT_HILOS.
+# Un login correcto emite un token firmado (HMAC, FINCA_SESSION_SECRET) que
+# queda en la URL (?s=...): si el navegador se reconecta, la sesión vuelve
+# sin hashear otra vez. Como la URL se comparte y queda en el historial, el
+# token dura poco (FINCA_SESSION_HORAS, se renueva mientras la sesión se
+# usa), lleva firmada la versión de credenciales del usuario
+# (users.sesion_version: cerrar_sesiones invalida todos) y los tokens de
+# "Salir" se anotan en la BD, así que valen para todas las réplicas.
+# Las claves viejas en texto plano y los hashes con
+# menos rondas que FINCA_BCRYPT_ROUNDS se re-hashean en segundo plano.
+# Los fallos repetidos por usuario se frenan con un contador en memoria.
+
+RONDAS = int(os.getenv("FINCA_BCRYPT_ROUNDS", "12"))   # afinar con benchmarks/bench_bcrypt.py
+HILOS_BCRYPT = int(os.getenv("FINCA_BCRYPT_HILOS", str(min(4, os.cpu_count() or 1))))
+ESPERA_MAX_S = 20          # si el pool está tan lleno, mejor decir "intente de nuevo"
+HORAS_SESION = float(os.getenv("FINCA_SESSION_HORAS", "2"))
+PARAM_TOKEN = "s"
+
+# Freno de fallos: tras MAX_FALLOS en VENTANA_S, bloqueo que se duplica en cada fallo extra
+MAX_FALLOS = 5
+VENTANA_S = 15 * 60
+BLOQUEO_BASE_S = 30
+
+_SECRETO = os.getenv("FINCA_SESSION_SECRET", "").encode()
+if not _SECRETO:
+    # Sin secreto fijo los tokens valen solo mientras viva este proceso
+    logger.warning("FINCA_SESSION_SECRET no está definida: se usa un secreto aleatorio por proceso")
+    _SECRETO = secrets.token_bytes(32)
+
+
+@st.cache_resource
+def get_executor_bcrypt():
+    return ThreadPoolExecutor(max_workers=HILOS_BCRYPT, thread_name_prefix="bcrypt")
+
+
+def _hashear(clave, rondas=RONDAS):
+    return bcrypt.hashpw(clave.encode("utf-8"), bcrypt.gensalt(rondas)).decode("utf-8")
+
+def _comprobar(clave, guardado):
+    try:
+        return bcrypt.checkpw(clave.encode("utf-8"), guardado.encode("utf-8"))
+    except ValueError:
+        return False
+
+def _rondas_de(guardado):
+    """$2b$12$... -> 12."""
+    try:
+        return int(guardado.split("$")[2])
+    except (IndexError, ValueError):
+        return 0
+
+def _en_pool(funcion, *args):
+    """Corre en el pool de bcrypt y espera (sin el GIL: las otras sesiones siguen)."""
+    return get_executor_bcrypt().submit(funcion, *args).result(timeout=ESPERA_MAX_S)
+
+
+# --- Freno de fallos repetidos ---
+
+class Limitador:
+    """Fallos recientes por llave (usuario) y bloqueo exponencial. Por proceso, thread-safe."""
+
+    def __init__(self, max_fallos=MAX_FALLOS, ventana=VENTANA_S, bloqueo_base=BLOQUEO_BASE_S):
+        self.max_fallos, self.ventana, self.bloqueo_base = max_fallos, ventana, bloqueo_base
+        self._lock = threading.Lock()
+        self._fallos = {}   # llave -> (cuenta, primer fallo, bloqueado hasta)
+
+    def espera(self, llave):
+        """Segundos que faltan para poder intentar (0 = puede)."""
+        with self._lock:
+            cuenta, inicio, hasta = self._fallos.get(llave, (0, 0.0, 0.0))
+        return max(0.0, hasta - time.time())
+
+    def fallo(self, llave):
+        ahora = time.time()
+        with self._lock:
+            cuenta, inicio, _ = self._fallos.get(llave, (0, ahora, 0.0))
+            if ahora - inicio > self.ventana:
+                cuenta, inicio = 0, ahora
+            cuenta += 1
+            hasta = 0.0
+            if cuenta >= self.max_fallos:
+                hasta = ahora + min(self.ventana, self.bloqueo_base * 2 ** (cuenta - self.max_fallos))
+            self._fallos[llave] = (cuenta, inicio, hasta)
+            if len(self._fallos) > 10000:
+                self._purgar(ahora)
+
+    def exito(self, llave):
+        with self._lock:
+            self._fallos.pop(llave, None)
+
+    def _purgar(self, ahora):
+        for llave in [k for k, (_, inicio, hasta) in self._fallos.items()
+                      if ahora - inicio > self.ventana and hasta < ahora]:
+            del self._fallos[llave]
+
+LIMITADOR = Limitador()
+
+
+# --- Tokens de sesión ---
+
+def _firma(cuerpo):
+    return hmac.new(_SECRETO, cuerpo.encode("utf-8"), hashlib.sha256).hexdigest()
+
+def _leer_token(token):
+    """(usuario, version, expira, firma) si la firma es buena; si no, None."""
+    try:
+        usuario, version, expira, firma = base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8").rsplit("|", 3)
+        version, expira = int(version), int(expira)
+    except (ValueError, UnicodeError):
+        return None
+    if not hmac.compare_digest(firma, _firma(f"{usuario}|{version}|{expira}")):
+        return None
+    return usuario, version, expira, firma
+
+def emitir_token(usuario, horas=HORAS_SESION):
+    cuerpo = f"{usuario}|{get_sesion_version(usuario) or 0}|{int(time.time() + horas * 3600)}"
+    return base64.urlsafe_b64encode(f"{cuerpo}|{_firma(cuerpo)}".encode("utf-8")).decode("ascii")
+
+def validar_token(token):
+    """Usuario del token si la firma es buena, no venció, su versión es la vigente y no se revocó; si no, None."""
+    leido = _leer_token(token)
+    if leido is None:
+        return None
+    usuario, version, expira, firma = leido
+    if expira < time.time() or version != get_sesion_version(usuario) or sesion_revocada(firma):
+        return None
+    return usuario
+
+def revocar_token(token):
+    leido = _leer_token(token)
+    if leido is not None and leido[2] > time.time():
+        revocar_sesion(leido[3], leido[2])
+
+
+# --- Verificación ---
+
+_hash_senuelo = None
+
+def _actualizar_hash(usuario, clave, anterior):
+    """En el pool de bcrypt: texto plano o pocas rondas -> hash con RONDAS."""
+    try:
+        if set_password_hash(usuario, _hashear(clave), anterior):
+            logger.info("Clave de %s re-hasheada con %d rondas", usuario, RONDAS)
+    except Exception:
+        logger.exception("No se pudo re-hashear la clave de %s", usuario)
+
+def verificar(usuario, clave):
+    """
+    (ok, mensaje). El bcrypt corre en el pool; la espera no frena a las
+    otras sesiones. Respeta el freno de fallos del usuario.
+    """
+    global _hash_senuelo
+    llave = usuario.strip().lower()
+    espera = LIMITADOR.espera(llave)
+    if espera:
+        return False, f"⏳ Demasiados intentos. Espere {espera:.0f} s."
+
+    guardado = get_password_hash(usuario)
+    try:
+        if guardado is None:
+            # Mismo costo que un usuario real: no revelar cuáles existen
+            if _hash_senuelo is None:
+                _hash_senuelo = _en_pool(_hashear, secrets.token_hex(8))
+            _en_pool(_comprobar, clave, _hash_senuelo)
+            ok = False
+        elif guardado.startswith("$2"):
+            ok = _en_pool(_comprobar, clave, guardado)
+        else:
+            # Clave vieja en texto plano
+            ok = hmac.compare_digest(guardado.encode("utf-8"), clave.encode("utf-8"))
+    except FuturoVencido:
+        return False, "⏳ Hay muchos ingresos a la vez. Intente de nuevo."
+
+    if not ok:
+        LIMITADOR.fallo(llave)
+        return False, "❌ Usuario o clave incorrectos."
+    LIMITADOR.exito(llave)
+    if not guardado.startswith("$2") or _rondas_de(guardado) < RONDAS:
+        get_executor_bcrypt().submit(_actualizar_hash, usuario, clave, guardado)
+    return True, ""
+
+def crear_usuario(usuario, clave):
+    """Como database.create_user, hasheando en el pool. Retorna (Bool, Mensaje)."""
+    try:
+        hashed = _en_pool(_hashear, clave)
+    except FuturoVencido:
+        return False, "⏳ Hay muchos ingresos a la vez. Intente de nuevo."
+    return create_user(usuario, hashed)
+
+
+# --- Sesión de Streamlit ---
+
+def iniciar_sesion(usuario):
+    st.session_state.logged_in = True
+    st.session_state.user = usuario
+    st.session_state.token = emitir_token(usuario)
+    st.query_params[PARAM_TOKEN] = st.session_state.token
+
+def restaurar_sesion():
+    """Tras una reconexión: si la URL trae un token válido, la sesión vuelve sin bcrypt."""
+    token = st.query_params.get(PARAM_TOKEN)
+    usuario = validar_token(token) if token else None
+    if usuario is None:
+        return False
+    st.session_state.logged_in = True
+    st.session_state.user = usuario
+    st.session_state.token = token
+    return True
+
+def recordar_sesion():
+    """
+    Cambiar de página borra los query params: se vuelven a poner el token y
+    el id del teléfono. Si al token le queda menos de la mitad, se renueva.
+    """
+    token = st.session_state.get("token")
+    leido = _leer_token(token) if token else None
+    if leido and leido[2] - time.time() < HORAS_SESION * 1800:
+        token = st.session_state.token = emitir_token(st.session_state.user)
+    if token and st.query_params.get(PARAM_TOKEN) != token:
+        st.query_params[PARAM_TOKEN] = token
+    # El carrito de Cosecha va por dispositivo (cola_local.id_dispositivo)
+    dispositivo = st.session_state.get("dispositivo")
+    if dispositivo and st.query_params.get("d") != dispositivo:
+        st.query_params["d"] = dispositivo
+
+def cerrar_sesion(todas=False):
+    """Revoca el token de esta sesión; con todas=True, los de todos los equipos del usuario."""
+    token = st.session_state.pop("token", None)
+    if todas and st.session_state.get("user"):
+        cerrar_sesiones(st.session_state.user)
+    elif token:
+        revocar_token(token)
+    st.query_params.pop(PARAM_TOKEN, None)
+    st.session_state.logged_in = False
+    st.session_state.user = ""
@@ -0,0 +1 @@
+"""Benchmarks de la app (se ejecutan contra un Postgres local vía DATABASE_URL)."""
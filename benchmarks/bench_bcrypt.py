@@ -0,0 +1,82 @@
+"""
+Costo de bcrypt por ronda, para elegir FINCA_BCRYPT_ROUNDS.
+
+    python -m benchmarks.bench_bcrypt
+    python -m benchmarks.bench_bcrypt --rondas 10 11 12 13 --objetivo-ms 250 --logins 20
+
+Por ronda mide checkpw en un hilo (mediana de `-n` intentos) y simula la
+cuadrilla de las 6 a.m.: `--logins` ingresos a la vez por un pool como el de
+auth.py (FINCA_BCRYPT_HILOS hilos), con p50/p95 de espera y los ingresos
+por segundo que aguanta la máquina. Recomienda la ronda más alta cuyo
+checkpw queda bajo --objetivo-ms y cuyo p95 con la cuadrilla queda bajo
+--p95-max-ms. Se corre en la máquina del deploy: el costo depende del CPU.
+"""
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+CLAVE = b"cafe-bench-2024"
+
+
+def medir_check(hashed, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        bcrypt.checkpw(CLAVE, hashed)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tiempos)
+
+
+def simular_cuadrilla(hashed, logins, hilos):
+    """(p50, p95 en ms desde que llega el ingreso hasta que termina, ingresos/s)."""
+    llegada = time.perf_counter()
+
+    def ingreso():
+        bcrypt.checkpw(CLAVE, hashed)
+        return (time.perf_counter() - llegada) * 1000
+
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        esperas = sorted(pool.map(lambda _: ingreso(), range(logins)))
+    total_s = time.perf_counter() - llegada
+    p95 = esperas[min(len(esperas) - 1, int(0.95 * len(esperas)))]
+    return statistics.median(esperas), p95, logins / total_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rondas", nargs="+", type=int, default=[10, 11, 12, 13, 14])
+    parser.add_argument("-n", "--repeticiones", type=int, default=5)
+    parser.add_argument("--logins", type=int, default=20, help="Ingresos simultáneos a simular")
+    parser.add_argument("--hilos", type=int,
+                        default=int(os.getenv("FINCA_BCRYPT_HILOS", str(min(4, os.cpu_count() or 1)))))
+    parser.add_argument("--objetivo-ms", type=float, default=250)
+    parser.add_argument("--p95-max-ms", type=float, default=3000)
+    args = parser.parse_args()
+
+    print(f"CPU: {os.cpu_count()} · pool de {args.hilos} hilos · {args.logins} ingresos a la vez\n")
+    print(f"{'rondas':>6} {'hash ms':>9} {'check ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'ingresos/s':>11}")
+    elegida = None
+    for rondas in sorted(args.rondas):
+        t0 = time.perf_counter()
+        hashed = bcrypt.hashpw(CLAVE, bcrypt.gensalt(rondas))
+        hash_ms = (time.perf_counter() - t0) * 1000
+        check_ms = medir_check(hashed, args.repeticiones)
+        p50, p95, por_s = simular_cuadrilla(hashed, args.logins, args.hilos)
+        cumple = check_ms <= args.objetivo_ms and p95 <= args.p95_max_ms
+        if cumple:
+            elegida = rondas
+        print(f"{rondas:>6} {hash_ms:>9.0f} {check_ms:>9.0f} {p50:>9.0f} {p95:>9.0f} {por_s:>11.1f}"
+              + ("" if cumple else "  (se pasa)"))
+
+    if elegida is None:
+        print(f"\n⚠️  Ninguna ronda cumple: subir --hilos, bajar la cuadrilla o aceptar más espera")
+        raise SystemExit(1)
+    print(f"\n✅ FINCA_BCRYPT_ROUNDS={elegida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Throughput de boletas de pago: en serie vs. pool de procesos.
+
+    python -m benchmarks.bench_boletas --trabajadores 500
+    python -m benchmarks.bench_boletas --trabajadores 2000 --procesos 1 2 4 8 --json boletas.json
+
+No necesita base de datos: arma un DataFrame con la forma de
+database.get_datos_boletas y mide boletas/segundo y tamaño del ZIP.
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from boletas import generar_zip_boletas, _renderizar_lote, BOLETAS_POR_TAREA
+
+
+def datos_sinteticos(n, semilla=7):
+    rng = np.random.default_rng(semilla)
+    dias = rng.integers(0, 7, n).astype(float)
+    extras = rng.integers(0, 10, n).astype(float)
+    cajuelas = rng.uniform(0, 60, n).round(2)
+    rebajos = np.where(rng.random(n) < 0.3, rng.integers(1, 20, n) * 1000.0, 0.0)
+    df = pd.DataFrame({
+        "trabajador": [f"Trabajador {i:04d}" for i in range(n)],
+        "dias": dias, "horas_extra": extras,
+        "pago_dias": dias * 15000, "pago_extras": extras * 2500,
+        "cajuelas": cajuelas, "pago_cosecha": cajuelas * 1300,
+        "rebajos": rebajos, "saldo_vales": rebajos * 2,
+    })
+    df["neto"] = df.pago_dias + df.pago_extras + df.pago_cosecha - df.rebajos
+    return df
+
+
+def _medir(fn):
+    t0 = time.perf_counter()
+    resultado = fn()
+    return time.perf_counter() - t0, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-t", "--trabajadores", type=int, default=500)
+    parser.add_argument("--procesos", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count() or 2}))
+    parser.add_argument("--json", help="Guardar resultados en este archivo")
+    args = parser.parse_args()
+
+    df = datos_sinteticos(args.trabajadores)
+    ini = datetime.date.today() - datetime.timedelta(days=6)
+    fin = datetime.date.today()
+    resultados = []
+
+    # Referencia: todo en este proceso
+    boletas = df.to_dict("records")
+    seg, _ = _medir(lambda: [_renderizar_lote(boletas[i:i + BOLETAS_POR_TAREA], ini, fin)
+                             for i in range(0, len(boletas), BOLETAS_POR_TAREA)])
+    base = args.trabajadores / seg
+    print(f"{'modo':<12} {'seg':>8} {'boletas/s':>10} {'x':>6} {'zip KB':>8}")
+    print(f"{'serie':<12} {seg:>8.2f} {base:>10.1f} {1.0:>6.2f} {'-':>8}")
+    resultados.append({"modo": "serie", "segundos": seg, "boletas_s": base})
+
+    for n in args.procesos:
+        with ProcessPoolExecutor(max_workers=n, mp_context=multiprocessing.get_context("spawn")) as pool:
+            # Calentar: los hijos importan fpdf/pandas una vez, igual que en el servidor
+            list(pool.map(_renderizar_lote, [boletas[:1]] * n, [ini] * n, [fin] * n))
+            seg, archivo = _medir(lambda: generar_zip_boletas(df, ini, fin, pool=pool))
+        tam_kb = len(archivo.read()) / 1024
+        archivo.close()
+        tasa = args.trabajadores / seg
+        print(f"{f'pool x{n}':<12} {seg:>8.2f} {tasa:>10.1f} {tasa / base:>6.2f} {tam_kb:>8.0f}")
+        resultados.append({"modo": f"pool_{n}", "procesos": n, "segundos": seg,
+                           "boletas_s": tasa, "aceleracion": tasa / base, "zip_kb": tam_kb})
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"trabajadores": args.trabajadores, "resultados": resultados}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
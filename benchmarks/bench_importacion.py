@@ -0,0 +1,101 @@
+"""
+Tiempo de importación en frío de cada página (lo que cuesta cambiar de página).
+
+    python -m benchmarks.bench_importacion
+    python -m benchmarks.bench_importacion --presupuesto-ms 300 --json importacion.json
+
+Para cada archivo de pages/ toma sus imports de nivel superior (los que corren
+al entrar a la página) y los ejecuta en un proceso nuevo con `-X importtime`,
+con streamlit, pandas, database y utils ya cargados: en el servidor esos
+módulos se importan una sola vez, así que no cuentan para el cambio de página.
+Termina con código 1 si alguna página pasa el presupuesto.
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRECARGA = ["streamlit", "pandas", "numpy", "database", "utils"]
+MARCA = "--- inicio pagina ---"
+
+
+def imports_de_pagina(ruta):
+    """Código de los import/from de nivel superior de un archivo."""
+    with open(ruta, encoding="utf-8") as f:
+        fuente = f.read()
+    arbol = ast.parse(fuente)
+    return "\n".join(ast.get_source_segment(fuente, nodo) for nodo in arbol.body
+                     if isinstance(nodo, (ast.Import, ast.ImportFrom)))
+
+
+def _medir_una_vez(codigo, precarga):
+    """Corre `codigo` en un proceso limpio. Retorna {módulo raíz: µs acumulados}."""
+    script = "\n".join([f"import {m}" for m in precarga] +
+                       [f"import sys; sys.stderr.write({MARCA!r} + '\\n')", codigo])
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", script],
+                          cwd=RAIZ, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    _, _, salida = proc.stderr.partition(MARCA)
+    modulos = {}
+    for linea in salida.splitlines():
+        if not linea.startswith("import time:"):
+            continue
+        _, acumulado, nombre = linea[len("import time:"):].split("|")
+        # Solo los de primer nivel (un espacio): los anidados ya están en su acumulado
+        if nombre.startswith(" ") and not nombre.startswith("  "):
+            modulos[nombre.strip()] = int(acumulado)
+    return modulos
+
+
+def medir_pagina(ruta, precarga, repeticiones):
+    codigo = imports_de_pagina(ruta)
+    corridas = [_medir_una_vez(codigo, precarga) for _ in range(repeticiones)]
+    totales = [sum(c.values()) / 1000 for c in corridas]
+    # Los módulos más pesados de la corrida mediana, para saber qué atacar
+    mediana = sorted(zip(totales, range(len(corridas))))[len(corridas) // 2][1]
+    pesados = sorted(corridas[mediana].items(), key=lambda kv: kv[1], reverse=True)[:5]
+    return statistics.median(totales), [(m, us / 1000) for m, us in pesados]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--presupuesto-ms", type=float, default=300.0)
+    parser.add_argument("-n", "--repeticiones", type=int, default=5)
+    parser.add_argument("--precarga", nargs="*", default=PRECARGA, help="Módulos que el servidor ya tiene cargados")
+    parser.add_argument("--json", help="Guardar resultados en este archivo")
+    args = parser.parse_args()
+
+    carpeta = os.path.join(RAIZ, "pages")
+    resultados, fuera = [], []
+
+    print(f"{'página':<18} {'ms':>8}  módulos más pesados")
+    for archivo in sorted(os.listdir(carpeta)):
+        if not archivo.endswith(".py"):
+            continue
+        ms, pesados = medir_pagina(os.path.join(carpeta, archivo), args.precarga, args.repeticiones)
+        ok = ms <= args.presupuesto_ms
+        if not ok:
+            fuera.append(archivo)
+        detalle = ", ".join(f"{m} {t:.0f}" for m, t in pesados if t >= 1)
+        print(f"{archivo:<18} {ms:>8.1f}  {'' if ok else '⚠️ '}{detalle}")
+        resultados.append({"pagina": archivo, "ms": ms, "ok": ok,
+                           "pesados": [{"modulo": m, "ms": t} for m, t in pesados]})
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"presupuesto_ms": args.presupuesto_ms, "paginas": resultados}, f, indent=2)
+
+    if fuera:
+        print(f"\n❌ Sobre el presupuesto de {args.presupuesto_ms:.0f} ms: {', '.join(fuera)}")
+        sys.exit(1)
+    print(f"\n✅ Todas las páginas bajo {args.presupuesto_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
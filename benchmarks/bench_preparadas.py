@@ -0,0 +1,85 @@
+"""
+Compara SQL normal vs. sentencias preparadas para las consultas calientes.
+
+    DATABASE_URL=postgresql://localhost/finca python -m benchmarks.bench_preparadas --owner demo
+
+Para cada sentencia de database.SENTENCIAS_PREPARADAS mide el tiempo por
+llamada en ambos modos y el "Planning Time" que reporta EXPLAIN ANALYZE,
+que es justamente lo que la versión preparada se ahorra.
+"""
+import argparse
+import datetime
+import json
+import os
+import re
+import statistics
+import time
+
+import psycopg2
+
+from database import SENTENCIAS_PREPARADAS, ConexionTipada, sql_execute
+
+
+def _params(nombre, owner):
+    """Parámetros de ejemplo según los tipos declarados de la sentencia."""
+    hoy = datetime.date.today()
+    tipos = [t.strip() for t in SENTENCIAS_PREPARADAS[nombre][0].split(",")]
+    if nombre == "ins_recoleccion":
+        return (hoy, "Bench", "Lote Bench", 1.0, 1300.0, owner, None)
+    textos = iter([owner, "Recolector"])
+    fechas = iter([hoy - datetime.timedelta(days=30), hoy])
+    return tuple(next(textos) if t == "text" else next(fechas) for t in tipos)
+
+
+def _medir(cur, sql, params, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        cur.execute(sql, params)
+        if cur.description:
+            cur.fetchall()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tiempos)
+
+
+def _planning_ms(cur, sql, params):
+    cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql, params)
+    return cur.fetchone()[0][0]["Planning Time"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--owner", default="demo")
+    parser.add_argument("-n", "--repeticiones", type=int, default=500)
+    parser.add_argument("--json", help="Guardar resultados en este archivo")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ["DATABASE_URL"], connection_factory=ConexionTipada)
+    cur = conn.cursor()
+    resultados = []
+
+    print(f"{'sentencia':<20} {'normal ms':>10} {'preparada ms':>13} {'ahorro':>8} {'planning ms':>12}")
+    for nombre, (tipos, sql) in SENTENCIAS_PREPARADAS.items():
+        params = _params(nombre, args.owner)
+        sql_normal = re.sub(r"\$\d+", "%s", sql)
+
+        cur.execute(f"PREPARE {nombre} ({tipos}) AS {sql}")
+        normal = _medir(cur, sql_normal, params, args.repeticiones)
+        preparada = _medir(cur, sql_execute(nombre), params, args.repeticiones)
+        planning = _planning_ms(cur, sql_normal, params)
+        cur.execute(f"DEALLOCATE {nombre}")
+        conn.rollback()  # descarta los INSERT de prueba
+
+        ahorro = (1 - preparada / normal) * 100 if normal else 0.0
+        resultados.append({"sentencia": nombre, "normal_ms": normal, "preparada_ms": preparada,
+                           "ahorro_pct": ahorro, "planning_ms": planning})
+        print(f"{nombre:<20} {normal:>10.3f} {preparada:>13.3f} {ahorro:>7.1f}% {planning:>12.3f}")
+
+    conn.close()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
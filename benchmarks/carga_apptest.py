@@ -0,0 +1,150 @@
+"""
+Carga concurrente: N capataces simulados con streamlit.testing (AppTest).
+
+    DB_SSLMODE=disable DATABASE_URL=postgresql://localhost/finca_bench \\
+        python -m benchmarks.carga_apptest --usuarios 20 --vueltas 5
+    python -m benchmarks.carga_apptest -u 40 --escala l --json resultados/carga.json
+
+Cada usuario entra por app.py (usuario/clave de benchmarks.generador), y
+después recorre Cosecha, Jornadas y Reportes: abre la página y la vuelve a
+correr una vez (como un toque en un widget). Todos arrancan a la vez, igual
+que la cuadrilla a las 6 a.m. Las sesiones comparten el proceso, así que
+comparten el pool de get_connection_pool y las cachés, como en el servidor.
+
+Reporta p50/p95/p99 de cada rerun por página, las veces que el pool se
+agotó, la tasa de errores de BD (de instrumentacion.REGISTRO) y las
+excepciones que mostró la app. Termina con código 1 si hubo errores.
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from streamlit.testing.v1 import AppTest
+
+from instrumentacion import REGISTRO
+from benchmarks import generador
+
+PAGINAS = ("pages/Cosecha.py", "pages/Jornadas.py", "pages/Reportes.py")
+CLAVE = "bench"  # la que pone benchmarks.generador
+TIMEOUT_S = 60
+
+
+class Resultados:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {}   # paso -> [ms]
+        self.fallas = []      # (usuario, paso, mensaje)
+
+    def anotar(self, paso, ms):
+        with self._lock:
+            self.latencias.setdefault(paso, []).append(ms)
+
+    def fallo(self, usuario, paso, mensaje):
+        with self._lock:
+            self.fallas.append((usuario, paso, mensaje))
+
+
+def _correr(at, usuario, paso, res):
+    """Un rerun medido. Las excepciones de la página cuentan como falla, no cortan la sesión."""
+    t0 = time.perf_counter()
+    try:
+        at.run(timeout=TIMEOUT_S)
+    except Exception:
+        res.fallo(usuario, paso, traceback.format_exc(limit=1).strip().splitlines()[-1])
+        return False
+    res.anotar(paso, (time.perf_counter() - t0) * 1000)
+    for exc in at.exception:
+        res.fallo(usuario, paso, exc.message)
+    return not at.exception
+
+
+def sesion(i, owner, vueltas, inicio, res):
+    """Un capataz: login y `vueltas` recorridos por las páginas."""
+    usuario = f"u{i:03d}"
+    inicio.wait()
+    app = AppTest.from_file("app.py", default_timeout=TIMEOUT_S)
+    if not _correr(app, usuario, "login (carga)", res):
+        return
+    app.text_input(key="u").input(owner)
+    app.text_input(key="p").input(CLAVE)
+    app.button[0].click()
+    if not _correr(app, usuario, "login (entrar)", res) or not app.session_state["logged_in"]:
+        res.fallo(usuario, "login (entrar)", "no entró")
+        return
+
+    for _ in range(vueltas):
+        for ruta in PAGINAS:
+            pagina = ruta.split("/")[-1][:-3]
+            at = AppTest.from_file(ruta, default_timeout=TIMEOUT_S)
+            at.session_state["logged_in"] = True
+            at.session_state["user"] = owner
+            if _correr(at, usuario, f"{pagina} (abrir)", res):
+                _correr(at, usuario, f"{pagina} (rerun)", res)
+
+
+def _percentiles(valores):
+    if len(valores) < 2:
+        v = valores[0] if valores else 0.0
+        return v, v, v
+    q = statistics.quantiles(valores, n=100, method="inclusive")
+    return q[49], q[94], q[98]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-u", "--usuarios", type=int, default=10)
+    parser.add_argument("-v", "--vueltas", type=int, default=3)
+    parser.add_argument("--escala", choices=list(generador.ESCALAS), default="m",
+                        help="Dueños bench_<escala>_* ya cargados con benchmarks.generador")
+    parser.add_argument("--json", help="Guardar resultados en este archivo")
+    args = parser.parse_args()
+
+    duenos = [f"{generador.PREFIJO}{args.escala}_{i}" for i in range(generador.ESCALAS[args.escala]["duenos"])]
+    res = Resultados()
+    REGISTRO.limpiar()
+    inicio = threading.Barrier(args.usuarios)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.usuarios, thread_name_prefix="capataz") as pool:
+        futuros = [pool.submit(sesion, i, duenos[i % len(duenos)], args.vueltas, inicio, res)
+                   for i in range(args.usuarios)]
+        for f in futuros:
+            f.result()
+    total_s = time.perf_counter() - t0
+
+    eventos = REGISTRO.resumen()
+    consultas = sum(f["Llamadas"] for f in eventos)
+    errores_bd = sum(f["Errores"] for f in eventos)
+
+    print(f"{args.usuarios} usuarios x {args.vueltas} vueltas en {total_s:.1f} s\n")
+    print(f"{'paso':<22} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    pasos = {}
+    for paso, valores in sorted(res.latencias.items()):
+        p50, p95, p99 = _percentiles(valores)
+        pasos[paso] = {"n": len(valores), "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+        print(f"{paso:<22} {len(valores):>6} {p50:>9.0f} {p95:>9.0f} {p99:>9.0f}")
+
+    tasa = errores_bd / consultas if consultas else 0.0
+    print(f"\nconsultas BD: {consultas}  errores BD: {errores_bd} ({tasa:.2%})  "
+          f"pool agotado: {REGISTRO.pool_agotado}  fallas en la app: {len(res.fallas)}")
+    for usuario, paso, mensaje in res.fallas[:10]:
+        print(f"  ❌ {usuario} · {paso}: {mensaje}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"usuarios": args.usuarios, "vueltas": args.vueltas, "escala": args.escala,
+                       "segundos": total_s, "pasos": pasos, "consultas_bd": consultas,
+                       "errores_bd": errores_bd, "pool_agotado": REGISTRO.pool_agotado,
+                       "fallas": [{"usuario": u, "paso": p, "mensaje": m} for u, p, m in res.fallas],
+                       "por_funcion": eventos}, f, indent=2, default=str)
+
+    if res.fallas or errores_bd or REGISTRO.pool_agotado:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
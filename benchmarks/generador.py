@@ -0,0 +1,263 @@
+"""
+Datos sintéticos de finca (con semilla) para benchmarks, a varias escalas.
+
+    DB_SSLMODE=disable DATABASE_URL=postgresql://localhost/finca_bench \\
+        python -m benchmarks.generador --escala m
+    python -m benchmarks.generador --escala l --semilla 11 --limpiar
+
+Crea las tablas (database.create_all_tables) y carga con COPY dueños
+`bench_<escala>_<n>` con fincas, catálogos, tarifas, cientos de trabajadores
+y años de jornadas, recolecciones (solo en temporada), insumos, vales,
+planes, análisis de suelo y cierres. Misma semilla y escala: mismos datos.
+Solo toca filas de dueños "bench_", nunca datos reales.
+"""
+import argparse
+import datetime
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import psycopg2
+import bcrypt
+
+from database import (
+    ConexionTipada, create_all_tables, MES_INICIO_TEMPORADA
+)
+
+PREFIJO = "bench_"
+_PREFIJO_LIKE = PREFIJO.replace("_", "\\_")   # el "_" es comodín en LIKE
+
+# Tamaño por dueño. `duenos` > 1 para que el filtro por owner tenga vecinos.
+ESCALAS = {
+    "s": {"duenos": 2, "lotes": 5, "trabajadores": 50, "anios": 1},
+    "m": {"duenos": 2, "lotes": 12, "trabajadores": 200, "anios": 3},
+    "l": {"duenos": 2, "lotes": 25, "trabajadores": 600, "anios": 6},
+}
+
+# Tablas con columna owner que el generador llena (y limpia)
+TABLAS = ("jornadas", "recolecciones", "insumos", "vales", "planes", "analisis_suelo",
+          "cierres_mensuales", "fincas", "trabajadores", "catalogo_productos", "catalogo_labores",
+          "tarifas", "resumen_mensual_insumos", "resumen_diario_lote", "resumen_diario_sucio", "recomendaciones_suelo")
+
+LABORES = ["Chapea", "Poda", "Deshija", "Abonado", "Fumigación", "Siembra", "Resiembra", "Mantenimiento"]
+PRODUCTOS = {  # producto -> (tipo, precio base ₡, cantidad típica)
+    "18-5-15": ("Abono", 24000, 20), "Nutrimon": ("Abono", 26500, 15), "Urea": ("Abono", 21000, 10),
+    "Cal dolomita": ("Cal", 6000, 40), "Glifosato": ("Herbicida", 9000, 4), "Atemi": ("Fungicida", 31000, 2),
+    "Caldo bordelés": ("Fungicida", 12000, 6), "Engeo": ("Insecticida", 28000, 1),
+}
+ETAPAS = ["Floración", "Llenado", "Post-cosecha", "Desarrollo"]
+NOMBRES = ["Juan", "María", "José", "Ana", "Luis", "Carmen", "Carlos", "Rosa", "Jorge", "Marta",
+           "Pedro", "Elena", "Miguel", "Sofía", "Andrés", "Lucía", "Diego", "Paula", "Mario", "Isabel"]
+APELLIDOS = ["Mora", "Rojas", "Vargas", "Jiménez", "Solano", "Castro", "Quesada", "Araya", "Chaves", "Ureña",
+             "Soto", "Brenes", "Navarro", "Cordero", "Segura", "Arias", "Madrigal", "Zúñiga", "Calderón", "Porras"]
+
+
+def _copiar(cur, tabla, df):
+    """COPY de un DataFrame (columnas = columnas de la tabla). Retorna filas cargadas."""
+    if df.empty:
+        return 0
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False, na_rep="\\N")
+    buf.seek(0)
+    cur.copy_expert(f"COPY {tabla} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf)
+    return len(df)
+
+
+def limpiar(cur, escala=None):
+    """Borra lo generado (de una escala o de todas)."""
+    patron = f"{_PREFIJO_LIKE}{escala}\\_%" if escala else f"{_PREFIJO_LIKE}%"
+    for tabla in TABLAS:
+        cur.execute(f"DELETE FROM {tabla} WHERE owner LIKE %s", (patron,))
+    cur.execute("DELETE FROM users WHERE username LIKE %s", (patron,))
+
+
+def _dias_por_trabajador(rng, fechas, trabajadores, presencia):
+    """Pares (fecha, trabajador) con cada trabajador presente con probabilidad `presencia`."""
+    mascara = rng.random((len(fechas), len(trabajadores))) < presencia
+    i, j = np.nonzero(mascara)
+    return fechas[i], np.asarray(trabajadores, dtype=object)[j]
+
+
+def generar_dueno(rng, owner, p, hoy):
+    """DataFrames de un dueño, por tabla."""
+    n_lotes, n_trab = p["lotes"], p["trabajadores"]
+    inicio = hoy - datetime.timedelta(days=365 * p["anios"])
+    fechas = pd.date_range(inicio, hoy, freq="D").date
+    fechas = np.array(fechas, dtype=object)
+    dow = np.array([f.weekday() for f in fechas])
+    laborables = fechas[dow < 6]
+
+    lotes = [f"Lote {i + 1:02d}" for i in range(n_lotes)]
+    lat0, lon0 = 9.9 + rng.uniform(-0.5, 0.5), -84.0 + rng.uniform(-0.5, 0.5)
+    fincas = pd.DataFrame({
+        "nombre": lotes, "owner": owner,
+        "latitud": (lat0 + rng.uniform(-0.01, 0.01, n_lotes)).round(6),
+        "longitud": (lon0 + rng.uniform(-0.01, 0.01, n_lotes)).round(6),
+        "hectareas": rng.uniform(0.8, 6.0, n_lotes).round(2),
+    })
+
+    nombres = [f"{NOMBRES[i % len(NOMBRES)]} {APELLIDOS[(i // len(NOMBRES)) % len(APELLIDOS)]} {i:03d}"
+               for i in range(n_trab)]
+    tipos = np.where(rng.random(n_trab) < 0.4, "Jornalero", "Recolector")
+    trabajadores = pd.DataFrame({"nombre_completo": nombres, "tipo": tipos, "owner": owner})
+    jornaleros = [n for n, t in zip(nombres, tipos) if t == "Jornalero"]
+    recolectores = [n for n, t in zip(nombres, tipos) if t == "Recolector"]
+
+    # Jornadas: días laborales, ~70% de los jornaleros cada día
+    f, t = _dias_por_trabajador(rng, laborables, jornaleros, 0.7)
+    n = len(f)
+    extras = np.where(rng.random(n) < 0.2, rng.integers(1, 4, n), 0)
+    jornadas = pd.DataFrame({
+        "trabajador": t, "fecha": f, "lote": rng.choice(lotes, n), "actividad": rng.choice(LABORES, n),
+        "dias": np.where(rng.random(n) < 0.1, 0.5, 1.0), "horas_normales": 8, "horas_extra": extras, "owner": owner,
+    })
+
+    # Recolecciones: de octubre a febrero, con la campana de la cosecha
+    mes = np.array([x.month for x in laborables])
+    en_temporada = laborables[(mes >= MES_INICIO_TEMPORADA) | (mes <= 2)]
+    f, t = _dias_por_trabajador(rng, en_temporada, recolectores, 0.75)
+    n = len(f)
+    dia_temp = np.array([(x - datetime.date(x.year if x.month >= MES_INICIO_TEMPORADA else x.year - 1,
+                                            MES_INICIO_TEMPORADA, 1)).days for x in f])
+    intensidad = np.exp(-((dia_temp - 75) / 35.0) ** 2)
+    recolecciones = pd.DataFrame({
+        "fecha": f, "trabajador": t, "lote": rng.choice(lotes, n),
+        "cajuelas": (rng.gamma(2.0, 3.0, n) * (0.3 + intensidad)).round(2),
+        "precio_cajuela": 1300 + 100 * np.array([x.year - inicio.year for x in f]),
+        "owner": owner, "clave_idem": None,
+    })
+
+    # Insumos: ~3 aplicaciones por lote y mes
+    n = int(n_lotes * 3 * 12 * p["anios"])
+    prods = rng.choice(list(PRODUCTOS), n)
+    f_ins = rng.choice(fechas, n)
+    insumos = pd.DataFrame({
+        "fecha": f_ins, "lote": rng.choice(lotes, n), "tipo": [PRODUCTOS[x][0] for x in prods],
+        "etapa": rng.choice(ETAPAS, n), "producto": prods, "dosis": "Según etiqueta",
+        "cantidad": np.array([PRODUCTOS[x][2] for x in prods]) * rng.uniform(0.5, 1.5, n).round(1),
+        "precio_unitario": (np.array([PRODUCTOS[x][1] for x in prods])
+                            * (1 + 0.06 * np.array([(x - inicio).days / 365 for x in f_ins]))).round(0),
+        "owner": owner,
+    })
+
+    # Vales: adelantos (+) y rebajos en planilla (-)
+    n = int(len(nombres) * 6 * p["anios"])
+    montos = rng.integers(1, 30, n) * 1000.0
+    rebajo = rng.random(n) < 0.45
+    vales = pd.DataFrame({
+        "fecha": rng.choice(fechas, n), "trabajador": rng.choice(nombres, n),
+        "monto": np.where(rebajo, -montos, montos),
+        "concepto": np.where(rebajo, "Rebajo planilla", "Adelanto"), "owner": owner,
+    })
+
+    # Planes: historial + dos meses hacia adelante
+    f_plan = np.array(pd.date_range(inicio, hoy + datetime.timedelta(days=60), freq="D").date, dtype=object)
+    n = int(n_lotes * 4 * 12 * p["anios"])
+    f_pl = rng.choice(f_plan, n)
+    es_insumo = rng.random(n) < 0.4
+    prods = rng.choice(list(PRODUCTOS), n)
+    planes = pd.DataFrame({
+        "fecha": f_pl, "lote": rng.choice(lotes, n), "tipo": np.where(es_insumo, "Insumo", "Labor"),
+        "trabajador": np.where(es_insumo, None, rng.choice(jornaleros or nombres, n)),
+        "actividad": np.where(es_insumo, None, rng.choice(LABORES, n)),
+        "producto": np.where(es_insumo, prods, None),
+        "cantidad": np.where(es_insumo, rng.integers(1, 20, n), None),
+        "estado": np.where(f_pl < hoy, np.where(rng.random(n) < 0.85, "realizado", "pendiente"), "pendiente"),
+        "recur_autorenew": rng.random(n) < 0.1, "owner": owner,
+    })
+
+    # Análisis de suelo: dos por lote y año
+    n = n_lotes * 2 * p["anios"]
+    analisis = pd.DataFrame({
+        "fecha": rng.choice(fechas, n), "lote": np.repeat(lotes, 2 * p["anios"]),
+        "ph": rng.normal(5.3, 0.4, n).round(2), "nitrogeno": rng.uniform(0.1, 0.5, n).round(3),
+        "fosforo": rng.uniform(5, 25, n).round(1), "potasio": rng.uniform(0.1, 0.6, n).round(2),
+        "notas": "Muestra compuesta 0-20 cm", "owner": owner,
+    })
+
+    meses = pd.date_range(inicio, hoy, freq="MS").date
+    cierres = pd.DataFrame({
+        "mes_inicio": meses, "mes_fin": [(pd.Timestamp(m) + pd.offsets.MonthEnd(0)).date() for m in meses],
+        "creado_por": owner, "total_nomina": 0, "total_insumos": 0, "total_general": 0, "owner": owner,
+    })
+
+    return {
+        "fincas": fincas, "trabajadores": trabajadores,
+        "catalogo_productos": pd.DataFrame({"nombre": list(PRODUCTOS), "owner": owner}),
+        "catalogo_labores": pd.DataFrame({"nombre": LABORES, "owner": owner}),
+        "tarifas": pd.DataFrame({"owner": [owner], "pago_dia": [15000], "pago_hora_extra": [2800],
+                                 "precio_venta_cajuela": [2600]}),
+        "jornadas": jornadas, "recolecciones": recolecciones, "insumos": insumos, "vales": vales,
+        "planes": planes, "analisis_suelo": analisis, "cierres_mensuales": cierres,
+    }
+
+
+def _rollups(cur, owner):
+    """Acumulados que la app mantiene al escribir (ver add_insumo / suelos)."""
+    cur.execute("""
+        INSERT INTO resumen_mensual_insumos (owner, mes, lote, producto, tipo, cantidad, gasto, registros, precio_min, precio_max)
+        SELECT owner, date_trunc('month', fecha)::date, COALESCE(lote, ''), COALESCE(producto, ''), COALESCE(tipo, ''),
+               SUM(cantidad), SUM(costo_total), COUNT(*), MIN(precio_unitario), MAX(precio_unitario)
+        FROM insumos WHERE owner = %s GROUP BY 1, 2, 3, 4, 5
+    """, (owner,))
+
+
+def generar(conn, escala, semilla=7, hoy=None):
+    """Carga una escala completa. Retorna {tabla: filas} (sumando todos los dueños)."""
+    p = ESCALAS[escala]
+    hoy = hoy or datetime.date.today()
+    rng = np.random.default_rng(semilla)
+    clave = bcrypt.hashpw(b"bench", bcrypt.gensalt(4)).decode()
+    filas = {}
+    with conn.cursor() as cur:
+        limpiar(cur, escala)
+        for i in range(p["duenos"]):
+            owner = f"{PREFIJO}{escala}_{i}"
+            cur.execute("INSERT INTO users (username, password) VALUES (%s, %s)", (owner, clave))
+            for tabla, df in generar_dueno(rng, owner, p, hoy).items():
+                filas[tabla] = filas.get(tabla, 0) + _copiar(cur, tabla, df)
+            _rollups(cur, owner)
+        conn.commit()
+    # Estadísticas al día: el planificador tiene que ver los datos nuevos
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        for tabla in filas:
+            cur.execute(f"ANALYZE {tabla}")
+    conn.autocommit = False
+    return filas
+
+
+def conectar():
+    return psycopg2.connect(os.environ["DATABASE_URL"], sslmode=os.getenv("DB_SSLMODE", "require"),
+                            connection_factory=ConexionTipada)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escala", choices=list(ESCALAS), nargs="+", default=["s"])
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--limpiar", action="store_true", help="Solo borrar los datos bench_ y salir")
+    args = parser.parse_args()
+
+    create_all_tables()
+    conn = conectar()
+    if args.limpiar:
+        with conn.cursor() as cur:
+            limpiar(cur)
+        conn.commit()
+        print("🧹 Datos bench_ borrados")
+        return
+
+    for escala in args.escala:
+        t0 = time.perf_counter()
+        filas = generar(conn, escala, args.semilla)
+        print(f"📦 escala {escala}: {sum(filas.values()):,} filas en {time.perf_counter() - t0:.1f} s")
+        for tabla, n in sorted(filas.items(), key=lambda kv: -kv[1]):
+            print(f"   {tabla:<22} {n:>10,}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Regresiones de planes de consulta: EXPLAIN de todo el SQL de database.py.
+
+    DB_SSLMODE=disable DATABASE_URL=postgresql://localhost/finca_bench \\
+        python -m benchmarks.planes_consulta --escala m
+    python -m benchmarks.planes_consulta --escala m --actualizar   # nuevas fotos y presupuestos
+
+Sobre los datos de benchmarks.generador (cargarlos antes), llama cada
+lectura de benchmarks.suite_db.LECTURAS con instrumentacion.REGISTRO
+capturando el SQL que ejecuta, y corre EXPLAIN (FORMAT JSON) de cada
+sentencia (las preparadas se explican con su SQL). Falla si:
+
+  * hay Seq Scan sobre una tabla grande, salvo en lecturas de historial completo;
+  * el costo estimado pasa el presupuesto guardado en planes/presupuestos.json;
+  * la forma del plan (nodos, tablas, índices) cambió contra la foto guardada.
+
+Las fotos van en benchmarks/planes/ y se versionan con el código: un cambio
+de índice o de esquema que empeora un plan se ve en el diff antes del deploy.
+Las guardadas salen de `benchmarks.generador --escala m` (semilla 7) sobre
+Postgres 16: comparar con esa misma carga.
+"""
+import argparse
+import datetime
+import json
+import os
+import re
+
+import database
+from database import SENTENCIAS_PREPARADAS
+from instrumentacion import REGISTRO
+from cache_backend import sin_cache
+from benchmarks import generador
+from benchmarks.suite_db import LECTURAS, _contexto
+
+DIRECTORIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "planes")
+PRESUPUESTOS = os.path.join(DIRECTORIO, "presupuestos.json")
+TABLAS_GRANDES = ("jornadas", "recolecciones", "insumos", "vales", "planes", "analisis_suelo",
+                  "resumen_diario_lote", "resumen_mensual_insumos")
+MARGEN_PRESUPUESTO = 1.5   # --actualizar guarda costo x margen
+_EXECUTE = re.compile(r"^\s*EXECUTE\s+(\w+)", re.IGNORECASE)
+
+
+def _sql_explicable(sql, params):
+    """(sql, params) listo para EXPLAIN, o None si no es una lectura."""
+    if isinstance(sql, bytes):
+        sql = sql.decode()
+    m = _EXECUTE.match(sql)
+    if m:
+        # EXECUTE nombre (...) -> el SQL de la sentencia con $n como parámetros con nombre
+        texto = SENTENCIAS_PREPARADAS[m.group(1)][1]
+        return re.sub(r"\$(\d+)", r"%(p\1)s", texto), {f"p{i + 1}": v for i, v in enumerate(params)}
+    if re.match(r"^\s*(SELECT|WITH)\b", sql, re.IGNORECASE):
+        return sql, params
+    return None
+
+
+def _tabla_base(relacion):
+    """recolecciones_2024 (partición) -> recolecciones."""
+    for t in TABLAS_GRANDES:
+        if relacion == t or relacion.startswith(t + "_"):
+            return t
+    return relacion
+
+
+def forma(nodo):
+    """Plan sin números: tipo de nodo, tabla e índice, recursivo. Es lo que se compara."""
+    f = {"nodo": nodo["Node Type"]}
+    for clave, dest in (("Relation Name", "tabla"), ("Index Name", "indice"), ("Join Type", "join")):
+        if clave in nodo:
+            f[dest] = _tabla_base(nodo[clave]) if dest == "tabla" else nodo[clave]
+    if nodo.get("Plans"):
+        f["hijos"] = [forma(h) for h in nodo["Plans"]]
+    return f
+
+
+def seq_scans(nodo):
+    """Tablas grandes leídas con Seq Scan en el plan."""
+    encontradas = []
+    if nodo["Node Type"] == "Seq Scan" and _tabla_base(nodo.get("Relation Name", "")) in TABLAS_GRANDES:
+        encontradas.append(_tabla_base(nodo["Relation Name"]))
+    for h in nodo.get("Plans", ()):
+        encontradas += seq_scans(h)
+    return encontradas
+
+
+def explicar(cur, sql, params):
+    cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    return cur.fetchone()[0][0]["Plan"]
+
+
+def capturar_planes(conn, ctx):
+    """{clave: plan raíz} para cada sentencia de lectura de cada función."""
+    planes = {}
+    for nombre, (armar, _) in LECTURAS.items():
+        with sin_cache(), REGISTRO.capturar() as sentencias:
+            getattr(database, nombre)(*armar(ctx))
+        i = 0
+        # Orden estable: las de en_paralelo llegan en cualquier orden
+        for _, sql, params in sorted(sentencias, key=lambda s: str(s[1])):
+            explicable = _sql_explicable(sql, params)
+            if explicable is None:
+                continue
+            with conn.cursor() as cur:
+                planes[f"{nombre}.{i}"] = explicar(cur, *explicable)
+            conn.rollback()
+            i += 1
+    return planes
+
+
+def _leer_json(ruta, defecto):
+    if not os.path.exists(ruta):
+        return defecto
+    with open(ruta) as f:
+        return json.load(f)
+
+
+def _escribir_json(ruta, datos):
+    with open(ruta, "w") as f:
+        json.dump(datos, f, indent=2, ensure_ascii=False, sort_keys=True)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escala", choices=list(generador.ESCALAS), default="m")
+    parser.add_argument("--actualizar", action="store_true", help="Reescribir fotos y presupuestos")
+    args = parser.parse_args()
+
+    conn = generador.conectar()
+    ctx, filas = _contexto(conn, f"{generador.PREFIJO}{args.escala}_0", datetime.date.today())
+    if not filas:
+        raise SystemExit(f"No hay datos bench_{args.escala}: correr antes benchmarks.generador --escala {args.escala}")
+    planes = capturar_planes(conn, ctx)
+    conn.close()
+
+    os.makedirs(DIRECTORIO, exist_ok=True)
+    presupuestos = _leer_json(PRESUPUESTOS, {})
+    historial = {n for n, (_, h) in LECTURAS.items() if h}
+    fallas = []
+
+    print(f"{'sentencia':<36} {'costo':>12} {'presupuesto':>12}  notas")
+    for clave, plan in sorted(planes.items()):
+        funcion = clave.split(".")[0]
+        costo = plan["Total Cost"]
+        foto_ruta = os.path.join(DIRECTORIO, f"{clave}.json")
+        notas = []
+
+        scans = seq_scans(plan)
+        if scans and funcion not in historial:
+            notas.append(f"Seq Scan en {', '.join(sorted(set(scans)))}")
+
+        if args.actualizar:
+            presupuestos[clave] = round(costo * MARGEN_PRESUPUESTO, 2)
+            _escribir_json(foto_ruta, forma(plan))
+        else:
+            limite = presupuestos.get(clave)
+            if limite is not None and costo > limite:
+                notas.append(f"costo {costo:.0f} > {limite:.0f}")
+            foto = _leer_json(foto_ruta, None)
+            if foto is None:
+                notas.append("sin foto (correr con --actualizar)")
+            elif foto != forma(plan):
+                notas.append("el plan cambió de forma")
+
+        limite = presupuestos.get(clave)
+        print(f"{clave:<36} {costo:>12.1f} {limite if limite is not None else '-':>12}  "
+              + ("; ".join(notas) if notas else "ok"))
+        if notas:
+            fallas.append(clave)
+
+    if args.actualizar:
+        _escribir_json(PRESUPUESTOS, presupuestos)
+        print(f"\n📸 {len(planes)} fotos y presupuestos guardados en {DIRECTORIO}")
+    if fallas:
+        print(f"\n❌ {len(fallas)} sentencias con problemas")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Latencia de cada función de lectura de database.py a varias escalas.
+
+    DB_SSLMODE=disable DATABASE_URL=postgresql://localhost/finca_bench \\
+        python -m benchmarks.suite_db --escalas s m l --json resultados/db.json
+    python -m benchmarks.suite_db --sin-generar --comparar resultados/db_anterior.json
+
+Por escala: carga los datos sintéticos (benchmarks.generador), calienta y
+mide cada lectura `-n` veces (mediana y p95). Después ajusta la pendiente
+log-log de latencia contra filas del dueño: las lecturas por rango de fechas
+tienen que crecer sub-linealmente (pendiente < --pendiente-max). Las que
+recorren todo el historial (exportaciones, totales) se reportan pero no se
+exigen. Termina con código 1 si alguna se pasa.
+"""
+import argparse
+import datetime
+import inspect
+import json
+import math
+import os
+import statistics
+import subprocess
+import time
+
+import database
+from cache_backend import sin_cache
+from benchmarks import generador
+
+# nombre -> (argumentos, recorre todo el historial). `c` trae owner, fechas y un lote.
+LECTURAS = {
+    "get_all_fincas": (lambda c: (c.owner,), False),
+    "get_catalogo_productos": (lambda c: (c.owner,), False),
+    "get_catalogo_labores": (lambda c: (c.owner,), False),
+    "get_all_trabajadores": (lambda c: (c.owner,), False),
+    "get_trabajadores_por_tipo": (lambda c: (c.owner, "Recolector"), False),
+    "get_saldo_global": (lambda c: (c.owner,), True),
+    "get_tarifas": (lambda c: (c.owner,), False),
+    "get_precio_venta": (lambda c: (c.owner,), False),
+    "get_all_jornadas": (lambda c: (c.owner,), True),
+    "get_jornadas_between": (lambda c: (c.semana_ini, c.hoy, c.owner), False),
+    "get_insumos_between": (lambda c: (c.mes_ini, c.hoy, c.owner), False),
+    "list_plans": (lambda c: (c.owner, c.semana_ini, c.hoy + datetime.timedelta(days=7)), False),
+    "get_plan_by_id": (lambda c: (c.plan_id, c.owner), False),
+    "get_reporte_cosecha_detallado": (lambda c: (c.semana_ini, c.hoy, c.owner), False),
+    "get_totales_por_lote": (lambda c: (c.semana_ini, c.hoy, c.owner), False),
+    "get_produccion_total_lote": (lambda c: (c.owner,), True),
+    "get_resumen_semanal": (lambda c: (c.owner, c.semana_ini, c.hoy), False),
+    # saldo_vales suma toda la deuda hasta el corte, como get_saldo_global
+    "get_datos_boletas": (lambda c: (c.semana_ini, c.hoy, c.owner), True),
+    "get_gastos_por_lote": (lambda c: (c.owner,), True),
+    "calcular_resumen_periodo": (lambda c: (c.mes_ini, c.hoy, c.owner), False),
+    "listar_cierres": (lambda c: (c.owner,), False),
+    "get_export_jornadas": (lambda c: (c.owner,), True),
+    "get_export_recolecciones": (lambda c: (c.owner,), True),
+    "get_export_insumos": (lambda c: (c.owner,), True),
+    "get_fincas_con_coords": (lambda c: (c.owner,), False),
+    "get_fincas_full_data": (lambda c: (c.owner,), False),
+    "get_estado_lote": (lambda c: (c.lote, c.owner), True),
+}
+_PREFIJOS_LECTURA = ("get_", "list_", "listar_", "calcular_")
+_NO_SON_LECTURAS = {"get_connection_pool", "get_db_cursor", "get_executor_consultas"}
+
+
+class Contexto:
+    def __init__(self, owner, hoy, plan_id, lote):
+        self.owner, self.hoy, self.plan_id, self.lote = owner, hoy, plan_id, lote
+        self.semana_ini = hoy - datetime.timedelta(days=6)
+        self.mes_ini = hoy.replace(day=1)
+
+
+def lecturas_sin_medir():
+    """Funciones de lectura de database.py que no están en LECTURAS (para no olvidar las nuevas)."""
+    return sorted(n for n, f in inspect.getmembers(database, inspect.isfunction)
+                  if n.startswith(_PREFIJOS_LECTURA) and f.__module__ == "database"
+                  and n not in LECTURAS and n not in _NO_SON_LECTURAS)
+
+
+def _contexto(conn, owner, hoy):
+    with conn.cursor() as cur:
+        cur.execute("SELECT MAX(id) FROM planes WHERE owner=%s", (owner,))
+        plan_id = cur.fetchone()[0]
+        cur.execute("SELECT MIN(nombre) FROM fincas WHERE owner=%s", (owner,))
+        lote = cur.fetchone()[0]
+        cur.execute("""SELECT (SELECT COUNT(*) FROM jornadas WHERE owner=%(o)s)
+                            + (SELECT COUNT(*) FROM recolecciones WHERE owner=%(o)s)
+                            + (SELECT COUNT(*) FROM insumos WHERE owner=%(o)s)
+                            + (SELECT COUNT(*) FROM vales WHERE owner=%(o)s)""", {"o": owner})
+        filas = cur.fetchone()[0]
+    conn.rollback()
+    return Contexto(owner, hoy, plan_id, lote), filas
+
+
+def medir(funcion, args, repeticiones):
+    funcion(*args)  # calentar: conexión del pool, sentencias preparadas, caché de Postgres
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion(*args)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    tiempos.sort()
+    return {"mediana_ms": statistics.median(tiempos),
+            "p95_ms": tiempos[min(len(tiempos) - 1, math.ceil(0.95 * len(tiempos)) - 1)]}
+
+
+def pendiente_loglog(xs, ys):
+    """Pendiente de mínimos cuadrados de log(y) contra log(x)."""
+    lx, ly = [math.log(x) for x in xs], [math.log(max(y, 1e-3)) for y in ys]
+    mx, my = statistics.fmean(lx), statistics.fmean(ly)
+    den = sum((a - mx) ** 2 for a in lx)
+    return sum((a - mx) * (b - my) for a, b in zip(lx, ly)) / den if den else 0.0
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escalas", nargs="+", choices=list(generador.ESCALAS), default=["s", "m", "l"])
+    parser.add_argument("-n", "--repeticiones", type=int, default=15)
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--sin-generar", action="store_true", help="Usar los datos bench_ ya cargados")
+    parser.add_argument("--pendiente-max", type=float, default=0.8)
+    parser.add_argument("--json", help="Guardar resultados en este archivo")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior para comparar medianas")
+    args = parser.parse_args()
+
+    faltan = lecturas_sin_medir()
+    if faltan:
+        print(f"⚠️  Lecturas sin medir en la suite: {', '.join(faltan)}")
+
+    database.create_all_tables()
+    conn = generador.conectar()
+    hoy = datetime.date.today()
+    resultados = {}
+    for escala in args.escalas:
+        if not args.sin_generar:
+            filas_tabla = generador.generar(conn, escala, args.semilla, hoy)
+            print(f"📦 escala {escala}: {sum(filas_tabla.values()):,} filas cargadas")
+        ctx, filas = _contexto(conn, f"{generador.PREFIJO}{escala}_0", hoy)
+        funciones = {}
+        with sin_cache():   # se mide la BD, no la caché de lecturas
+            for nombre, (armar, _) in LECTURAS.items():
+                funciones[nombre] = medir(getattr(database, nombre), armar(ctx), args.repeticiones)
+        resultados[escala] = {"filas_dueno": filas, "funciones": funciones}
+    conn.close()
+
+    escalas = [e for e in args.escalas if resultados[e]["filas_dueno"]]
+    anterior = {}
+    if args.comparar:
+        with open(args.comparar) as f:
+            anterior = json.load(f)["escalas"]
+
+    print(f"\n{'función':<30}" + "".join(f"{e + ' ms':>10}" for e in escalas) + f"{'pendiente':>11}")
+    pendientes, fallas = {}, []
+    for nombre, (_, historial) in LECTURAS.items():
+        ms = [resultados[e]["funciones"][nombre]["mediana_ms"] for e in escalas]
+        pend = pendiente_loglog([resultados[e]["filas_dueno"] for e in escalas], ms) if len(escalas) > 1 else None
+        pendientes[nombre] = pend
+        marca = ""
+        if pend is not None and pend >= args.pendiente_max:
+            marca = " (historial)" if historial else " ❌"
+            if not historial:
+                fallas.append(nombre)
+        linea = f"{nombre:<30}" + "".join(f"{x:>10.2f}" for x in ms)
+        print(linea + (f"{pend:>11.2f}" if pend is not None else f"{'-':>11}") + marca)
+        for e in escalas:
+            antes = anterior.get(e, {}).get("funciones", {}).get(nombre)
+            if antes:
+                ahora = resultados[e]["funciones"][nombre]["mediana_ms"]
+                cambio = (ahora / antes["mediana_ms"] - 1) * 100 if antes["mediana_ms"] else 0.0
+                if abs(cambio) >= 20:
+                    print(f"    {e}: {antes['mediana_ms']:.2f} → {ahora:.2f} ms ({cambio:+.0f}%)")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump({"fecha": datetime.datetime.now().isoformat(timespec="seconds"), "commit": _commit_actual(),
+                       "semilla": args.semilla, "repeticiones": args.repeticiones,
+                       "escalas": resultados, "pendientes": pendientes}, f, indent=2)
+
+    if fallas:
+        print(f"\n❌ Crecen casi lineal con los datos: {', '.join(fallas)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
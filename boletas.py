@@ -0,0 +1,82 @@
+import os
+import re
+import zipfile
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import streamlit as st
+
+from documentos import Plantilla, Columna, renderizar
+
+# ==========================================
+# 🧾 BOLETAS DE PAGO EN LOTE
+# ==========================================
+# Una boleta PDF por trabajador, todas en un ZIP. Los datos salen de una sola
+# consulta (database.get_datos_boletas) y el dibujo de los PDF, que es puro
+# CPU, se reparte entre núcleos con un pool de procesos. El ZIP se arma en un
+# SpooledTemporaryFile: en memoria si es chico, a disco si crece.
+
+MIN_PARA_POOL = 24          # con pocas boletas el pool cuesta más de lo que ahorra
+BOLETAS_POR_TAREA = 16      # menos viajes entre procesos
+MAX_ZIP_EN_MEMORIA = 32 * 1024 * 1024
+
+def _nombre_archivo(trabajador):
+    return re.sub(r"[^\w\-]+", "_", trabajador).strip("_") or "trabajador"
+
+def _plantilla_boleta(b, ini, fin):
+    # fpdf trabaja en latin-1: montos en "CRC", no "₡"
+    return Plantilla(
+        titulo="BOLETA DE PAGO",
+        lineas=[f"Trabajador: {b['trabajador']}", f"Periodo: {ini.strftime('%d/%m/%Y')} al {fin.strftime('%d/%m/%Y')}"],
+        columnas=[Columna("Concepto", 70), Columna("Detalle", 60), Columna("Monto (CRC)", 50, "R", "{:,.2f}")],
+        filas=[
+            ("Jornadas", f"{b['dias']:g} días", b['pago_dias']),
+            ("Horas extra", f"{b['horas_extra']:g} h", b['pago_extras']),
+            ("Cosecha", f"{b['cajuelas']:.2f} cajuelas", b['pago_cosecha']),
+            ("Rebajos (vales)", "", -b['rebajos']),
+        ],
+        total=["NETO A PAGAR", f"Saldo vales: {b['saldo_vales']:,.0f}", b['neto']],
+        firma="Recibido conforme",
+    )
+
+def _renderizar_lote(boletas, ini, fin):
+    """Corre en los procesos hijos: debe ser una función de módulo (picklable)."""
+    return [(f"{_nombre_archivo(b['trabajador'])}.pdf", renderizar(_plantilla_boleta(b, ini, fin)))
+            for b in boletas]
+
+@st.cache_resource
+def get_pool_procesos():
+    """Pool de procesos compartido (spawn: el servidor ya tiene hilos vivos, fork no es seguro)."""
+    return ProcessPoolExecutor(max_workers=os.cpu_count() or 2,
+                               mp_context=multiprocessing.get_context("spawn"))
+
+def generar_zip_boletas(df_boletas, ini, fin, pool=None):
+    """
+    DataFrame de get_datos_boletas -> archivo ZIP (SpooledTemporaryFile, ya rebobinado).
+    pool=None usa el pool compartido; con pocas boletas se dibujan aquí mismo.
+    """
+    boletas = df_boletas.to_dict("records")
+    lotes = [boletas[i:i + BOLETAS_POR_TAREA] for i in range(0, len(boletas), BOLETAS_POR_TAREA)]
+
+    if len(boletas) < MIN_PARA_POOL:
+        resultados = (_renderizar_lote(lote, ini, fin) for lote in lotes)
+    else:
+        pool = pool or get_pool_procesos()
+        # map conserva el orden y entrega cada lote apenas está listo
+        resultados = pool.map(_renderizar_lote, lotes, [ini] * len(lotes), [fin] * len(lotes))
+
+    archivo = tempfile.SpooledTemporaryFile(max_size=MAX_ZIP_EN_MEMORIA)
+    usados = set()
+    with zipfile.ZipFile(archivo, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for lote in resultados:
+            for nombre, pdf in lote:
+                # Dos trabajadores pueden dar el mismo nombre de archivo
+                base, n = nombre[:-4], 1
+                while nombre in usados:
+                    n += 1
+                    nombre = f"{base}_{n}.pdf"
+                usados.add(nombre)
+                zf.writestr(nombre, pdf)
+    archivo.seek(0)
+    return archivo
@@ -0,0 +1,334 @@
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import logging
+import inspect
+import threading
+import functools
+import contextlib
+from collections import OrderedDict
+
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# 🗃️ CACHÉ COMPARTIDA (CATÁLOGOS Y REPORTES)
+# ==========================================
+# st.cache_data vive en la memoria de cada proceso: con varias réplicas cada
+# una calienta lo suyo y limpiar_cache solo limpia la local. Aquí la caché
+# tiene backend intercambiable (FINCA_CACHE_BACKEND):
+#   memoria  LRU en el proceso (por defecto)
+#   sqlite   archivo compartido por las réplicas de la máquina (FINCA_CACHE_PATH)
+# Las llaves llevan versiones por (dueño, tabla): invalidar(owner, tabla)
+# sube una y solo dejan de verse las entradas que leen esa tabla (las que
+# declaran tablas=...); invalidar_owner sube la versión "*" del dueño, que
+# está en todas sus llaves. El tamaño total está acotado (FINCA_CACHE_MB);
+# se desaloja lo menos usado. Las lecturas de database.py se decoran con
+# cache_compartido y las escrituras con invalida_tablas; METRICAS lleva
+# aciertos y fallos por función (Ajustes > Diagnóstico).
+
+BACKEND = os.getenv("FINCA_CACHE_BACKEND", "memoria")
+RUTA_SQLITE = os.getenv("FINCA_CACHE_PATH", "cache_finca.sqlite3")
+MAX_BYTES = int(float(os.getenv("FINCA_CACHE_MB", "64")) * 1024 * 1024)
+FRACCION_MAX_ENTRADA = 0.25   # una entrada no puede ocupar más que esto del total
+TODAS = "*"                   # ámbito de versión que cubre todas las tablas del dueño
+
+
+def _afecta(tablas, ambito):
+    """¿Una entrada que lee `tablas` (None = no declaró) queda vieja al cambiar `ambito`?"""
+    return ambito == TODAS or tablas is None or ambito in tablas
+
+
+class CacheMemoria:
+    """LRU acotado por bytes (valores ya serializados), con versiones por (dueño, tabla)."""
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._datos = OrderedDict()   # clave -> (owner, tablas, bytes, expira)
+        self._bytes = 0
+        self._versiones = {}
+
+    def leer(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            if entrada[3] is not None and entrada[3] < time.time():
+                self._quitar(clave)
+                return None
+            self._datos.move_to_end(clave)
+            return entrada[2]
+
+    def guardar(self, clave, owner, datos, expira=None, tablas=None):
+        with self._lock:
+            if clave in self._datos:
+                self._quitar(clave)
+            self._datos[clave] = (owner, tablas, datos, expira)
+            self._bytes += len(datos)
+            while self._bytes > self.max_bytes and self._datos:
+                self._quitar(next(iter(self._datos)))
+
+    def _quitar(self, clave):
+        _, _, datos, _ = self._datos.pop(clave)
+        self._bytes -= len(datos)
+
+    def versiones(self, owner, ambitos):
+        return tuple(self._versiones.get((owner, a), 0) for a in ambitos)
+
+    def subir_version(self, owner, ambito=TODAS):
+        with self._lock:
+            self._versiones[(owner, ambito)] = self._versiones.get((owner, ambito), 0) + 1
+            for clave in [c for c, e in self._datos.items() if e[0] == owner and _afecta(e[1], ambito)]:
+                self._quitar(clave)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
+
+    def tamano(self):
+        return {"entradas": len(self._datos), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+class CacheSQLite:
+    """Misma interfaz sobre un SQLite compartido (WAL): lo ven todos los procesos de la máquina."""
+
+    # `tablas` va como ",t1,t2," para buscar con LIKE; NULL = no declaró
+    _ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS entradas (
+            clave TEXT PRIMARY KEY, owner TEXT, tablas TEXT, datos BLOB NOT NULL, tam INTEGER NOT NULL,
+            expira REAL, usado REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_entradas_usado ON entradas (usado);
+        CREATE INDEX IF NOT EXISTS idx_entradas_owner ON entradas (owner);
+        CREATE TABLE IF NOT EXISTS versiones (
+            owner TEXT NOT NULL, ambito TEXT NOT NULL, version INTEGER NOT NULL, PRIMARY KEY (owner, ambito)
+        );
+    """
+    VERSION_ESQUEMA = 2
+
+    def __init__(self, ruta=RUTA_SQLITE, max_bytes=MAX_BYTES):
+        self.ruta, self.max_bytes = ruta, max_bytes
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] < self.VERSION_ESQUEMA:
+                # Es una caché: si el archivo es de un esquema anterior se rehace
+                conn.executescript("DROP TABLE IF EXISTS entradas; DROP TABLE IF EXISTS versiones;")
+                conn.execute(f"PRAGMA user_version = {self.VERSION_ESQUEMA}")
+            conn.executescript(self._ESQUEMA)
+
+    @contextlib.contextmanager
+    def _conectar(self):
+        """Conexión corta (una por llamada: sirve desde cualquier hilo)."""
+        conn = sqlite3.connect(self.ruta, timeout=10)
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def leer(self, clave):
+        ahora = time.time()
+        with self._conectar() as conn:
+            fila = conn.execute("SELECT datos, expira FROM entradas WHERE clave=?", (clave,)).fetchone()
+            if fila is None:
+                return None
+            if fila[1] is not None and fila[1] < ahora:
+                conn.execute("DELETE FROM entradas WHERE clave=?", (clave,))
+                return None
+            conn.execute("UPDATE entradas SET usado=? WHERE clave=?", (ahora, clave))
+            return fila[0]
+
+    def guardar(self, clave, owner, datos, expira=None, tablas=None):
+        marcadas = f",{','.join(tablas)}," if tablas is not None else None
+        with self._conectar() as conn:
+            conn.execute("INSERT OR REPLACE INTO entradas VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (clave, owner, marcadas, sqlite3.Binary(datos), len(datos), expira, time.time()))
+            total = conn.execute("SELECT COALESCE(SUM(tam), 0) FROM entradas").fetchone()[0]
+            if total > self.max_bytes:
+                # Borrar las menos usadas hasta liberar lo que sobra
+                conn.execute("""
+                    DELETE FROM entradas WHERE clave IN (
+                        SELECT clave FROM (
+                            SELECT clave, tam, SUM(tam) OVER (ORDER BY usado ROWS UNBOUNDED PRECEDING) AS acumulado
+                            FROM entradas
+                        ) WHERE acumulado - tam < ?
+                    )
+                """, (total - self.max_bytes,))
+
+    def versiones(self, owner, ambitos):
+        with self._conectar() as conn:
+            filas = dict(conn.execute(
+                f"SELECT ambito, version FROM versiones WHERE owner=? AND ambito IN ({','.join('?' * len(ambitos))})",
+                (owner, *ambitos)).fetchall())
+        return tuple(filas.get(a, 0) for a in ambitos)
+
+    def subir_version(self, owner, ambito=TODAS):
+        with self._conectar() as conn:
+            conn.execute("""INSERT INTO versiones (owner, ambito, version) VALUES (?, ?, 1)
+                            ON CONFLICT (owner, ambito) DO UPDATE SET version = version + 1""", (owner, ambito))
+            if ambito == TODAS:
+                conn.execute("DELETE FROM entradas WHERE owner=?", (owner,))
+            else:
+                conn.execute("DELETE FROM entradas WHERE owner=? AND (tablas IS NULL OR tablas LIKE ?)",
+                             (owner, f"%,{ambito},%"))
+
+    def limpiar(self):
+        with self._conectar() as conn:
+            conn.execute("DELETE FROM entradas")
+
+    def tamano(self):
+        with self._conectar() as conn:
+            n, tam = conn.execute("SELECT COUNT(*), COALESCE(SUM(tam), 0) FROM entradas").fetchone()
+        return {"entradas": n, "bytes": tam, "max_bytes": self.max_bytes}
+
+
+BACKENDS = {"memoria": CacheMemoria, "sqlite": CacheSQLite}
+
+@st.cache_resource
+def get_backend():
+    """Backend del proceso según FINCA_CACHE_BACKEND."""
+    if BACKEND not in BACKENDS:
+        logger.warning("FINCA_CACHE_BACKEND=%s no existe, se usa memoria", BACKEND)
+    return BACKENDS.get(BACKEND, CacheMemoria)()
+
+
+# --- Métricas (por proceso) ---
+
+class Metricas:
+    """Aciertos, fallos y tiempo de cálculo por función cacheada."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.por_funcion = {}
+
+    def anotar(self, nombre, acierto, segundos=0.0, tam=0):
+        with self._lock:
+            m = self.por_funcion.setdefault(nombre, {"aciertos": 0, "fallos": 0, "segundos": 0.0, "bytes": 0})
+            if acierto:
+                m["aciertos"] += 1
+            else:
+                m["fallos"] += 1
+                m["segundos"] += segundos
+                m["bytes"] = tam
+
+    def resumen(self):
+        with self._lock:
+            datos = {k: dict(v) for k, v in self.por_funcion.items()}
+        filas = []
+        for nombre, m in datos.items():
+            total = m["aciertos"] + m["fallos"]
+            calculo = m["segundos"] / m["fallos"] if m["fallos"] else 0.0
+            filas.append({
+                "Función": nombre, "Aciertos": m["aciertos"], "Fallos": m["fallos"],
+                "% Aciertos": 100 * m["aciertos"] / total if total else 0.0,
+                "Cálculo medio (ms)": calculo * 1000, "Ahorrado (s)": m["aciertos"] * calculo,
+                "Último tamaño (KB)": m["bytes"] / 1024,
+            })
+        return sorted(filas, key=lambda f: f["Ahorrado (s)"], reverse=True)
+
+    def limpiar(self):
+        with self._lock:
+            self.por_funcion.clear()
+
+METRICAS = Metricas()
+
+
+# --- API ---
+
+_apagada = threading.local()
+
+@contextlib.contextmanager
+def sin_cache():
+    """Dentro del bloque (en este hilo) las funciones cacheadas van siempre a la BD: benchmarks."""
+    antes = getattr(_apagada, "valor", False)
+    _apagada.valor = True
+    try:
+        yield
+    finally:
+        _apagada.valor = antes
+
+
+def _clave(nombre, owner, versiones, argumentos):
+    huella = hashlib.sha1(pickle.dumps((nombre, sorted(argumentos.items())), protocol=4)).hexdigest()
+    return f"{owner}:{'.'.join(map(str, versiones))}:{huella}"
+
+def cache_compartido(ttl=None, spinner=None, tablas=None):
+    """
+    Como st.cache_data, pero sobre el backend compartido. La función tiene
+    que recibir un argumento `owner`. `tablas`: las que lee (para invalidar
+    solo lo afectado); sin declarar, cualquier cambio del dueño la invalida.
+    `ttl` puede ser un número o una función que lo retorne. Devuelve una
+    copia del valor (se guarda serializado), igual que st.cache_data.
+    """
+    ambitos = (TODAS,) + tuple(tablas or ())
+
+    def decorador(funcion):
+        firma = inspect.signature(funcion)
+        nombre = f"{funcion.__module__}.{funcion.__qualname__}"
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if getattr(_apagada, "valor", False):
+                return funcion(*args, **kwargs)
+            ligados = firma.bind(*args, **kwargs)
+            ligados.apply_defaults()
+            owner = ligados.arguments["owner"]
+            backend = get_backend()
+            clave = _clave(nombre, owner, backend.versiones(owner, ambitos), ligados.arguments)
+
+            datos = backend.leer(clave)
+            if datos is not None:
+                METRICAS.anotar(nombre, True)
+                return pickle.loads(datos)
+
+            t0 = time.perf_counter()
+            with st.spinner(spinner) if spinner else contextlib.nullcontext():
+                valor = funcion(*args, **kwargs)
+            datos = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+            METRICAS.anotar(nombre, False, time.perf_counter() - t0, len(datos))
+            if len(datos) <= backend.max_bytes * FRACCION_MAX_ENTRADA:
+                segundos = ttl() if callable(ttl) else ttl
+                backend.guardar(clave, owner, datos, time.time() + segundos if segundos else None,
+                                tuple(tablas) if tablas is not None else None)
+            return valor
+        return envoltura
+    return decorador
+
+def invalidar_owner(owner):
+    """Todo lo cacheado de este dueño deja de valer (en todas las réplicas con backend compartido)."""
+    if owner:
+        get_backend().subir_version(owner, TODAS)
+
+def invalidar_todo():
+    """Vacía la caché (p.ej. si se pudieron perder avisos de cambios)."""
+    get_backend().limpiar()
+
+def invalidar(owner, tabla):
+    """Solo lo cacheado de este dueño que lee `tabla` (lo llama la escucha de cambios)."""
+    if owner:
+        get_backend().subir_version(owner, tabla)
+
+def invalida_tablas(*tablas):
+    """
+    Para funciones de escritura con argumento `owner`: si terminan sin error,
+    sube la versión de (owner, tabla) de cada tabla. Quien escribe ve su
+    cambio en el siguiente rerun, sin esperar el aviso de LISTEN/NOTIFY.
+    """
+    def decorador(funcion):
+        firma = inspect.signature(funcion)
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            resultado = funcion(*args, **kwargs)
+            owner = firma.bind(*args, **kwargs).arguments.get("owner")
+            for tabla in tablas:
+                invalidar(owner, tabla)
+            return resultado
+        return envoltura
+    return decorador
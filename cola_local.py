@@ -0,0 +1,322 @@
+import os
+import time
+import uuid
+import pickle
+import inspect
+import random
+import logging
+import sqlite3
+import datetime
+import threading
+import contextlib
+
+import streamlit as st
+
+import database
+from database import add_recoleccion_batch
+from resiliencia import reenviando, es_transitorio, BDNoDisponible
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# 📥 COLA LOCAL DE COSECHA (OFFLINE-FIRST)
+# ==========================================
+# Cada toque del Registro Rápido se escribe primero en un SQLite local (uno
+# por despliegue). Si se cae la señal o se reinicia la sesión, nada se pierde:
+# el carrito es de cada teléfono (id en la URL), no de la sesión de Streamlit.
+# Un hilo en segundo plano sube a Postgres lo confirmado, por lotes, con
+# reintentos; la llave `clave` evita duplicados si un lote se reenvía.
+# Con la BD caída (interruptor abierto, ver resiliencia) las demás escrituras
+# de captura también esperan aquí, en escrituras_pendientes, y el mismo
+# hilo las reenvía en orden cuando vuelve.
+
+RUTA_COLA = os.getenv("FINCA_COLA_PATH", "cola_cosecha.sqlite3")
+TAM_LOTE_SYNC = 200
+ESPERA_SYNC = 5          # segundos entre rondas si no hay nada que hacer
+ESPERA_MAX_REINTENTO = 300
+MAX_RECHAZOS = 5         # una fila que la BD rechaza tantas veces pasa a 'error'
+DIAS_HISTORIAL = 7       # lo ya sincronizado se guarda unos días por auditoría
+
+# Estados: carrito (en pantalla) -> pendiente (confirmado) -> sincronizado,
+# o 'error' si la BD la rechaza MAX_RECHAZOS veces (queda para revisión)
+_ESQUEMA = """
+    CREATE TABLE IF NOT EXISTS recolecciones_pendientes (
+        clave TEXT PRIMARY KEY, owner TEXT NOT NULL, dispositivo TEXT NOT NULL, trabajador TEXT NOT NULL,
+        cajuelas REAL NOT NULL, precio REAL NOT NULL, hora TEXT NOT NULL,
+        fecha TEXT, lote TEXT, estado TEXT NOT NULL DEFAULT 'carrito',
+        intentos INTEGER NOT NULL DEFAULT 0, proximo_intento REAL NOT NULL DEFAULT 0,
+        ultimo_error TEXT, creado REAL NOT NULL, sincronizado REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_pendientes_carrito ON recolecciones_pendientes (owner, dispositivo, estado);
+    CREATE INDEX IF NOT EXISTS idx_pendientes_estado ON recolecciones_pendientes (estado, proximo_intento);
+    CREATE TABLE IF NOT EXISTS escrituras_pendientes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, funcion TEXT NOT NULL, datos BLOB NOT NULL,
+        estado TEXT NOT NULL DEFAULT 'pendiente', intentos INTEGER NOT NULL DEFAULT 0,
+        ultimo_error TEXT, creado REAL NOT NULL, sincronizado REAL
+    );
+"""
+
+_esquema_listo = False
+
+@contextlib.contextmanager
+def _conectar():
+    """Conexión corta al SQLite local (una por llamada: sirve desde cualquier hilo)."""
+    global _esquema_listo
+    conn = sqlite3.connect(RUTA_COLA, timeout=10)
+    try:
+        if not _esquema_listo:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_ESQUEMA)
+            _esquema_listo = True
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+# --- Carrito (lo que ve el capataz) ---
+
+PARAM_DISPOSITIVO = "d"
+
+def id_dispositivo():
+    """
+    Id estable del teléfono: vive en la URL (?d=...), así sobrevive a recargas,
+    y en session_state, porque st.switch_page borra los query params
+    (auth.recordar_sesion lo vuelve a poner en cada página).
+    """
+    d = st.query_params.get(PARAM_DISPOSITIVO) or st.session_state.get("dispositivo") or uuid.uuid4().hex[:12]
+    st.session_state.dispositivo = d
+    if st.query_params.get(PARAM_DISPOSITIVO) != d:
+        st.query_params[PARAM_DISPOSITIVO] = d
+    return d
+
+def registrar_toque(owner, dispositivo, trabajador, cajuelas, precio):
+    """Guarda un toque de inmediato. Retorna la llave de idempotencia."""
+    clave = uuid.uuid4().hex
+    with _conectar() as conn:
+        conn.execute(
+            "INSERT INTO recolecciones_pendientes (clave, owner, dispositivo, trabajador, cajuelas, precio, hora, creado) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (clave, owner, dispositivo, trabajador, float(cajuelas), float(precio), datetime.datetime.now().strftime("%H:%M"), time.time()))
+    return clave
+
+def get_carrito(owner, dispositivo, limite=-1):
+    """Toques sin confirmar, el más reciente primero."""
+    with _conectar() as conn:
+        filas = conn.execute(
+            "SELECT hora, trabajador, cajuelas, cajuelas * precio FROM recolecciones_pendientes WHERE owner=? AND dispositivo=? AND estado='carrito' ORDER BY creado DESC LIMIT ?",
+            (owner, dispositivo, limite)).fetchall()
+    return [{"Hora": h, "Nombre": t, "Cajuelas": c, "Total": tot} for h, t, c, tot in filas]
+
+def get_resumen_carrito(owner, dispositivo, recientes=15):
+    """Totales del carrito + sus últimos toques, sin traer el carrito entero."""
+    with _conectar() as conn:
+        n, cajuelas, total = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(cajuelas), 0), COALESCE(SUM(cajuelas * precio), 0) FROM recolecciones_pendientes WHERE owner=? AND dispositivo=? AND estado='carrito'",
+            (owner, dispositivo)).fetchone()
+    ultimos = get_carrito(owner, dispositivo, limite=recientes)
+    return {"n": n, "cajuelas": cajuelas, "total": total, "recientes": ultimos}
+
+def vaciar_carrito(owner, dispositivo):
+    with _conectar() as conn:
+        conn.execute("DELETE FROM recolecciones_pendientes WHERE owner=? AND dispositivo=? AND estado='carrito'", (owner, dispositivo))
+
+def confirmar_carrito(owner, dispositivo, fecha, lote, precio):
+    """Pasa el carrito a la cola de envío con la fecha/lote/precio del día. Retorna cuántos."""
+    with _conectar() as conn:
+        cur = conn.execute(
+            "UPDATE recolecciones_pendientes SET estado='pendiente', fecha=?, lote=?, precio=? WHERE owner=? AND dispositivo=? AND estado='carrito'",
+            (str(fecha), lote, float(precio), owner, dispositivo))
+        n = cur.rowcount
+    get_sincronizador().despertar()
+    return n
+
+def get_estado_sync(owner):
+    """{'pendientes': n, 'con_error': n, 'rechazadas': n, 'ultimo_error': str|None} para mostrar en pantalla."""
+    with _conectar() as conn:
+        pendientes, con_error, rechazadas = conn.execute(
+            "SELECT COUNT(*) FILTER (WHERE estado='pendiente'), COUNT(*) FILTER (WHERE estado='pendiente' AND intentos > 0), "
+            "COUNT(*) FILTER (WHERE estado='error') FROM recolecciones_pendientes WHERE owner=? AND estado IN ('pendiente', 'error')",
+            (owner,)).fetchone()
+        err = conn.execute(
+            "SELECT ultimo_error FROM recolecciones_pendientes WHERE owner=? AND estado IN ('pendiente', 'error') AND ultimo_error IS NOT NULL ORDER BY creado DESC LIMIT 1",
+            (owner,)).fetchone()
+    return {"pendientes": pendientes, "con_error": con_error, "rechazadas": rechazadas, "ultimo_error": err[0] if err else None}
+
+# --- Sincronización con Postgres ---
+
+def sincronizar_lote():
+    """Sube un lote de pendientes vencidos. Retorna cuántos se subieron."""
+    ahora = time.time()
+    with _conectar() as conn:
+        filas = conn.execute(
+            "SELECT clave, fecha, trabajador, lote, cajuelas, precio, owner, intentos FROM recolecciones_pendientes "
+            "WHERE estado='pendiente' AND proximo_intento <= ? ORDER BY creado LIMIT ?",
+            (ahora, TAM_LOTE_SYNC)).fetchall()
+    if not filas:
+        return 0
+
+    error = _subir(filas)
+    if error is None:
+        _marcar_subidas(filas, ahora)
+        return len(filas)
+    if _es_caida(error) or len(filas) == 1:
+        _marcar_fallidas(filas, error, ahora)
+        return 0
+
+    # La BD rechazó el lote: fila por fila, para que una mala no frene a las demás
+    subidas = 0
+    for fila in filas:
+        error = _subir([fila])
+        if error is None:
+            _marcar_subidas([fila], ahora)
+            subidas += 1
+        else:
+            _marcar_fallidas([fila], error, ahora)
+            if _es_caida(error):
+                break
+    return subidas
+
+def _es_caida(error):
+    return isinstance(error, BDNoDisponible) or es_transitorio(error)
+
+def _subir(filas):
+    """None si el lote entró; si no, la excepción."""
+    try:
+        add_recoleccion_batch([(f, t, l, c, p, o, clave) for clave, f, t, l, c, p, o, _ in filas], relanzar=True)
+    except Exception as e:
+        return e
+    return None
+
+def _marcar_subidas(filas, ahora):
+    with _conectar() as conn:
+        conn.executemany("UPDATE recolecciones_pendientes SET estado='sincronizado', sincronizado=?, ultimo_error=NULL WHERE clave=?",
+                         [(ahora, f[0]) for f in filas])
+
+def _marcar_fallidas(filas, error, ahora):
+    """
+    Backoff exponencial con jitter por fila. Una caída se reintenta sin
+    límite; un rechazo de la BD (dato inválido...) pasa a 'error' después
+    de MAX_RECHAZOS intentos.
+    """
+    caida = _es_caida(error)
+    if caida:
+        logger.warning("Cola local sin conexión: %s", error)
+    else:
+        logger.error("La BD rechazó %d recolecciones de la cola local: %s", len(filas), error)
+    with _conectar() as conn:
+        conn.executemany(
+            "UPDATE recolecciones_pendientes SET intentos=intentos+1, proximo_intento=?, ultimo_error=?, estado=? WHERE clave=?",
+            [(ahora + min(ESPERA_MAX_REINTENTO, 2 ** (f[7] + 1)) * random.uniform(0.5, 1.0), str(error)[:300],
+              "pendiente" if caida or f[7] + 1 < MAX_RECHAZOS else "error", f[0])
+             for f in filas])
+
+# --- Otras escrituras (solo con la BD caída) ---
+
+# Las que resiliencia.encolar_si_caida puede mandar aquí
+ESCRITURAS_ENCOLABLES = {"add_jornada", "add_insumo", "add_vale", "add_analisis_suelo"}
+
+def encolar_escritura(funcion, args, kwargs):
+    """Guarda la llamada para reenviarla; la BD no la recibió."""
+    if funcion not in ESCRITURAS_ENCOLABLES:
+        raise ValueError(f"{funcion} no se puede encolar")
+    with _conectar() as conn:
+        conn.execute("INSERT INTO escrituras_pendientes (funcion, datos, creado) VALUES (?, ?, ?)",
+                     (funcion, pickle.dumps((args, kwargs)), time.time()))
+    st.toast("📥 Sin conexión: quedó guardado en este servidor y se envía al volver la base de datos")
+    get_sincronizador().despertar()
+
+def _recalcular_suelo(funcion, args, kwargs):
+    # Lo que la página no pudo hacer mientras la escritura estaba en cola
+    from suelos import recalcular_recomendaciones
+    datos = inspect.signature(getattr(database, funcion)).bind(*args, **kwargs).arguments
+    recalcular_recomendaciones(datos["owner"], datos["lote"])
+
+# Pasos que siguen a una escritura reenviada (los que la página se saltó al ver ENCOLADA)
+DESPUES_DEL_REENVIO = {"add_insumo": _recalcular_suelo, "add_analisis_suelo": _recalcular_suelo}
+
+def contar_escrituras_pendientes():
+    with _conectar() as conn:
+        return conn.execute("SELECT COUNT(*) FROM escrituras_pendientes WHERE estado='pendiente'").fetchone()[0]
+
+def sincronizar_escrituras():
+    """
+    Reenvía en orden de llegada. Si la BD sigue caída se detiene (el orden se
+    conserva); cada una lleva clave_idem, así que repetirla tras un corte no
+    duplica. Una escritura que la BD rechaza queda en estado 'error' para
+    revisión y no tranca las demás. Retorna cuántas pasaron.
+    """
+    with _conectar() as conn:
+        filas = conn.execute("SELECT id, funcion, datos FROM escrituras_pendientes WHERE estado='pendiente' ORDER BY id LIMIT ?",
+                             (TAM_LOTE_SYNC,)).fetchall()
+    enviadas = 0
+    for id_, funcion, datos in filas:
+        args, kwargs = pickle.loads(datos)
+        try:
+            with reenviando():
+                getattr(database, funcion)(*args, **kwargs)
+        except Exception as e:
+            caida = isinstance(e, BDNoDisponible) or es_transitorio(e)
+            if caida and not kwargs.get("clave_idem") and not isinstance(e, BDNoDisponible):
+                # Encolada sin llave: no se sabe si el commit llegó, mejor revisarla a mano
+                caida = False
+            if not caida:
+                logger.error("Escritura encolada %s rechazada por la BD: %s", funcion, e)
+            with _conectar() as conn:
+                conn.execute("UPDATE escrituras_pendientes SET intentos=intentos+1, ultimo_error=?, estado=? WHERE id=?",
+                             (str(e)[:300], "pendiente" if caida else "error", id_))
+            if caida:
+                break   # las siguientes esperan a la próxima ronda
+            continue
+        with _conectar() as conn:
+            conn.execute("UPDATE escrituras_pendientes SET estado='sincronizado', sincronizado=?, ultimo_error=NULL WHERE id=?",
+                         (time.time(), id_))
+        enviadas += 1
+        if funcion in DESPUES_DEL_REENVIO:
+            try:
+                DESPUES_DEL_REENVIO[funcion](funcion, args, kwargs)
+            except Exception as e:
+                logger.warning("Paso posterior a %s falló: %s", funcion, e)
+    return enviadas
+
+def purgar_historial():
+    limite = time.time() - DIAS_HISTORIAL * 86400
+    with _conectar() as conn:
+        conn.execute("DELETE FROM recolecciones_pendientes WHERE estado='sincronizado' AND sincronizado < ?", (limite,))
+        conn.execute("DELETE FROM escrituras_pendientes WHERE estado='sincronizado' AND sincronizado < ?", (limite,))
+
+
+class Sincronizador(threading.Thread):
+    """Hilo de fondo que vacía la cola local hacia Postgres."""
+
+    def __init__(self):
+        super().__init__(name="sync-cosecha", daemon=True)
+        self._evento = threading.Event()
+
+    def despertar(self):
+        """Pide una ronda inmediata (p.ej. al confirmar un carrito)."""
+        self._evento.set()
+
+    def run(self):
+        ultima_purga = 0.0
+        while True:
+            try:
+                # Mientras haya lotes completos, seguir subiendo sin esperar
+                while sincronizar_lote() == TAM_LOTE_SYNC:
+                    pass
+                while sincronizar_escrituras() == TAM_LOTE_SYNC:
+                    pass
+                if time.time() - ultima_purga > 3600:
+                    purgar_historial()
+                    ultima_purga = time.time()
+            except Exception as e:
+                logger.exception("Error sincronizando cola local: %s", e)
+            self._evento.wait(ESPERA_SYNC)
+            self._evento.clear()
+
+
+@st.cache_resource
+def get_sincronizador():
+    """Un solo hilo de sincronización por proceso."""
+    hilo = Sincronizador()
+    hilo.start()
+    return hilo
@@ -1,13 +1,25 @@
 import os
+import json
+import time
+import select
 import logging
 import datetime
 import contextlib
-from decimal import Decimal
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
+import pandas as pd
 import streamlit as st
 import psycopg2
+import psycopg2.errors
 from psycopg2 import pool
-import bcrypt
+from psycopg2.extras import execute_batch
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from instrumentacion import REGISTRO, CursorMedido, Medicion, nombre_llamador
+from cache_backend import cache_compartido, invalida_tablas, invalidar, invalidar_todo
+from resiliencia import INTERRUPTOR, BDNoDisponible, es_caida, timeout_ms, reintentar, encolar_si_caida
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +27,55 @@ logger = logging.getLogger(__name__)
 # 🔌 CONEXIÓN & POOLING (OPTIMIZADO)
 # ==========================================
 
+# NUMERIC -> float directamente en el driver.
+# Así ninguna función ni página tiene que convertir Decimal fila por fila.
+NUMERIC_A_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values, "NUMERIC_A_FLOAT",
+    lambda valor, cur: float(valor) if valor is not None else None
+)
+
+class ConexionTipada(psycopg2.extensions.connection):
+    """Conexión del pool: registra los conversores de tipos al abrirse."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        psycopg2.extensions.register_type(NUMERIC_A_FLOAT, self)
+        # Sentencias ya preparadas en esta conexión (None = aún sin preparar)
+        self.preparadas = None
+
+MAX_CONEXIONES = 10
+# Con el pool lleno, getconn espera un cupo hasta este tope en vez de fallar
+# al instante: varias sesiones abriendo Reportes (en_paralelo) hacen fila
+ESPERA_CONEXION_S = float(os.getenv("FINCA_ESPERA_CONEXION_S", "10"))
+
+class PoolConEspera(pool.ThreadedConnectionPool):
+    """ThreadedConnectionPool cuyo getconn se bloquea (con tope) cuando están todas prestadas."""
+    def __init__(self, minconn, maxconn, *args, espera=ESPERA_CONEXION_S, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self._cupos = threading.BoundedSemaphore(maxconn)
+        self.espera = espera
+
+    def getconn(self, key=None):
+        if not self._cupos.acquire(timeout=self.espera):
+            raise pool.PoolError(f"connection pool exhausted (esperó {self.espera:.0f} s)")
+        try:
+            return super().getconn(key)
+        except Exception:
+            self._cupos.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        super().putconn(conn, key, close)
+        # Solo si el pool la recibió: si no, sigue contada como prestada
+        self._cupos.release()
+
+def _leer_database_url():
+    """Lee DATABASE_URL de st.secrets o, si no hay secrets (scripts/CLI), del entorno."""
+    try:
+        db_url = st.secrets.get("DATABASE_URL")
+    except Exception:
+        db_url = None
+    return db_url or os.getenv("DATABASE_URL")
+
 @st.cache_resource
 def get_connection_pool():
     """
@@ -23,77 +84,511 @@ def get_connection_pool():
     """
     try:
         # 1. Obtener URL
-        db_url = st.secrets.get("DATABASE_URL")
-        if not db_url:
-            db_url = os.getenv("DATABASE_URL")
+        db_url = _leer_database_url()
         
         if not db_url:
             raise ValueError("❌ No se encontró DATABASE_URL en secrets o env.")
 
-        # 2. Crear Pool (Min 1, Max 10 conexiones)
-        return psycopg2.pool.SimpleConnectionPool(
+        # 2. Crear Pool (Min 1, Max MAX_CONEXIONES)
+        # Threaded: lo comparten las sesiones de Streamlit y los hilos de en_paralelo
+        pool_conexiones = PoolConEspera(
             minconn=1,
-            maxconn=10,
+            maxconn=MAX_CONEXIONES,
             dsn=db_url,
             connect_timeout=5,
-            sslmode='require' # Requerido por Supabase
+            # Requerido por Supabase; DB_SSLMODE=disable para un Postgres local (benchmarks)
+            sslmode=os.getenv("DB_SSLMODE", "require"),
+            connection_factory=ConexionTipada
         )
+        # 3. Partición de la temporada siguiente antes de que empiece (si no, todo cae en DEFAULT)
+        _asegurar_particiones_vigentes(pool_conexiones)
+        # 4. Junto al pool, el hilo que escucha los avisos de cambios
+        get_escucha_cambios()
+        return pool_conexiones
     except psycopg2.Error as e:
         logger.error(f"Error fatal creando Pool de DB: {e}")
         st.error("Error de conexión a la Base de Datos. Revise los logs.")
         return None
 
+# ==========================================
+# 📣 AVISOS DE CAMBIOS (LISTEN/NOTIFY)
+# ==========================================
+# Los triggers de create_all_tables hacen pg_notify(CANAL_CAMBIOS) con el
+# dueño y la tabla de cada fila escrita (Postgres junta los avisos repetidos
+# de una misma transacción). Un hilo por proceso escucha en su propia
+# conexión y desaloja solo las entradas de caché de ese dueño que leen esa
+# tabla. Así un lote de cosecha guardado por un capataz se ve enseguida en
+# las pantallas de los demás, en cualquier réplica.
+
+CANAL_CAMBIOS = "finca_cambios"
+TABLAS_CON_AVISO = (
+    "recolecciones", "jornadas", "insumos", "vales", "planes",
+    "fincas", "trabajadores", "catalogo_productos", "catalogo_labores", "tarifas",
+)
+ESPERA_AVISOS = 30           # segundos sin avisos antes de comprobar la conexión
+ESPERA_MAX_RECONEXION = 300
+
+class EscuchaCambios(threading.Thread):
+    """Hilo LISTEN: aplica cada aviso {owner, tabla} a la caché compartida."""
+
+    def __init__(self, dsn):
+        super().__init__(name="escucha-cambios", daemon=True)
+        self.dsn = dsn
+        self.activa = False      # conectado y escuchando
+        self.avisos = 0
+
+    def run(self):
+        espera, conectada_antes = 1, False
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn, connect_timeout=5, sslmode=os.getenv("DB_SSLMODE", "require"))
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {CANAL_CAMBIOS}")
+                if conectada_antes:
+                    # Mientras estuvo caída se pudieron perder avisos
+                    invalidar_todo()
+                self.activa, conectada_antes, espera = True, True, 1
+                while True:
+                    if select.select([conn], [], [], ESPERA_AVISOS)[0]:
+                        conn.poll()
+                    else:
+                        cur.execute("SELECT 1")  # detecta una conexión muerta
+                    self._aplicar(conn)
+            except Exception as e:
+                self.activa = False
+                logger.warning("Escucha de cambios caída (%s); reintento en %s s", e, espera)
+                time.sleep(espera)
+                espera = min(espera * 2, ESPERA_MAX_RECONEXION)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _aplicar(self, conn):
+        cambios = set()
+        while conn.notifies:
+            aviso = conn.notifies.pop(0)
+            try:
+                datos = json.loads(aviso.payload)
+                cambios.add((datos["owner"], datos["tabla"]))
+            except (ValueError, KeyError):
+                logger.warning("Aviso de cambio ilegible: %r", aviso.payload)
+        for owner, tabla in cambios:
+            invalidar(owner, tabla)
+        self.avisos += len(cambios)
+
+@st.cache_resource
+def get_escucha_cambios():
+    """Un hilo por proceso (FINCA_AVISOS=0 lo apaga)."""
+    db_url = _leer_database_url()
+    if not db_url or os.getenv("FINCA_AVISOS", "1") == "0":
+        return None
+    escucha = EscuchaCambios(db_url)
+    escucha.start()
+    return escucha
+
+def escucha_activa():
+    """¿Llegan avisos de cambios? Si no, las cachés deben vencer pronto."""
+    escucha = get_escucha_cambios()
+    return escucha is not None and escucha.activa
+
+def ttl_lecturas():
+    """TTL de las lecturas cacheadas: con avisos de cambios pueden durar; sin ellos, 60 s."""
+    return 3600 if escucha_activa() else 60
+
+def _crear_avisos(cur, tablas=TABLAS_CON_AVISO):
+    """Trigger de aviso en cada tabla de `tablas` (por defecto TABLAS_CON_AVISO)."""
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION notificar_cambio() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{CANAL_CAMBIOS}', json_build_object(
+                'owner', CASE WHEN TG_OP = 'DELETE' THEN OLD.owner ELSE NEW.owner END,
+                'tabla', TG_ARGV[0])::text);
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql;
+    """)
+    for tabla in tablas:
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_aviso_{tabla} ON {tabla}")
+        cur.execute(f"""CREATE TRIGGER trg_aviso_{tabla} AFTER INSERT OR UPDATE OR DELETE ON {tabla}
+                        FOR EACH ROW EXECUTE FUNCTION notificar_cambio('{tabla}')""")
+
+# Tablas que suma resumen_diario_lote (rentabilidad.refrescar_resumen_diario)
+TABLAS_DEL_RESUMEN = ("recolecciones", "jornadas", "insumos")
+
+def _crear_marcas_resumen(cur, tablas=TABLAS_DEL_RESUMEN):
+    """
+    Trigger que anota en resumen_diario_sucio cada (owner, fecha) de una
+    temporada cerrada que cambia: mientras no se rehaga el acumulado,
+    rentabilidad lee esa temporada de las tablas crudas.
+    """
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION marcar_resumen_sucio() RETURNS trigger AS $$
+        DECLARE
+            inicio DATE := make_date(EXTRACT(YEAR FROM CURRENT_DATE - INTERVAL '{MES_INICIO_TEMPORADA - 1} months')::int,
+                                     {MES_INICIO_TEMPORADA}, 1);
+        BEGIN
+            IF TG_OP <> 'INSERT' AND OLD.fecha < inicio AND OLD.owner IS NOT NULL THEN
+                INSERT INTO resumen_diario_sucio VALUES (OLD.owner, OLD.fecha) ON CONFLICT DO NOTHING;
+            END IF;
+            IF TG_OP <> 'DELETE' AND NEW.fecha < inicio AND NEW.owner IS NOT NULL THEN
+                INSERT INTO resumen_diario_sucio VALUES (NEW.owner, NEW.fecha) ON CONFLICT DO NOTHING;
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql;
+    """)
+    for tabla in tablas:
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_resumen_{tabla} ON {tabla}")
+        cur.execute(f"""CREATE TRIGGER trg_resumen_{tabla} AFTER INSERT OR UPDATE OR DELETE ON {tabla}
+                        FOR EACH ROW EXECUTE FUNCTION marcar_resumen_sucio()""")
+
 @contextlib.contextmanager
-def get_db_cursor():
+def get_db_cursor(nombre=None, clase=None):
     """
     Context manager que pide una conexión prestada al pool, 
     entrega el cursor, y devuelve la conexión al terminar.
+    Con `nombre` el cursor es del lado del servidor (lee por lotes).
+    `clase` ("interactiva", "reporte", "masiva") fija el statement_timeout;
+    por defecto interactiva, o reporte con cursor del lado del servidor.
+    Cada préstamo queda medido en instrumentacion.REGISTRO, y las caídas
+    de conexión alimentan el interruptor (resiliencia.INTERRUPTOR).
     """
-    connection_pool = get_connection_pool()
-    if connection_pool is None:
-        raise Exception("No hay conexión a la base de datos (Pool falló).")
-
+    # Errores de programación (clase desconocida) antes de tocar el interruptor
+    funcion = nombre_llamador()
+    ms = timeout_ms(clase or ("reporte" if nombre else "interactiva"))
     conn = None
+    caida = False
+    permitido = False
     try:
-        # Pedir conexión prestada
-        conn = connection_pool.getconn()
-        
-        # Si la conexión se murió por inactividad, pedir otra
-        if conn.closed:
-            connection_pool.putconn(conn, close=True)
+        # BD caída hace poco: fallar ya, sin esperar connect_timeout. Desde aquí
+        # todo termina en exito() o fallo(): una prueba semiabierta no queda colgada
+        INTERRUPTOR.permitir()
+        permitido = True
+        try:
+            connection_pool = get_connection_pool()
+        except Exception:
+            caida = True
+            raise
+        if connection_pool is None:
+            # No quedarse con el pool fallido en caché: el próximo préstamo lo reintenta
+            get_connection_pool.clear()
+            caida = True
+            raise BDNoDisponible("No hay conexión a la base de datos (Pool falló).")
+
+        # Pedir conexión prestada (el tiempo de espera también se mide)
+        t0 = time.perf_counter()
+        try:
             conn = connection_pool.getconn()
 
-        cur = conn.cursor()
+            # Si la conexión se murió por inactividad, pedir otra
+            if conn.closed:
+                connection_pool.putconn(conn, close=True)
+                conn = connection_pool.getconn()
+
+            # statement_timeout de la clase; solo cambia si la conexión traía otro.
+            # En autocommit es un solo viaje (sin BEGIN/COMMIT) y, a diferencia de
+            # SET LOCAL, vale para todas las transacciones del préstamo.
+            if getattr(conn, "timeout_ms", None) != ms:
+                conn.autocommit = True
+                try:
+                    with conn.cursor() as c:
+                        c.execute("SET statement_timeout = %s", (ms,))
+                finally:
+                    conn.autocommit = False
+                conn.timeout_ms = ms
+        except pool.PoolError:
+            REGISTRO.anotar_pool_agotado(funcion)
+            raise
+        except psycopg2.Error as e:
+            caida = es_caida(e)
+            raise
+        espera = time.perf_counter() - t0
+
+        # Primera vez que se presta esta conexión: preparar las consultas calientes
+        if getattr(conn, "preparadas", ()) is None:
+            try:
+                _preparar_todas(conn)
+            except psycopg2.Error as e:
+                caida = es_caida(e)
+                raise
+
+        cur = conn.cursor(name=nombre, cursor_factory=CursorMedido)
+        cur.medicion = Medicion(funcion, espera)
         try:
             yield cur, conn
             # Nota: El commit lo hace la función que llama, no aquí automáticamente.
         except psycopg2.Error as e:
-            conn.rollback()
+            cur.medicion.error = type(e).__name__
+            caida = es_caida(e)
+            if not conn.closed:
+                conn.rollback()
             logger.exception("Error SQL: %s", e)
             raise
         except Exception as e:
-            conn.rollback()
+            cur.medicion.error = type(e).__name__
+            if not conn.closed:
+                conn.rollback()
             logger.exception("Error General DB: %s", e)
             raise
         finally:
-            cur.close()
+            if not conn.closed:
+                cur.close()
+            REGISTRO.registrar(cur.medicion)
     finally:
-        # Devolver conexión al pool (IMPORTANTE)
+        # La BD respondió (aunque sea con un error de SQL) o no: al interruptor
+        if permitido:
+            if caida:
+                INTERRUPTOR.fallo()
+            else:
+                INTERRUPTOR.exito()
+        # Devolver conexión al pool (IMPORTANTE); una conexión rota se descarta
         if conn:
             try:
-                connection_pool.putconn(conn)
+                connection_pool.putconn(conn, close=bool(conn.closed))
             except Exception:
                 pass # Si falla devolverla, el pool la reciclará eventualmente
 
+# ==========================================
+# 🧵 LECTURAS EN PARALELO
+# ==========================================
+
+# Hilos compartidos por todo el proceso: el abanico de todas las sesiones
+# juntas no pasa de MAX_HILOS_CONSULTA conexiones, y deja margen en el pool
+# (MAX_CONEXIONES) para las demás. Si aun así se llena, PoolConEspera hace fila.
+MAX_HILOS_CONSULTA = 4
+
+@st.cache_resource
+def get_executor_consultas():
+    return ThreadPoolExecutor(max_workers=MAX_HILOS_CONSULTA, thread_name_prefix="consulta")
+
+def consultar(sql, params=None, uno=False, clase="interactiva"):
+    """Lectura simple en su propia conexión del pool (fetchall, o fetchone con uno=True)."""
+    with get_db_cursor(clase=clase) as (cur, _):
+        cur.execute(sql, params)
+        return cur.fetchone() if uno else cur.fetchall()
+
+def lanzar(funcion, *args):
+    """Ejecuta funcion(*args) en segundo plano y retorna el Future."""
+    ctx = get_script_run_ctx()
+
+    def tarea():
+        # Mismo contexto de Streamlit que la sesión que la lanzó (cachés, st.error...)
+        hilo = threading.current_thread()
+        add_script_run_ctx(hilo, ctx)
+        try:
+            return funcion(*args)
+        finally:
+            # El hilo vuelve al executor: que la próxima tarea no herede esta sesión
+            for atributo in [k for k, v in vars(hilo).items() if ctx is not None and v is ctx]:
+                delattr(hilo, atributo)
+
+    return get_executor_consultas().submit(tarea)
+
+def en_paralelo(**tareas):
+    """
+    Lanza lecturas independientes a la vez, cada una con su conexión del pool.
+    tareas: nombre=(funcion, *args). Retorna {nombre: resultado}.
+    La latencia total es la de la consulta más lenta, no la suma.
+    """
+    if threading.current_thread().name.startswith("consulta"):
+        # Ya estamos en un hilo del executor: anidar podría bloquearlo
+        return {k: f(*a) for k, (f, *a) in tareas.items()}
+    futuros = {k: lanzar(f, *a) for k, (f, *a) in tareas.items()}
+    return {k: fut.result() for k, fut in futuros.items()}
+
+# ==========================================
+# ⚡ SENTENCIAS PREPARADAS (CONSULTAS CALIENTES)
+# ==========================================
+
+# nombre -> (tipos de parámetros, SQL). Se preparan una vez por conexión del
+# pool y luego se ejecutan por nombre: Postgres no vuelve a parsear ni planear.
+SENTENCIAS_PREPARADAS = {
+    "fincas": ("text", "SELECT nombre FROM fincas WHERE owner = $1 ORDER BY nombre"),
+    "trabajadores": ("text", "SELECT nombre_completo FROM trabajadores WHERE owner = $1 ORDER BY nombre_completo"),
+    "trabajadores_tipo": ("text, text", "SELECT nombre_completo FROM trabajadores WHERE owner = $1 AND tipo = $2 ORDER BY nombre_completo"),
+    "catalogo_productos": ("text", "SELECT nombre FROM catalogo_productos WHERE owner = $1 ORDER BY nombre"),
+    "catalogo_labores": ("text", "SELECT nombre FROM catalogo_labores WHERE owner = $1 ORDER BY nombre"),
+    "saldo_global": ("text", "SELECT trabajador, SUM(monto) FROM vales WHERE owner = $1 GROUP BY trabajador"),
+    "tarifas": ("text", "SELECT pago_dia, pago_hora_extra FROM tarifas WHERE owner = $1"),
+    "jornadas_between": ("text, date, date", """
+        SELECT id AS "ID", trabajador AS "Trab", fecha AS "Fecha", lote AS "Lote", actividad AS "Act",
+               dias AS "Días", horas_normales AS "HN", horas_extra AS "Ext"
+        FROM jornadas WHERE owner = $1 AND fecha >= $2 AND fecha <= $3"""),
+    "list_plans": ("text, date, date", """
+        SELECT id, fecha, lote, tipo, trabajador, actividad, etapa, producto, dosis, cantidad, precio_unitario,
+               dias, horas_extra, estado, recur_every_days, recur_times, recur_autorenew
+        FROM planes WHERE owner = $1 AND fecha >= $2 AND fecha <= $3 ORDER BY fecha ASC"""),
+    "ins_recoleccion": ("date, text, text, numeric, numeric, text, text", """
+        INSERT INTO recolecciones (fecha, trabajador, lote, cajuelas, precio_cajuela, owner, clave_idem)
+        VALUES ($1, $2, $3, $4, $5, $6, $7)
+        ON CONFLICT (clave_idem, fecha) DO NOTHING"""),
+}
+
+def _sql_prepare(nombre):
+    tipos, sql = SENTENCIAS_PREPARADAS[nombre]
+    return f"PREPARE {nombre} ({tipos}) AS {sql}"
+
+def _preparar_todas(conn):
+    """Prepara todo el registro en un solo viaje. Si falla (p.ej. falta una tabla), quedan para preparar al usarse."""
+    cur = conn.cursor()
+    try:
+        cur.execute(";".join(_sql_prepare(n) for n in SENTENCIAS_PREPARADAS))
+        conn.commit()
+        conn.preparadas = set(SENTENCIAS_PREPARADAS)
+    except psycopg2.Error as e:
+        conn.rollback()
+        logger.warning("No se pudieron preparar las consultas: %s", e)
+        # PREPARE no se deshace con el rollback: anotar las que sí quedaron
+        cur.execute("SELECT name FROM pg_prepared_statements")
+        conn.preparadas = {row[0] for row in cur.fetchall()} & set(SENTENCIAS_PREPARADAS)
+        conn.rollback()
+    finally:
+        cur.close()
+
+def sql_execute(nombre):
+    """'EXECUTE nombre (%s, ...)' con tantos parámetros como la sentencia."""
+    n = len(SENTENCIAS_PREPARADAS[nombre][0].split(","))
+    return f"EXECUTE {nombre} ({', '.join(['%s'] * n)})"
+
+def asegurar_preparada(cur, nombre):
+    """Prepara `nombre` en la conexión del cursor si todavía no lo está."""
+    preparadas = cur.connection.preparadas
+    if nombre not in preparadas:
+        cur.execute(_sql_prepare(nombre))
+        preparadas.add(nombre)
+
+def ejecutar_preparada(cur, nombre, params):
+    asegurar_preparada(cur, nombre)
+    cur.execute(sql_execute(nombre), params)
+
+# ==========================================
+# 📐 LECTURA COLUMNAR (DataFrames / Arrow)
+# ==========================================
+
+# OID de Postgres -> dtype NumPy. Lo que no está aquí queda como object.
+_DTYPES_NUMPY = {
+    16: "bool", 20: "int64", 21: "int64", 23: "int64",
+    700: "float64", 701: "float64", 1700: "float64",
+}
+
+def _columna_numpy(valores, type_code):
+    """Convierte los valores de una columna (un lote) en un array tipado."""
+    dtype = _DTYPES_NUMPY.get(type_code)
+    if dtype and None not in valores:
+        return np.fromiter(valores, dtype=dtype, count=len(valores))
+    if dtype and dtype != "bool":
+        # Numérico con nulos: float con NaN
+        return np.array([np.nan if v is None else v for v in valores], dtype="float64")
+    col = np.empty(len(valores), dtype=object)
+    col[:] = valores
+    return col
+
+def fetch_frame(sql, params=None, como="pandas", tam_lote=10_000, servidor=False, preparada=None, clase=None):
+    """
+    Ejecuta una consulta y devuelve un DataFrame (o un pyarrow.Table con como="arrow").
+    Los nombres de columna salen de cursor.description: usar alias en el SQL.
+    Las filas se leen por lotes y se pasan a columnas NumPy tipadas.
+    servidor=True usa un cursor con nombre (para exportaciones grandes).
+    preparada="nombre" ejecuta una sentencia de SENTENCIAS_PREPARADAS en vez de `sql`.
+    clase: statement_timeout (ver get_db_cursor); por defecto reporte, o masiva con servidor=True.
+    """
+    clase = clase or ("masiva" if servidor else "reporte")
+    with get_db_cursor(nombre="fetch_frame" if servidor else None, clase=clase) as (cur, _):
+        cur.itersize = tam_lote
+        if preparada:
+            ejecutar_preparada(cur, preparada, params)
+        else:
+            cur.execute(sql, params)
+        lotes = []
+        while True:
+            filas = cur.fetchmany(tam_lote)
+            if not filas:
+                break
+            lotes.append([_columna_numpy(col, d.type_code) for col, d in zip(zip(*filas), cur.description)])
+        descripcion = cur.description
+
+    nombres = [d.name for d in descripcion]
+    if lotes:
+        columnas = [np.concatenate(partes) if len(partes) > 1 else partes[0] for partes in zip(*lotes)]
+    else:
+        columnas = [np.empty(0, dtype=_DTYPES_NUMPY.get(d.type_code, object)) for d in descripcion]
+
+    if como == "arrow":
+        import pyarrow as pa
+        return pa.table([pa.array(c, from_pandas=True) for c in columnas], names=nombres)
+    return pd.DataFrame(dict(zip(nombres, columnas)), copy=False)
+
 # ==========================================
 # 🛠️ CREACIÓN DE TABLAS (AUTO-MANTENIMIENTO)
 # ==========================================
 
-def create_all_tables():
-    """Crea tablas y ejecuta migraciones ligeras."""
-    with get_db_cursor() as (cur, conn):
+# Columnas de las tablas que crecen todos los días (sin el id).
+# Se declaran una sola vez para poder crearlas normales o particionadas.
+_COLUMNAS_OPERATIVAS = {
+    "jornadas": """
+        trabajador TEXT, fecha DATE, lote TEXT,
+        actividad TEXT, dias NUMERIC, horas_normales NUMERIC,
+        horas_extra NUMERIC, owner TEXT, clave_idem TEXT
+    """,
+    "insumos": """
+        fecha DATE, lote TEXT, tipo TEXT,
+        etapa TEXT, producto TEXT, dosis TEXT, cantidad NUMERIC,
+        precio_unitario NUMERIC,
+        costo_total NUMERIC GENERATED ALWAYS AS (cantidad * precio_unitario) STORED,
+        owner TEXT, clave_idem TEXT
+    """,
+    "recolecciones": """
+        fecha DATE, trabajador TEXT, lote TEXT,
+        cajuelas NUMERIC, precio_cajuela NUMERIC,
+        total_pagar NUMERIC GENERATED ALWAYS AS (cajuelas * precio_cajuela) STORED,
+        owner TEXT, clave_idem TEXT
+    """,
+    "vales": """
+        fecha DATE, trabajador TEXT,
+        monto NUMERIC, concepto TEXT, owner TEXT, clave_idem TEXT
+    """,
+}
+TABLAS_PARTICIONABLES = tuple(_COLUMNAS_OPERATIVAS)
+
+# Índices propios de cada tabla operativa, además de (owner, fecha).
+# Van aquí y no sueltos en create_all_tables para que migrar_a_particionado
+# los cree también en la tabla nueva.
+# Todas llevan la llave de idempotencia de la cola local (con fecha, por las particiones).
+_INDICES_OPERATIVOS = {
+    tabla: [f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{tabla}_clave_idem ON {tabla} (clave_idem, fecha)"]
+    for tabla in _COLUMNAS_OPERATIVAS
+}
+# Suelos: insumos recientes del lote
+_INDICES_OPERATIVOS["insumos"].append("CREATE INDEX IF NOT EXISTS idx_insumos_owner_lote_fecha ON insumos (owner, lote, fecha)")
+
+def _crear_tabla_operativa(cur, tabla, particionado):
+    cols = _COLUMNAS_OPERATIVAS[tabla]
+    if particionado:
+        # La clave de partición (fecha) tiene que ser parte de la PK
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {tabla} (id SERIAL, {cols}, PRIMARY KEY (id, fecha)) PARTITION BY RANGE (fecha);")
+        asegurar_particiones(cur, tabla)
+    else:
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {tabla} (id SERIAL PRIMARY KEY, {cols});")
+    # Todas las consultas filtran por dueño y rango de fechas
+    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla}_owner_fecha ON {tabla} (owner, fecha)")
+
+def _crear_indices_operativos(cur, tabla):
+    for sql in _INDICES_OPERATIVOS.get(tabla, ()):
+        cur.execute(sql)
+
+def create_all_tables(particionado=False):
+    """
+    Crea tablas y ejecuta migraciones ligeras.
+    Con particionado=True, recolecciones/jornadas/insumos/vales se crean
+    particionadas por temporada de cosecha (ver asegurar_particiones).
+    """
+    with get_db_cursor(clase="masiva") as (cur, conn):
         # --- USUARIOS ---
         cur.execute("CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password TEXT NOT NULL);")
+        # Versión de credenciales: va firmada en el token de sesión (auth.py); subirla cierra todas
+        cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS sesion_version INTEGER NOT NULL DEFAULT 0")
+        # Tokens de "Salir", compartidos por todas las réplicas hasta que vencen
+        cur.execute("CREATE TABLE IF NOT EXISTS sesiones_revocadas (firma TEXT PRIMARY KEY, expira TIMESTAMPTZ NOT NULL);")
 
         # --- FINCAS & MAPAS ---
         cur.execute("CREATE TABLE IF NOT EXISTS fincas (id SERIAL PRIMARY KEY, nombre TEXT NOT NULL, owner TEXT NOT NULL);")
@@ -103,6 +598,7 @@ def create_all_tables():
             cur.execute("ALTER TABLE fincas ADD COLUMN IF NOT EXISTS latitud NUMERIC DEFAULT 0.0")
             cur.execute("ALTER TABLE fincas ADD COLUMN IF NOT EXISTS longitud NUMERIC DEFAULT 0.0")
             cur.execute("ALTER TABLE fincas ADD COLUMN IF NOT EXISTS poligono_geojson TEXT")
+            cur.execute("ALTER TABLE fincas ADD COLUMN IF NOT EXISTS hectareas NUMERIC")
             conn.commit()
         except psycopg2.Error:
             conn.rollback()
@@ -115,26 +611,29 @@ def create_all_tables():
             );
         """)
 
-        # --- OPERATIVAS ---
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS jornadas (
-                id SERIAL PRIMARY KEY, trabajador TEXT, fecha DATE, lote TEXT,
-                actividad TEXT, dias NUMERIC, horas_normales NUMERIC,
-                horas_extra NUMERIC, owner TEXT
-            );
-        """)
+        # --- OPERATIVAS (particionables por temporada) ---
+        for tabla in TABLAS_PARTICIONABLES:
+            _crear_tabla_operativa(cur, tabla, particionado)
 
+        # Tablas creadas antes de la cola local no traen clave_idem
+        for tabla in TABLAS_PARTICIONABLES:
+            cur.execute(f"ALTER TABLE {tabla} ADD COLUMN IF NOT EXISTS clave_idem TEXT")
+            _crear_indices_operativos(cur, tabla)
+
+        cur.execute("CREATE TABLE IF NOT EXISTS tarifas (owner TEXT PRIMARY KEY, pago_dia NUMERIC DEFAULT 0, pago_hora_extra NUMERIC DEFAULT 0);")
+        cur.execute("ALTER TABLE tarifas ADD COLUMN IF NOT EXISTS precio_venta_cajuela NUMERIC DEFAULT 0")
+
+        # Acumulado diario por lote (lo llena rentabilidad.refrescar_resumen_diario)
         cur.execute("""
-            CREATE TABLE IF NOT EXISTS insumos (
-                id SERIAL PRIMARY KEY, fecha DATE, lote TEXT, tipo TEXT,
-                etapa TEXT, producto TEXT, dosis TEXT, cantidad NUMERIC,
-                precio_unitario NUMERIC,
-                costo_total NUMERIC GENERATED ALWAYS AS (cantidad * precio_unitario) STORED,
-                owner TEXT
+            CREATE TABLE IF NOT EXISTS resumen_diario_lote (
+                owner TEXT NOT NULL, lote TEXT NOT NULL, fecha DATE NOT NULL,
+                cajuelas NUMERIC DEFAULT 0, costo_cosecha NUMERIC DEFAULT 0,
+                dias NUMERIC DEFAULT 0, horas_extra NUMERIC DEFAULT 0, costo_insumos NUMERIC DEFAULT 0,
+                PRIMARY KEY (owner, lote, fecha)
             );
         """)
-
-        cur.execute("CREATE TABLE IF NOT EXISTS tarifas (owner TEXT PRIMARY KEY, pago_dia NUMERIC DEFAULT 0, pago_hora_extra NUMERIC DEFAULT 0);")
+        # Días de temporadas cerradas que cambiaron después del último acumulado (_crear_marcas_resumen)
+        cur.execute("CREATE TABLE IF NOT EXISTS resumen_diario_sucio (owner TEXT NOT NULL, fecha DATE NOT NULL, PRIMARY KEY (owner, fecha));")
 
         cur.execute("""
             CREATE TABLE IF NOT EXISTS planes (
@@ -146,6 +645,8 @@ def create_all_tables():
                 recur_autorenew BOOLEAN DEFAULT FALSE, owner TEXT
             );
         """)
+        # list_plans filtra por dueño y rango de fechas (ordenado por fecha)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_planes_owner_fecha ON planes (owner, fecha)")
 
         cur.execute("""
             CREATE TABLE IF NOT EXISTS cierres_mensuales (
@@ -156,70 +657,308 @@ def create_all_tables():
         """)
 
         cur.execute("""
-            CREATE TABLE IF NOT EXISTS recolecciones (
-                id SERIAL PRIMARY KEY, fecha DATE, trabajador TEXT, lote TEXT,
-                cajuelas NUMERIC, precio_cajuela NUMERIC,
-                total_pagar NUMERIC GENERATED ALWAYS AS (cajuelas * precio_cajuela) STORED,
-                owner TEXT
+            CREATE TABLE IF NOT EXISTS analisis_suelo (
+                id SERIAL PRIMARY KEY, fecha DATE, lote TEXT,
+                ph NUMERIC, nitrogeno NUMERIC, fosforo NUMERIC, potasio NUMERIC,
+                notas TEXT, owner TEXT
             );
         """)
+        # Suelos: último análisis por lote (DISTINCT ON); el de insumos está en _INDICES_OPERATIVOS
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_analisis_suelo_owner_lote_fecha ON analisis_suelo (owner, lote, fecha DESC)")
+        cur.execute("ALTER TABLE analisis_suelo ADD COLUMN IF NOT EXISTS clave_idem TEXT")
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_analisis_suelo_clave_idem ON analisis_suelo (clave_idem, fecha)")
 
+        # Acumulado mensual de insumos (se suma en add_insumo; ver analitica_insumos.py)
         cur.execute("""
-            CREATE TABLE IF NOT EXISTS vales (
-                id SERIAL PRIMARY KEY, fecha DATE, trabajador TEXT,
-                monto NUMERIC, concepto TEXT, owner TEXT
+            CREATE TABLE IF NOT EXISTS resumen_mensual_insumos (
+                owner TEXT NOT NULL, mes DATE NOT NULL, lote TEXT NOT NULL,
+                producto TEXT NOT NULL, tipo TEXT NOT NULL,
+                cantidad NUMERIC DEFAULT 0, gasto NUMERIC DEFAULT 0, registros INTEGER DEFAULT 0,
+                precio_min NUMERIC, precio_max NUMERIC,
+                PRIMARY KEY (owner, mes, lote, producto, tipo)
             );
         """)
-
         cur.execute("""
-            CREATE TABLE IF NOT EXISTS analisis_suelo (
-                id SERIAL PRIMARY KEY, fecha DATE, lote TEXT,
+            CREATE TABLE IF NOT EXISTS recomendaciones_suelo (
+                owner TEXT NOT NULL, lote TEXT NOT NULL, fecha_analisis DATE,
                 ph NUMERIC, nitrogeno NUMERIC, fosforo NUMERIC, potasio NUMERIC,
-                notas TEXT, owner TEXT
+                ultimo_abono DATE, ultima_cal DATE, abono_reciente NUMERIC DEFAULT 0,
+                recomendacion TEXT, actualizado TIMESTAMP DEFAULT NOW(),
+                PRIMARY KEY (owner, lote)
             );
         """)
 
         # --- CATÁLOGOS ---
         cur.execute("CREATE TABLE IF NOT EXISTS catalogo_productos (id SERIAL PRIMARY KEY, nombre TEXT NOT NULL, owner TEXT NOT NULL);")
         cur.execute("CREATE TABLE IF NOT EXISTS catalogo_labores (id SERIAL PRIMARY KEY, nombre TEXT NOT NULL, owner TEXT NOT NULL);")
+        conn.commit()
+
+        # --- AVISOS DE CAMBIOS (para invalidar cachés) ---
+        try:
+            _crear_avisos(cur)
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            logger.warning("No se pudieron crear los triggers de aviso: %s", e)
+
+        # --- CORRECCIONES TARDÍAS (acumulado diario de rentabilidad) ---
+        try:
+            _crear_marcas_resumen(cur)
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            logger.warning("No se pudieron crear los triggers del acumulado diario: %s", e)
 
+
+# ==========================================
+# 🗄️ PARTICIONES & ARCHIVO DE TEMPORADAS
+# ==========================================
+
+# La temporada de cosecha arranca en octubre: la "temporada 2025" va del
+# 1-oct-2025 al 30-sep-2026. Cada temporada es una partición por tabla.
+MES_INICIO_TEMPORADA = 10
+
+def temporada_de(fecha):
+    """Año de inicio de la temporada a la que pertenece una fecha."""
+    return fecha.year if fecha.month >= MES_INICIO_TEMPORADA else fecha.year - 1
+
+def rango_temporada(temporada):
+    """Retorna (inicio, fin_exclusivo) de una temporada."""
+    return (datetime.date(temporada, MES_INICIO_TEMPORADA, 1),
+            datetime.date(temporada + 1, MES_INICIO_TEMPORADA, 1))
+
+def _asegurar_particiones_vigentes(pool_conexiones):
+    """
+    Al crear el pool (una vez por proceso): temporada actual y siguiente en
+    cada tabla ya particionada. Usa el pool directo porque get_db_cursor
+    depende de get_connection_pool, que todavía no terminó.
+    """
+    conn = pool_conexiones.getconn()
+    try:
+        with conn.cursor() as cur:
+            for tabla in TABLAS_PARTICIONABLES:
+                if _es_particionada(cur, tabla):
+                    asegurar_particiones(cur, tabla)
         conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        logger.warning("No se pudieron asegurar las particiones de la temporada: %s", e)
+    finally:
+        pool_conexiones.putconn(conn)
+
+def _es_particionada(cur, tabla):
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))", (tabla,))
+    return cur.fetchone()[0]
+
+def _columnas_insertables(cur, tabla):
+    """Columnas de la tabla sin las GENERATED (no se pueden insertar)."""
+    cur.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND is_generated = 'NEVER'
+        ORDER BY ordinal_position
+    """, (tabla,))
+    return [row[0] for row in cur.fetchall()]
+
+def _crear_particion(cur, tabla, temporada):
+    nombre = f"{tabla}_t{temporada}"
+    cur.execute("SELECT to_regclass(%s)", (nombre,))
+    if cur.fetchone()[0]:
+        return nombre
+
+    ini, fin = rango_temporada(temporada)
+    cur.execute(f"SELECT EXISTS (SELECT 1 FROM {tabla}_default WHERE fecha >= %s AND fecha < %s)", (ini, fin))
+    if cur.fetchone()[0]:
+        # Hay filas de esta temporada en DEFAULT: Postgres no deja crear la
+        # partición hasta sacarlas, así que se mueven en la misma transacción.
+        cols = ", ".join(_columnas_insertables(cur, tabla))
+        cur.execute(f"CREATE TEMP TABLE _mover_{tabla} AS SELECT {cols} FROM {tabla}_default WHERE fecha >= %s AND fecha < %s", (ini, fin))
+        cur.execute(f"DELETE FROM {tabla}_default WHERE fecha >= %s AND fecha < %s", (ini, fin))
+        cur.execute(f"CREATE TABLE {nombre} PARTITION OF {tabla} FOR VALUES FROM (%s) TO (%s)", (ini, fin))
+        cur.execute(f"INSERT INTO {tabla} ({cols}) SELECT {cols} FROM _mover_{tabla}")
+        cur.execute(f"DROP TABLE _mover_{tabla}")
+    else:
+        cur.execute(f"CREATE TABLE {nombre} PARTITION OF {tabla} FOR VALUES FROM (%s) TO (%s)", (ini, fin))
+    return nombre
+
+def asegurar_particiones(cur, tabla, temporadas=None):
+    """
+    Crea la partición DEFAULT y las de las temporadas indicadas
+    (por defecto la actual y la siguiente). Idempotente.
+    """
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {tabla}_default PARTITION OF {tabla} DEFAULT")
+    if temporadas is None:
+        actual = temporada_de(datetime.date.today())
+        temporadas = (actual, actual + 1)
+    return [_crear_particion(cur, tabla, t) for t in temporadas]
+
+def migrar_a_particionado(tabla):
+    """
+    Convierte una tabla operativa existente en particionada.
+    La tabla vieja queda como <tabla>_legacy para revisión manual.
+    Las filas sin fecha no caben (fecha es parte de la PK): si hay, no se
+    migra nada y se lanza ValueError con cuántas son.
+    """
+    with get_db_cursor(clase="masiva") as (cur, conn):
+        if _es_particionada(cur, tabla):
+            return False
+        cur.execute(f"SELECT COUNT(*) FROM {tabla} WHERE fecha IS NULL")
+        sin_fecha = cur.fetchone()[0]
+        if sin_fecha:
+            raise ValueError(f"{tabla}: {sin_fecha} filas sin fecha. Asígneles fecha o bórrelas antes de migrar.")
+        cur.execute(f"ALTER TABLE {tabla} RENAME TO {tabla}_legacy")
+        # Los índices no cambian de nombre con la tabla: sin esto los CREATE INDEX
+        # IF NOT EXISTS de la tabla nueva ven el nombre ocupado y no crean nada
+        cur.execute("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s",
+                    (f"{tabla}_legacy",))
+        for (indice,) in cur.fetchall():
+            cur.execute(f'ALTER INDEX "{indice}" RENAME TO "{indice[:55]}_legacy"')
+        _crear_tabla_operativa(cur, tabla, particionado=True)
+        _crear_indices_operativos(cur, tabla)
+        # Los triggers se fueron con la tabla vieja: sin ellos ni la caché ni el acumulado se enteran
+        for tablas, crear in ((TABLAS_CON_AVISO, _crear_avisos), (TABLAS_DEL_RESUMEN, _crear_marcas_resumen)):
+            if tabla not in tablas:
+                continue
+            cur.execute("SAVEPOINT triggers")
+            try:
+                crear(cur, (tabla,))
+            except psycopg2.Error as e:
+                cur.execute("ROLLBACK TO SAVEPOINT triggers")
+                logger.warning("No se pudo crear %s en %s: %s", crear.__name__, tabla, e)
+
+        cur.execute(f"SELECT DISTINCT EXTRACT(YEAR FROM fecha)::int, EXTRACT(MONTH FROM fecha)::int >= %s FROM {tabla}_legacy WHERE fecha IS NOT NULL", (MES_INICIO_TEMPORADA,))
+        temporadas = sorted({anio if tardio else anio - 1 for anio, tardio in cur.fetchall()})
+        asegurar_particiones(cur, tabla, temporadas)
+
+        cols = ", ".join(_columnas_insertables(cur, f"{tabla}_legacy"))
+        cur.execute(f"INSERT INTO {tabla} ({cols}) SELECT {cols} FROM {tabla}_legacy")
+        cur.execute(f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE((SELECT MAX(id) FROM {tabla}), 0) + 1, false)", (tabla,))
+        conn.commit()
+        return True
+
+def archivar_temporada(tabla, temporada, destino="particion", directorio="archivo"):
+    """
+    Saca una temporada cerrada de la tabla caliente.
+    - destino="particion": la partición pasa al esquema `archivo` y se compacta.
+    - destino="parquet": se vuelca a <directorio>/<tabla>_t<temporada>.parquet y se borra.
+    Las consultas de la app dejan de ver esas filas. El DETACH se confirma
+    solo (su bloqueo sobre la tabla caliente dura un instante); si el volcado
+    falla, la partición queda suelta y volver a correrlo retoma desde ahí.
+    """
+    ini, fin = rango_temporada(temporada)
+    if fin > datetime.date.today():
+        raise ValueError(f"La temporada {temporada} aún no ha cerrado.")
+
+    nombre = f"{tabla}_t{temporada}"
+    with get_db_cursor(clase="masiva") as (cur, conn):
+        if not _es_particionada(cur, tabla):
+            raise ValueError(f"{tabla} no está particionada. Ejecute migrar_a_particionado primero.")
+        cur.execute("SELECT to_regclass(%s)", (nombre,))
+        if not cur.fetchone()[0]:
+            raise ValueError(f"No existe la partición {nombre}.")
+
+        # ACCESS EXCLUSIVE sobre la tabla caliente: confirmar ya, no al final del volcado
+        cur.execute("SELECT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = %s::regclass)", (nombre,))
+        if cur.fetchone()[0]:
+            cur.execute(f"ALTER TABLE {tabla} DETACH PARTITION {nombre}")
+            conn.commit()
+
+    if destino == "parquet":
+        ruta = _volcar_parquet(nombre, directorio)
+        with get_db_cursor(clase="masiva") as (cur, conn):
+            cur.execute(f"DROP TABLE {nombre}")
+            conn.commit()
+        return ruta
+
+    with get_db_cursor(clase="masiva") as (cur, conn):
+        cur.execute("CREATE SCHEMA IF NOT EXISTS archivo")
+        cur.execute(f"ALTER TABLE {nombre} SET SCHEMA archivo")
+        cur.execute(f"ALTER TABLE archivo.{nombre} SET (fillfactor = 100)")
+        conn.commit()
+
+        # VACUUM FULL no puede correr dentro de una transacción
+        conn.autocommit = True
+        try:
+            cur.execute(f"VACUUM FULL archivo.{nombre}")
+        finally:
+            conn.autocommit = False
+        return f"archivo.{nombre}"
+
+def _volcar_parquet(tabla, directorio, tam_lote=50_000):
+    """Vuelca la tabla por lotes con un cursor del lado del servidor (no la trae entera a memoria)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # OID de Postgres -> tipo Arrow (lo no listado se guarda como texto)
+    tipos = {16: pa.bool_(), 20: pa.int64(), 23: pa.int32(), 1082: pa.date32(),
+             1114: pa.timestamp("us"), 1700: pa.float64()}
+
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, f"{tabla}.parquet")
+    with get_db_cursor(nombre=f"volcado_{tabla}", clase="masiva") as (cur, _):
+        cur.itersize = tam_lote
+        cur.execute(f"SELECT * FROM {tabla}")
+        # Con cursor del servidor, description llega con el primer lote
+        filas = cur.fetchmany(tam_lote)
+        esquema = pa.schema([(d.name, tipos.get(d.type_code, pa.string())) for d in cur.description])
+
+        with pq.ParquetWriter(ruta, esquema, compression="zstd") as writer:
+            while filas:
+                columnas = {nombre: list(col) for nombre, col in zip(esquema.names, zip(*filas))}
+                writer.write_table(pa.table(columnas, schema=esquema))
+                filas = cur.fetchmany(tam_lote)
+    return ruta
 
 
 # ==========================================
 # 🔐 USUARIOS & SEGURIDAD (ACTUALIZADO)
 # ==========================================
 
-def verify_user(username, password):
-    """Verifica credenciales usando bcrypt."""
-    with get_db_cursor() as (cur, conn):
+# El bcrypt va en auth.py (fuera del hilo del script); aquí solo el SQL.
+
+@reintentar()
+def get_password_hash(username):
+    """Lo guardado en users.password (hash bcrypt, o texto plano viejo); None si no existe."""
+    with get_db_cursor() as (cur, _):
         cur.execute("SELECT password FROM users WHERE username = %s", (username,))
         row = cur.fetchone()
-        if not row:
-            return False
-        stored = row[0]
-        
-        # BCrypt Check
-        if isinstance(stored, str) and stored.startswith("$2"):
-            try:
-                return bcrypt.checkpw(password.encode("utf-8"), stored.encode("utf-8"))
-            except:
-                return False
-        
-        # Migración automática de contraseñas viejas (texto plano a bcrypt)
-        if stored == password:
-            try:
-                hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-                cur.execute("UPDATE users SET password=%s WHERE username=%s", (hashed, username))
-                conn.commit()
-            except:
-                conn.rollback()
-            return True
-        return False
+        return row[0] if row else None
+
+def set_password_hash(username, hashed, anterior):
+    """Reemplaza el hash solo si sigue siendo `anterior` (no pisa un cambio de clave concurrente)."""
+    with get_db_cursor() as (cur, conn):
+        cur.execute("UPDATE users SET password=%s WHERE username=%s AND password=%s", (hashed, username, anterior))
+        conn.commit()
+        return cur.rowcount == 1
+
+def get_sesion_version(username):
+    """users.sesion_version; None si el usuario no existe."""
+    with get_db_cursor() as (cur, _):
+        cur.execute("SELECT sesion_version FROM users WHERE username = %s", (username,))
+        row = cur.fetchone()
+        return row[0] if row else None
 
+def cerrar_sesiones(username):
+    """Sube la versión de credenciales: todos los tokens emitidos del usuario dejan de valer."""
+    with get_db_cursor() as (cur, conn):
+        cur.execute("UPDATE users SET sesion_version = sesion_version + 1 WHERE username=%s", (username,))
+        conn.commit()
 
-def create_user(username, password):
-    """Crea un usuario nuevo con contraseña encriptada. Retorna (Bool, Mensaje)."""
+def revocar_sesion(firma, expira):
+    """Anota un token revocado (expira: epoch) y de paso borra los ya vencidos."""
+    with get_db_cursor() as (cur, conn):
+        cur.execute("INSERT INTO sesiones_revocadas (firma, expira) VALUES (%s, to_timestamp(%s)) ON CONFLICT (firma) DO NOTHING",
+                    (firma, expira))
+        cur.execute("DELETE FROM sesiones_revocadas WHERE expira < now()")
+        conn.commit()
+
+def sesion_revocada(firma):
+    with get_db_cursor() as (cur, _):
+        cur.execute("SELECT 1 FROM sesiones_revocadas WHERE firma = %s", (firma,))
+        return cur.fetchone() is not None
+
+
+def create_user(username, password_hash):
+    """Crea un usuario nuevo con la contraseña ya encriptada (auth.crear_usuario). Retorna (Bool, Mensaje)."""
     try:
         with get_db_cursor() as (cur, conn):
             # 1. Verificar si existe
@@ -227,11 +966,8 @@ def create_user(username, password):
             if cur.fetchone():
                 return False, "⚠️ El usuario ya existe. Intenta con otro."
 
-            # 2. Encriptar
-            hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-            
-            # 3. Insertar
-            cur.execute("INSERT INTO users (username, password) VALUES (%s, %s)", (username, hashed))
+            # 2. Insertar
+            cur.execute("INSERT INTO users (username, password) VALUES (%s, %s)", (username, password_hash))
             conn.commit()
             return True, "✅ Usuario creado exitosamente."
     except psycopg2.Error as e:
@@ -240,15 +976,36 @@ def create_user(username, password):
         return False, f"❌ Error inesperado: {e}"
 
 
+# ==========================================
+# 🔁 ESCRITURAS IDEMPOTENTES
+# ==========================================
+
+def _insertar_idem(cur, tabla, columnas, valores, clave_idem=None):
+    """
+    INSERT de una fila. Con clave_idem (la pone la cola local al encolar),
+    reenviar la misma fila no hace nada. Retorna si insertó.
+    """
+    if clave_idem:
+        columnas, valores = columnas + ("clave_idem",), valores + (clave_idem,)
+    sql = f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join(['%s'] * len(valores))})"
+    if clave_idem:
+        sql += " ON CONFLICT (clave_idem, fecha) DO NOTHING"
+    cur.execute(sql, valores)
+    return cur.rowcount == 1
+
+
 # ==========================================
 # 🚜 GESTIÓN DE FINCAS & CATÁLOGOS
 # ==========================================
 
+@cache_compartido(ttl=ttl_lecturas, tablas=("fincas",))
+@reintentar()
 def get_all_fincas(owner):
     with get_db_cursor() as (cur, _):
-        cur.execute("SELECT nombre FROM fincas WHERE owner = %s ORDER BY nombre", (owner,))
+        ejecutar_preparada(cur, "fincas", (owner,))
         return [row[0] for row in cur.fetchall()]
 
+@invalida_tablas("fincas")
 def add_finca(nombre, owner):
     if nombre in get_all_fincas(owner):
         return False
@@ -257,6 +1014,7 @@ def add_finca(nombre, owner):
         conn.commit()
         return True
 
+@invalida_tablas("fincas")
 def delete_finca(nombre, owner):
     with get_db_cursor() as (cur, conn):
         cur.execute("DELETE FROM fincas WHERE nombre = %s AND owner = %s", (nombre, owner))
@@ -264,11 +1022,14 @@ def delete_finca(nombre, owner):
         conn.commit()
         return deleted
 
+@cache_compartido(ttl=ttl_lecturas, tablas=("catalogo_productos",))
+@reintentar()
 def get_catalogo_productos(owner):
     with get_db_cursor() as (cur, _):
-        cur.execute("SELECT nombre FROM catalogo_productos WHERE owner = %s ORDER BY nombre", (owner,))
+        ejecutar_preparada(cur, "catalogo_productos", (owner,))
         return [row[0] for row in cur.fetchall()]
 
+@invalida_tablas("catalogo_productos")
 def add_catalogo_producto(nombre, owner):
     with get_db_cursor() as (cur, conn):
         cur.execute("SELECT id FROM catalogo_productos WHERE nombre=%s AND owner=%s", (nombre, owner))
@@ -277,16 +1038,20 @@ def add_catalogo_producto(nombre, owner):
         conn.commit()
         return True
 
+@invalida_tablas("catalogo_productos")
 def delete_catalogo_producto(nombre, owner):
     with get_db_cursor() as (cur, conn):
         cur.execute("DELETE FROM catalogo_productos WHERE nombre=%s AND owner=%s", (nombre, owner))
         conn.commit()
 
+@cache_compartido(ttl=ttl_lecturas, tablas=("catalogo_labores",))
+@reintentar()
 def get_catalogo_labores(owner):
     with get_db_cursor() as (cur, _):
-        cur.execute("SELECT nombre FROM catalogo_labores WHERE owner = %s ORDER BY nombre", (owner,))
+        ejecutar_preparada(cur, "catalogo_labores", (owner,))
         return [row[0] for row in cur.fetchall()]
 
+@invalida_tablas("catalogo_labores")
 def add_catalogo_labor(nombre, owner):
     with get_db_cursor() as (cur, conn):
         cur.execute("SELECT id FROM catalogo_labores WHERE nombre=%s AND owner=%s", (nombre, owner))
@@ -295,6 +1060,7 @@ def add_catalogo_labor(nombre, owner):
         conn.commit()
         return True
 
+@invalida_tablas("catalogo_labores")
 def delete_catalogo_labor(nombre, owner):
     with get_db_cursor() as (cur, conn):
         cur.execute("DELETE FROM catalogo_labores WHERE nombre=%s AND owner=%s", (nombre, owner))
@@ -305,16 +1071,21 @@ def delete_catalogo_labor(nombre, owner):
 # 👥 PERSONAL & VALES
 # ==========================================
 
+@cache_compartido(ttl=ttl_lecturas, tablas=("trabajadores",))
+@reintentar()
 def get_all_trabajadores(owner):
     with get_db_cursor() as (cur, _):
-        cur.execute("SELECT nombre_completo FROM trabajadores WHERE owner = %s ORDER BY nombre_completo", (owner,))
+        ejecutar_preparada(cur, "trabajadores", (owner,))
         return [row[0] for row in cur.fetchall()]
 
+@cache_compartido(ttl=ttl_lecturas, tablas=("trabajadores",))
+@reintentar()
 def get_trabajadores_por_tipo(owner, tipo):
     with get_db_cursor() as (cur, _):
-        cur.execute("SELECT nombre_completo FROM trabajadores WHERE owner = %s AND tipo = %s ORDER BY nombre_completo", (owner, tipo))
+        ejecutar_preparada(cur, "trabajadores_tipo", (owner, tipo))
         return [row[0] for row in cur.fetchall()]
 
+@invalida_tablas("trabajadores")
 def add_trabajador(nombre, apellido, tipo, owner):
     full = f"{nombre} {apellido}".strip()
     with get_db_cursor() as (cur, conn):
@@ -322,6 +1093,7 @@ def add_trabajador(nombre, apellido, tipo, owner):
         conn.commit()
         return True
 
+@invalida_tablas("trabajadores")
 def delete_trabajador_by_fullname(owner, fullname):
     with get_db_cursor() as (cur, conn):
         cur.execute("DELETE FROM trabajadores WHERE nombre_completo = %s AND owner = %s", (fullname, owner))
@@ -329,30 +1101,37 @@ def delete_trabajador_by_fullname(owner, fullname):
         conn.commit()
         return deleted
 
-def add_vale(fecha, trabajador, monto, concepto, owner):
+@invalida_tablas("vales")
+@encolar_si_caida
+def add_vale(fecha, trabajador, monto, concepto, owner, clave_idem=None):
     with get_db_cursor() as (cur, conn):
-        cur.execute("INSERT INTO vales (fecha, trabajador, monto, concepto, owner) VALUES (%s, %s, %s, %s, %s)",
-            (fecha, trabajador, monto, concepto, owner))
+        _insertar_idem(cur, "vales", ("fecha", "trabajador", "monto", "concepto", "owner"),
+                       (fecha, trabajador, monto, concepto, owner), clave_idem)
         conn.commit()
 
+@cache_compartido(ttl=ttl_lecturas, tablas=("vales",))
+@reintentar()
 def get_saldo_global(owner):
     """Retorna {trabajador: total_vales}"""
     with get_db_cursor() as (cur, _):
-        cur.execute("SELECT trabajador, SUM(monto) FROM vales WHERE owner=%s GROUP BY trabajador", (owner,))
-        return {row[0]: float(row[1]) for row in cur.fetchall()}
+        ejecutar_preparada(cur, "saldo_global", (owner,))
+        return dict(cur.fetchall())
 
 
 # ==========================================
 # 💰 TARIFAS Y JORNADAS
 # ==========================================
 
+@cache_compartido(ttl=ttl_lecturas, tablas=("tarifas",))
+@reintentar()
 def get_tarifas(owner):
     with get_db_cursor() as (cur, _):
-        cur.execute("SELECT pago_dia, pago_hora_extra FROM tarifas WHERE owner = %s", (owner,))
+        ejecutar_preparada(cur, "tarifas", (owner,))
         res = cur.fetchone()
-        if res: return float(res[0]), float(res[1])
+        if res: return res[0], res[1]
         return (0.0, 0.0)
 
+@invalida_tablas("tarifas")
 def set_tarifas(owner, dia, extra):
     with get_db_cursor() as (cur, conn):
         cur.execute("""
@@ -361,25 +1140,46 @@ def set_tarifas(owner, dia, extra):
         """, (owner, dia, extra))
         conn.commit()
 
-def add_jornada(trab, fecha, lote, act, dias, hnorm, hextra, owner):
+@cache_compartido(ttl=ttl_lecturas, tablas=("tarifas",))
+@reintentar()
+def get_precio_venta(owner):
+    """Precio al que se vende la cajuela (para márgenes)."""
+    with get_db_cursor() as (cur, _):
+        cur.execute("SELECT precio_venta_cajuela FROM tarifas WHERE owner=%s", (owner,))
+        res = cur.fetchone()
+        return (res[0] or 0.0) if res else 0.0
+
+@invalida_tablas("tarifas")
+def set_precio_venta(owner, precio):
     with get_db_cursor() as (cur, conn):
         cur.execute("""
-            INSERT INTO jornadas (trabajador, fecha, lote, actividad, dias, horas_normales, horas_extra, owner) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (trab, fecha, lote, act, dias, hnorm, hextra, owner))
+            INSERT INTO tarifas (owner, precio_venta_cajuela) VALUES (%s, %s)
+            ON CONFLICT (owner) DO UPDATE SET precio_venta_cajuela = EXCLUDED.precio_venta_cajuela;
+        """, (owner, precio))
         conn.commit()
 
+@invalida_tablas("jornadas")
+@encolar_si_caida
+def add_jornada(trab, fecha, lote, act, dias, hnorm, hextra, owner, clave_idem=None):
+    with get_db_cursor() as (cur, conn):
+        _insertar_idem(cur, "jornadas",
+                       ("trabajador", "fecha", "lote", "actividad", "dias", "horas_normales", "horas_extra", "owner"),
+                       (trab, fecha, lote, act, dias, hnorm, hextra, owner), clave_idem)
+        conn.commit()
+
+@reintentar()
 def get_all_jornadas(owner):
     with get_db_cursor() as (cur, _):
         cur.execute("SELECT id, trabajador, fecha, lote, actividad, dias, horas_normales, horas_extra FROM jornadas WHERE owner = %s ORDER BY fecha DESC", (owner,))
         return cur.fetchall()
 
+@cache_compartido(ttl=ttl_lecturas, tablas=("jornadas",))
+@reintentar()
 def get_jornadas_between(ini, fin, owner):
-    with get_db_cursor() as (cur, _):
-        cur.execute("SELECT id, trabajador, fecha, lote, actividad, dias, horas_normales, horas_extra FROM jornadas WHERE owner=%s AND fecha >= %s AND fecha <= %s",
-            (owner, ini, fin))
-        return cur.fetchall()
+    """DataFrame con las jornadas del rango (columnas listas para la planilla)."""
+    return fetch_frame(None, (owner, ini, fin), preparada="jornadas_between")
 
+@invalida_tablas("jornadas")
 def update_jornada(jid, trab, fecha, lote, act, dias, hnorm, hextra, owner):
     with get_db_cursor() as (cur, conn):
         cur.execute("UPDATE jornadas SET trabajador=%s, fecha=%s, lote=%s, actividad=%s, dias=%s, horas_normales=%s, horas_extra=%s WHERE id=%s AND owner=%s",
@@ -391,34 +1191,56 @@ def update_jornada(jid, trab, fecha, lote, act, dias, hnorm, hextra, owner):
 # 📦 INSUMOS & SUELOS
 # ==========================================
 
-def add_insumo(fecha, lote, tipo, etapa, prod, dosis, cant, precio, owner):
+# Suma un insumo a su mes en resumen_mensual_insumos (misma transacción que el INSERT)
+_SQL_ACUMULAR_INSUMO = """
+    INSERT INTO resumen_mensual_insumos AS r (owner, mes, lote, producto, tipo, cantidad, gasto, registros, precio_min, precio_max)
+    VALUES (%(o)s, date_trunc('month', %(f)s::date)::date, COALESCE(%(l)s, ''), COALESCE(%(p)s, ''), COALESCE(%(t)s, ''),
+            %(c)s, %(c)s * %(u)s, 1, %(u)s, %(u)s)
+    ON CONFLICT (owner, mes, lote, producto, tipo) DO UPDATE SET
+        cantidad = r.cantidad + EXCLUDED.cantidad, gasto = r.gasto + EXCLUDED.gasto, registros = r.registros + 1,
+        precio_min = LEAST(r.precio_min, EXCLUDED.precio_min), precio_max = GREATEST(r.precio_max, EXCLUDED.precio_max)
+"""
+
+@invalida_tablas("insumos")
+@encolar_si_caida
+def add_insumo(fecha, lote, tipo, etapa, prod, dosis, cant, precio, owner, clave_idem=None):
     with get_db_cursor() as (cur, conn):
-        cur.execute("INSERT INTO insumos (fecha, lote, tipo, etapa, producto, dosis, cantidad, precio_unitario, owner) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
-            (fecha, lote, tipo, etapa, prod, dosis, cant, precio, owner))
+        if not _insertar_idem(cur, "insumos",
+                              ("fecha", "lote", "tipo", "etapa", "producto", "dosis", "cantidad", "precio_unitario", "owner"),
+                              (fecha, lote, tipo, etapa, prod, dosis, cant, precio, owner), clave_idem):
+            return   # reenvío de algo que ya entró: no sumarlo dos veces al resumen
+        # Sin la tabla del resumen (create_all_tables aún no corrió) el insumo igual se guarda;
+        # `archivar.py resumen-insumos` lo pone al día después
+        cur.execute("SAVEPOINT resumen")
+        try:
+            cur.execute(_SQL_ACUMULAR_INSUMO, {"o": owner, "f": fecha, "l": lote, "p": prod, "t": tipo, "c": cant, "u": precio})
+        except psycopg2.errors.UndefinedTable:
+            cur.execute("ROLLBACK TO SAVEPOINT resumen")
+            logger.warning("Falta resumen_mensual_insumos: el insumo se guardó sin sumarlo al resumen")
         conn.commit()
 
+@cache_compartido(ttl=ttl_lecturas, tablas=("insumos",))
+@reintentar()
 def get_insumos_between(ini, fin, owner):
     with get_db_cursor() as (cur, _):
         cur.execute("SELECT id, fecha, lote, tipo, etapa, producto, dosis, cantidad, precio_unitario, costo_total FROM insumos WHERE owner=%s AND fecha >= %s AND fecha <= %s",
             (owner, ini, fin))
         return cur.fetchall()
 
-def add_analisis_suelo(fecha, lote, ph, n, p, k, notas, owner):
+@invalida_tablas("analisis_suelo")
+@encolar_si_caida
+def add_analisis_suelo(fecha, lote, ph, n, p, k, notas, owner, clave_idem=None):
     with get_db_cursor() as (cur, conn):
-        cur.execute("INSERT INTO analisis_suelo (fecha, lote, ph, nitrogeno, fosforo, potasio, notas, owner) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
-            (fecha, lote, ph, n, p, k, notas, owner))
+        _insertar_idem(cur, "analisis_suelo", ("fecha", "lote", "ph", "nitrogeno", "fosforo", "potasio", "notas", "owner"),
+                       (fecha, lote, ph, n, p, k, notas, owner), clave_idem)
         conn.commit()
 
-def get_analisis_suelo(owner):
-    with get_db_cursor() as (cur, _):
-        cur.execute("SELECT id, fecha, lote, ph, nitrogeno, fosforo, potasio, notas FROM analisis_suelo WHERE owner=%s ORDER BY fecha DESC", (owner,))
-        return cur.fetchall()
-
 
 # ==========================================
 # 🗓️ PLANIFICADOR
 # ==========================================
 
+@invalida_tablas("planes")
 def add_plan(owner, fecha, lote, tipo, **kwargs):
     with get_db_cursor() as (cur, conn):
         cols = ["owner", "fecha", "lote", "tipo", "estado"]
@@ -433,28 +1255,34 @@ def add_plan(owner, fecha, lote, tipo, **kwargs):
         cur.execute(q, tuple(vals))
         conn.commit()
 
+@cache_compartido(ttl=ttl_lecturas, tablas=("planes",))
+@reintentar()
 def list_plans(owner, ini, fin):
     with get_db_cursor() as (cur, _):
-        cur.execute("""SELECT id, fecha, lote, tipo, trabajador, actividad, etapa, producto, dosis, cantidad, precio_unitario, dias, horas_extra, estado, recur_every_days, recur_times, recur_autorenew 
-                       FROM planes WHERE owner=%s AND fecha >= %s AND fecha <= %s ORDER BY fecha ASC""", (owner, ini, fin))
+        ejecutar_preparada(cur, "list_plans", (owner, ini, fin))
         return cur.fetchall()
 
+@cache_compartido(ttl=ttl_lecturas, tablas=("planes",))
+@reintentar()
 def get_plan_by_id(pid, owner):
     with get_db_cursor() as (cur, _):
         cur.execute("SELECT id, fecha, lote, tipo, trabajador, actividad, producto, cantidad FROM planes WHERE id=%s AND owner=%s", (pid, owner))
         return cur.fetchone()
 
+@invalida_tablas("planes")
 def update_plan_simple(pid, fecha, lote, tipo, trab, act, prod, cant, owner):
     with get_db_cursor() as (cur, conn):
         cur.execute("UPDATE planes SET fecha=%s, lote=%s, tipo=%s, trabajador=%s, actividad=%s, producto=%s, cantidad=%s WHERE id=%s AND owner=%s",
             (fecha, lote, tipo, trab, act, prod, cant, pid, owner))
         conn.commit()
 
+@invalida_tablas("planes")
 def delete_plan(pid, owner):
     with get_db_cursor() as (cur, conn):
         cur.execute("DELETE FROM planes WHERE id=%s AND owner=%s", (pid, owner))
         conn.commit()
 
+@invalida_tablas("planes")
 def mark_plan_done_and_autorenew(owner, pid, user):
     with get_db_cursor() as (cur, conn):
         cur.execute("UPDATE planes SET estado='realizado' WHERE id=%s AND owner=%s RETURNING recur_autorenew, recur_every_days, recur_times, fecha", (pid, owner))
@@ -470,6 +1298,7 @@ def mark_plan_done_and_autorenew(owner, pid, user):
                 """, (new_date, new_times, pid))
         conn.commit()
 
+@invalida_tablas("planes")
 def postpone_plan(owner, pid, days):
     with get_db_cursor() as (cur, conn):
         cur.execute("UPDATE planes SET fecha = fecha + make_interval(days => %s) WHERE id=%s AND owner=%s", (int(days), pid, owner))
@@ -480,136 +1309,209 @@ def postpone_plan(owner, pid, days):
 # ☕ COSECHA & REPORTES
 # ==========================================
 
-def add_recoleccion_batch(datos_lista):
-    """Inserta múltiples recolecciones en una sola transacción."""
-    with get_db_cursor() as (cur, conn):
+def add_recoleccion_batch(datos_lista, relanzar=False):
+    """
+    Inserta múltiples recolecciones en una sola transacción.
+    Cada tupla: (fecha, trabajador, lote, cajuelas, precio, owner[, clave_idem]).
+    Las filas con clave_idem ya insertada se ignoran (reenvíos de la cola local),
+    así que si todas la traen el lote se reintenta ante fallas pasajeras.
+    Con relanzar=True el error sale en vez de retornar False (la cola local
+    distingue una caída de un lote que la BD rechaza).
+    """
+    datos = [tuple(x) + (None,) * (7 - len(x)) for x in datos_lista]
+    if all(x[6] for x in datos):
+        return _reintentar_lote(datos, relanzar)
+    return _insertar_lote(datos, relanzar_caidas=relanzar, relanzar_todo=relanzar)
+
+@reintentar()
+def _reintentar_lote(datos, relanzar_todo=False):
+    return _insertar_lote(datos, relanzar_caidas=True, relanzar_todo=relanzar_todo)
+
+def _insertar_lote(datos, relanzar_caidas=False, relanzar_todo=False):
+    with get_db_cursor(clase="masiva") as (cur, conn):
         try:
-            args_str = ",".join(cur.mogrify("(%s,%s,%s,%s,%s,%s)", x).decode("utf-8") for x in datos_lista)
-            cur.execute("INSERT INTO recolecciones (fecha, trabajador, lote, cajuelas, precio_cajuela, owner) VALUES " + args_str)
+            # Varios EXECUTE por viaje a la BD, sobre el INSERT ya preparado
+            asegurar_preparada(cur, "ins_recoleccion")
+            execute_batch(cur, sql_execute("ins_recoleccion"), datos, page_size=200)
             conn.commit()
-            return True
         except psycopg2.Error as e:
-            conn.rollback()
+            if relanzar_caidas and es_caida(e):
+                raise   # get_db_cursor hace el rollback; reintentar lo repite
+            if not conn.closed:
+                conn.rollback()
+            if relanzar_todo:
+                raise
             logger.exception("Error batch cosecha: %s", e)
             return False
+    # Sin argumento owner: se invalida cada dueño que vino en el lote
+    for owner in {x[5] for x in datos}:
+        invalidar(owner, "recolecciones")
+    return True
 
+@cache_compartido(ttl=ttl_lecturas, tablas=("recolecciones",))
+@reintentar()
 def get_reporte_cosecha_detallado(ini, fin, owner):
-    with get_db_cursor() as (cur, _):
-        cur.execute("SELECT trabajador, lote, SUM(cajuelas) as total_cajuelas, SUM(total_pagar) as total_dinero FROM recolecciones WHERE owner=%s AND fecha >= %s AND fecha <= %s GROUP BY trabajador, lote ORDER BY trabajador, lote",
-            (owner, ini, fin))
-        return cur.fetchall()
-
+    """DataFrame (Recolector, Lote, Cajuelas, Total ₡) del rango."""
+    return fetch_frame("""SELECT trabajador AS "Recolector", lote AS "Lote", SUM(cajuelas) AS "Cajuelas", SUM(total_pagar) AS "Total ₡"
+                          FROM recolecciones WHERE owner=%s AND fecha >= %s AND fecha <= %s
+                          GROUP BY trabajador, lote ORDER BY trabajador, lote""",
+        (owner, ini, fin))
+
+@cache_compartido(ttl=ttl_lecturas, tablas=("recolecciones",))
+@reintentar()
 def get_totales_por_lote(ini, fin, owner):
     with get_db_cursor() as (cur, _):
         cur.execute("SELECT lote, SUM(cajuelas) FROM recolecciones WHERE owner=%s AND fecha >= %s AND fecha <= %s GROUP BY lote ORDER BY SUM(cajuelas) DESC",
             (owner, ini, fin))
         return cur.fetchall()
 
+@cache_compartido(ttl=ttl_lecturas, tablas=("recolecciones",))
+@reintentar()
 def get_produccion_total_lote(owner):
     with get_db_cursor() as (cur, _):
         cur.execute("SELECT lote, SUM(cajuelas) FROM recolecciones WHERE owner=%s GROUP BY lote", (owner,))
-        return {row[0]: float(row[1]) for row in cur.fetchall()}
+        return dict(cur.fetchall())
 
 
 # ==========================================
 # 📊 FINANZAS & CIERRES (Optimizado)
 # ==========================================
 
+@cache_compartido(ttl=ttl_lecturas, tablas=("jornadas", "recolecciones", "tarifas"))
+@reintentar()
 def get_resumen_semanal(owner, fecha_inicio, fecha_fin):
     """
     Suma todo lo que ha ganado cada trabajador en un rango de fechas.
     (Incluye Jornadas + Cosecha).
     Retorna: Lista de tuplas (Nombre Trabajador, Total Ganado)
     """
-    with get_db_cursor() as (cur, _):
-        # 1. Pago por Días/Horas (Jornadas)
-        cur.execute("SELECT pago_dia, pago_hora_extra FROM tarifas WHERE owner=%s", (owner,))
-        res_t = cur.fetchone()
-        t_dia, t_extra = (float(res_t[0]), float(res_t[1])) if res_t else (0.0, 0.0)
-
-        cur.execute("""
-            SELECT trabajador, 
-                   SUM((dias * %s) + (horas_extra * %s)) as pago_jornada
+    # Las tres lecturas son independientes: van en paralelo
+    r = en_paralelo(
+        tarifas=(get_tarifas, owner),
+        # 1. Días/Horas (Jornadas)
+        jornadas=(consultar, """
+            SELECT trabajador, COALESCE(SUM(dias), 0), COALESCE(SUM(horas_extra), 0)
             FROM jornadas 
             WHERE owner = %s AND fecha BETWEEN %s AND %s
             GROUP BY trabajador
-        """, (t_dia, t_extra, owner, fecha_inicio, fecha_fin))
-        pagos_jornadas = {row[0]: float(row[1]) for row in cur.fetchall()}
-
+        """, (owner, fecha_inicio, fecha_fin), False, "reporte"),
         # 2. Pago por Cosecha (Recolecciones)
-        cur.execute("""
+        cosecha=(consultar, """
             SELECT trabajador, SUM(total_pagar) 
             FROM recolecciones 
             WHERE owner = %s AND fecha BETWEEN %s AND %s
             GROUP BY trabajador
-        """, (owner, fecha_inicio, fecha_fin))
-        pagos_cosecha = {row[0]: float(row[1]) for row in cur.fetchall()}
-
-        # 3. Sumar Todo
-        todos_trabajadores = set(pagos_jornadas.keys()) | set(pagos_cosecha.keys())
-        resultado = []
-        
-        for t in todos_trabajadores:
-            total = pagos_jornadas.get(t, 0.0) + pagos_cosecha.get(t, 0.0)
-            resultado.append((t, total))
-        
-        # Ordenar por quien ganó más
-        return sorted(resultado, key=lambda x: x[1], reverse=True)
-
+        """, (owner, fecha_inicio, fecha_fin), False, "reporte"),
+    )
+    t_dia, t_extra = r["tarifas"]
+    pagos_jornadas = {t: (dias * t_dia) + (extras * t_extra) for t, dias, extras in r["jornadas"]}
+    pagos_cosecha = dict(r["cosecha"])
+
+    # 3. Sumar Todo
+    todos_trabajadores = set(pagos_jornadas.keys()) | set(pagos_cosecha.keys())
+    resultado = []
+    
+    for t in todos_trabajadores:
+        total = pagos_jornadas.get(t, 0.0) + pagos_cosecha.get(t, 0.0)
+        resultado.append((t, total))
+    
+    # Ordenar por quien ganó más
+    return sorted(resultado, key=lambda x: x[1], reverse=True)
+
+@cache_compartido(ttl=ttl_lecturas, tablas=("jornadas", "recolecciones", "vales", "tarifas"))
+@reintentar()
+def get_datos_boletas(ini, fin, owner):
+    """
+    Una fila por trabajador con todo lo de su boleta de pago, en una sola consulta.
+    Rebajos = vales negativos del periodo (abonos a deuda); saldo_vales = deuda al cierre.
+    """
+    return fetch_frame("""
+        WITH t AS (
+            SELECT COALESCE(MAX(pago_dia), 0) AS dia, COALESCE(MAX(pago_hora_extra), 0) AS extra
+            FROM tarifas WHERE owner = %(o)s
+        ), j AS (
+            SELECT trabajador, SUM(dias) AS dias, SUM(horas_extra) AS horas_extra
+            FROM jornadas WHERE owner = %(o)s AND fecha BETWEEN %(i)s AND %(f)s
+            GROUP BY trabajador
+        ), r AS (
+            SELECT trabajador, SUM(cajuelas) AS cajuelas, SUM(total_pagar) AS pago_cosecha
+            FROM recolecciones WHERE owner = %(o)s AND fecha BETWEEN %(i)s AND %(f)s
+            GROUP BY trabajador
+        ), v AS (
+            SELECT trabajador,
+                   -SUM(monto) FILTER (WHERE monto < 0 AND fecha BETWEEN %(i)s AND %(f)s) AS rebajos,
+                   SUM(monto) AS saldo_vales
+            FROM vales WHERE owner = %(o)s AND fecha <= %(f)s
+            GROUP BY trabajador
+        )
+        SELECT trabajador,
+               COALESCE(j.dias, 0) AS dias, COALESCE(j.horas_extra, 0) AS horas_extra,
+               COALESCE(j.dias, 0) * t.dia AS pago_dias,
+               COALESCE(j.horas_extra, 0) * t.extra AS pago_extras,
+               COALESCE(r.cajuelas, 0) AS cajuelas, COALESCE(r.pago_cosecha, 0) AS pago_cosecha,
+               COALESCE(v.rebajos, 0) AS rebajos, COALESCE(v.saldo_vales, 0) AS saldo_vales,
+               COALESCE(j.dias, 0) * t.dia + COALESCE(j.horas_extra, 0) * t.extra
+                   + COALESCE(r.pago_cosecha, 0) - COALESCE(v.rebajos, 0) AS neto
+        FROM j FULL JOIN r USING (trabajador)
+        LEFT JOIN v USING (trabajador)
+        CROSS JOIN t
+        ORDER BY trabajador
+    """, {"o": owner, "i": ini, "f": fin})
+
+@cache_compartido(ttl=ttl_lecturas, tablas=("insumos", "jornadas", "tarifas"))
+@reintentar()
 def get_gastos_por_lote(owner):
     """Calcula gastos acumulados por lote de forma eficiente."""
-    with get_db_cursor() as (cur, _):
+    r = en_paralelo(
         # 1. Insumos (usando COALESCE para evitar None)
-        cur.execute("SELECT lote, COALESCE(SUM(costo_total), 0) FROM insumos WHERE owner=%s GROUP BY lote", (owner,))
-        g_insumos = {row[0]: float(row[1]) for row in cur.fetchall()}
-
+        insumos=(consultar, "SELECT lote, COALESCE(SUM(costo_total), 0) FROM insumos WHERE owner=%s GROUP BY lote", (owner,), False, "reporte"),
         # 2. Mano de Obra
-        cur.execute("SELECT pago_dia FROM tarifas WHERE owner=%s", (owner,))
-        res_t = cur.fetchone()
-        tarifa = float(res_t[0]) if res_t else 0.0
-
-        cur.execute("SELECT lote, COALESCE(SUM(dias), 0) FROM jornadas WHERE owner=%s GROUP BY lote", (owner,))
-        g_jornales = {row[0]: float(row[1]) * tarifa for row in cur.fetchall()}
-
-        todos_lotes = set(g_insumos.keys()) | set(g_jornales.keys())
-        resultado = []
-        for l in todos_lotes:
-            i_val = g_insumos.get(l, 0.0)
-            j_val = g_jornales.get(l, 0.0)
-            resultado.append({
-                "Lote": l,
-                "Insumos": i_val,
-                "ManoObra": j_val,
-                "TotalGasto": i_val + j_val,
-            })
-        return sorted(resultado, key=lambda x: x["TotalGasto"], reverse=True)
-
+        tarifas=(get_tarifas, owner),
+        jornadas=(consultar, "SELECT lote, COALESCE(SUM(dias), 0) FROM jornadas WHERE owner=%s GROUP BY lote", (owner,), False, "reporte"),
+    )
+    g_insumos = dict(r["insumos"])
+    tarifa = r["tarifas"][0]
+    g_jornales = {row[0]: row[1] * tarifa for row in r["jornadas"]}
+
+    todos_lotes = set(g_insumos.keys()) | set(g_jornales.keys())
+    resultado = []
+    for l in todos_lotes:
+        i_val = g_insumos.get(l, 0.0)
+        j_val = g_jornales.get(l, 0.0)
+        resultado.append({
+            "Lote": l,
+            "Insumos": i_val,
+            "ManoObra": j_val,
+            "TotalGasto": i_val + j_val,
+        })
+    return sorted(resultado, key=lambda x: x["TotalGasto"], reverse=True)
+
+@cache_compartido(ttl=ttl_lecturas, tablas=("recolecciones", "insumos", "jornadas", "tarifas"))
+@reintentar()
 def calcular_resumen_periodo(ini, fin, owner):
     """Resumen rápido para el Dashboard y Cierres."""
-    with get_db_cursor() as (cur, _):
-        # Tres consultas simples en vez de una compleja
-        cur.execute("SELECT COALESCE(SUM(total_pagar), 0) FROM recolecciones WHERE owner=%s AND fecha BETWEEN %s AND %s", (owner, ini, fin))
-        total_cosecha = float(cur.fetchone()[0])
-
-        cur.execute("SELECT COALESCE(SUM(costo_total), 0) FROM insumos WHERE owner=%s AND fecha BETWEEN %s AND %s", (owner, ini, fin))
-        total_insumos = float(cur.fetchone()[0])
-
-        cur.execute("SELECT pago_dia, pago_hora_extra FROM tarifas WHERE owner=%s", (owner,))
-        t_res = cur.fetchone()
-        t_dia, t_extra = (float(t_res[0]), float(t_res[1])) if t_res else (0.0, 0.0)
-
-        cur.execute("SELECT COALESCE(SUM(dias), 0), COALESCE(SUM(horas_extra), 0) FROM jornadas WHERE owner=%s AND fecha BETWEEN %s AND %s", (owner, ini, fin))
-        j_res = cur.fetchone()
-        dias_tot, extras_tot = float(j_res[0]), float(j_res[1])
-        total_mano_obra = (dias_tot * t_dia) + (extras_tot * t_extra)
-
-        return {
-            "Cosecha": total_cosecha,
-            "Insumos": total_insumos,
-            "ManoObra": total_mano_obra,
-            "TotalGeneral": total_insumos + total_mano_obra,
-        }
-
+    # Consultas simples e independientes, en paralelo en vez de una compleja
+    rango = (owner, ini, fin)
+    r = en_paralelo(
+        cosecha=(consultar, "SELECT COALESCE(SUM(total_pagar), 0) FROM recolecciones WHERE owner=%s AND fecha BETWEEN %s AND %s", rango, True, "reporte"),
+        insumos=(consultar, "SELECT COALESCE(SUM(costo_total), 0) FROM insumos WHERE owner=%s AND fecha BETWEEN %s AND %s", rango, True, "reporte"),
+        tarifas=(get_tarifas, owner),
+        jornadas=(consultar, "SELECT COALESCE(SUM(dias), 0), COALESCE(SUM(horas_extra), 0) FROM jornadas WHERE owner=%s AND fecha BETWEEN %s AND %s", rango, True, "reporte"),
+    )
+    total_cosecha = r["cosecha"][0]
+    total_insumos = r["insumos"][0]
+    t_dia, t_extra = r["tarifas"]
+    dias_tot, extras_tot = r["jornadas"]
+    total_mano_obra = (dias_tot * t_dia) + (extras_tot * t_extra)
+
+    return {
+        "Cosecha": total_cosecha,
+        "Insumos": total_insumos,
+        "ManoObra": total_mano_obra,
+        "TotalGeneral": total_insumos + total_mano_obra,
+    }
+
+@invalida_tablas("cierres_mensuales")
 def crear_cierre_mensual(ini, fin, creado_por, owner):
     with get_db_cursor() as (cur, conn):
         cur.execute("INSERT INTO cierres_mensuales (mes_inicio, mes_fin, creado_por, owner) VALUES (%s, %s, %s, %s) RETURNING id",
@@ -618,52 +1520,69 @@ def crear_cierre_mensual(ini, fin, creado_por, owner):
         conn.commit()
         return pid
 
+@cache_compartido(ttl=ttl_lecturas, tablas=("cierres_mensuales",))
+@reintentar()
 def listar_cierres(owner):
     with get_db_cursor() as (cur, _):
         cur.execute("SELECT id, mes_inicio, mes_fin, creado_por, fecha_creacion, total_nomina, total_insumos, total_general FROM cierres_mensuales WHERE owner=%s ORDER BY id DESC", (owner,))
         return cur.fetchall()
 
 # --- EXPORTACIONES (Excel) ---
+# Historial completo: se leen con cursor del servidor, por lotes.
 def get_export_jornadas(owner):
-    with get_db_cursor() as (cur, _):
-        cur.execute("SELECT id, fecha, trabajador, lote, actividad, dias, horas_extra FROM jornadas WHERE owner=%s ORDER BY fecha DESC", (owner,))
-        return cur.fetchall()
+    return fetch_frame("""SELECT id AS "ID", fecha AS "Fecha", trabajador AS "Trabajador", lote AS "Lote",
+                                 actividad AS "Actividad", dias AS "Días", horas_extra AS "Extras"
+                          FROM jornadas WHERE owner=%s ORDER BY fecha DESC""", (owner,), servidor=True)
 
 def get_export_recolecciones(owner):
-    with get_db_cursor() as (cur, _):
-        cur.execute("SELECT id, fecha, trabajador, lote, cajuelas, precio_cajuela, total_pagar FROM recolecciones WHERE owner=%s ORDER BY fecha DESC", (owner,))
-        return cur.fetchall()
+    return fetch_frame("""SELECT id AS "ID", fecha AS "Fecha", trabajador AS "Recolector", lote AS "Lote",
+                                 cajuelas AS "Cajuelas", precio_cajuela AS "Precio", total_pagar AS "Total"
+                          FROM recolecciones WHERE owner=%s ORDER BY fecha DESC""", (owner,), servidor=True)
 
 def get_export_insumos(owner):
-    with get_db_cursor() as (cur, _):
-        cur.execute("SELECT id, fecha, lote, tipo, producto, dosis, cantidad, precio_unitario, costo_total FROM insumos WHERE owner=%s ORDER BY fecha DESC", (owner,))
-        return cur.fetchall()
+    return fetch_frame("""SELECT id AS "ID", fecha AS "Fecha", lote AS "Lote", tipo AS "Tipo", producto AS "Prod",
+                                 dosis AS "Dosis", cantidad AS "Cant", precio_unitario AS "Precio", costo_total AS "Total"
+                          FROM insumos WHERE owner=%s ORDER BY fecha DESC""", (owner,), servidor=True)
 
 
 # ==========================================
 # 🗺️ MAPAS & GPS
 # ==========================================
 
+@invalida_tablas("fincas")
 def update_finca_coords(nombre, lat, lon, owner):
     with get_db_cursor() as (cur, conn):
         cur.execute("UPDATE fincas SET latitud=%s, longitud=%s WHERE nombre=%s AND owner=%s", (lat, lon, nombre, owner))
         conn.commit()
 
+@invalida_tablas("fincas")
 def update_finca_polygon(nombre, geojson_str, owner):
     with get_db_cursor() as (cur, conn):
         cur.execute("UPDATE fincas SET poligono_geojson=%s WHERE nombre=%s AND owner=%s", (geojson_str, nombre, owner))
         conn.commit()
 
+@invalida_tablas("fincas")
+def update_finca_hectareas(nombre, hectareas, owner):
+    with get_db_cursor() as (cur, conn):
+        cur.execute("UPDATE fincas SET hectareas=%s WHERE nombre=%s AND owner=%s", (hectareas or None, nombre, owner))
+        conn.commit()
+
+@cache_compartido(ttl=ttl_lecturas, tablas=("fincas",))
+@reintentar()
 def get_fincas_con_coords(owner):
     with get_db_cursor() as (cur, _):
         cur.execute("SELECT nombre, latitud, longitud FROM fincas WHERE owner=%s", (owner,))
         return cur.fetchall()
 
+@cache_compartido(ttl=ttl_lecturas, tablas=("fincas",))
+@reintentar()
 def get_fincas_full_data(owner):
     with get_db_cursor() as (cur, _):
         cur.execute("SELECT nombre, latitud, longitud, poligono_geojson FROM fincas WHERE owner=%s", (owner,))
         return cur.fetchall()
 
+@cache_compartido(ttl=ttl_lecturas, tablas=("insumos", "recolecciones"))
+@reintentar()
 def get_estado_lote(lote, owner):
     with get_db_cursor() as (cur, _):
         # 1. Chequear Abono Reciente (30 días)
@@ -673,7 +1592,7 @@ def get_estado_lote(lote, owner):
         # 2. Chequear Producción baja
         cur.execute("SELECT SUM(cajuelas) FROM recolecciones WHERE owner=%s AND lote=%s", (owner, lote))
         res_prod = cur.fetchone()
-        prod_total = float(res_prod[0]) if res_prod and res_prod[0] else 0.0
+        prod_total = res_prod[0] if res_prod and res_prod[0] else 0.0
         
         if prod_total < 50: return ("red", f"⚠️ Baja Producción ({prod_total} caj)")
         return ("blue", "Estable")
@@ -0,0 +1,255 @@
+import hashlib
+import functools
+from io import BytesIO
+from dataclasses import dataclass, field
+
+import pandas as pd
+import streamlit as st
+
+from renderizado import cargar_modulo
+from perfilador import seccion
+
+# ==========================================
+# 📄 SERVICIO DE DOCUMENTOS (PDF)
+# ==========================================
+# Todos los PDF se describen con una Plantilla (título, columnas, filas,
+# total, firma) y se dibujan con reportlab o fpdf según `motor`. Nada se
+# renderiza hasta que el usuario pide el PDF, y el resultado queda en caché
+# por la huella de los datos + periodo: teclear en un data_editor ya no
+# reconstruye el documento.
+
+@dataclass
+class Columna:
+    titulo: str
+    peso: float = 1          # ancho relativo; cada motor lo escala a su página
+    alinear: str = "L"       # "L" | "C" | "R"
+    formato: str = "{}"
+
+@dataclass
+class Plantilla:
+    titulo: str
+    columnas: list
+    filas: list
+    lineas: list = field(default_factory=list)     # textos bajo el título (periodo, autor...)
+    total: list = None                              # fila final resaltada
+    firma: str = None
+    color: tuple = (46, 125, 50)                    # fondo del encabezado de tabla (RGB)
+    motor: str = "fpdf"                             # "fpdf" | "reportlab"
+
+
+def _celda(valor, columna):
+    if valor is None:
+        return ""
+    if isinstance(valor, str):
+        return valor
+    return columna.formato.format(valor)
+
+def _anchos(columnas, ancho_util):
+    suma = sum(c.peso for c in columnas)
+    return [ancho_util * c.peso / suma for c in columnas]
+
+
+# --- Motores ---
+
+def _con_reportlab(p):
+    colors = cargar_modulo("reportlab.lib.colors")
+    letter = cargar_modulo("reportlab.lib.pagesizes").letter
+    platypus = cargar_modulo("reportlab.platypus")
+    estilos = cargar_modulo("reportlab.lib.styles").getSampleStyleSheet()
+
+    buffer = BytesIO()
+    doc = platypus.SimpleDocTemplate(buffer, pagesize=letter)
+    elementos = [platypus.Paragraph(p.titulo, estilos['Title'])]
+    elementos += [platypus.Paragraph(linea, estilos['Normal']) for linea in p.lineas]
+    elementos.append(platypus.Spacer(1, 12))
+
+    datos = [[c.titulo for c in p.columnas]]
+    datos += [[_celda(v, c) for v, c in zip(fila, p.columnas)] for fila in p.filas]
+    if p.total:
+        datos.append([_celda(v, c) for v, c in zip(p.total, p.columnas)])
+
+    estilo = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.Color(*[x / 255 for x in p.color])),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey)
+    ]
+    alineaciones = {"R": "RIGHT", "C": "CENTER"}
+    estilo += [('ALIGN', (i, 1), (i, -1), alineaciones[c.alinear])
+               for i, c in enumerate(p.columnas) if c.alinear in alineaciones]
+    if p.total:
+        estilo += [('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+                   ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold')]
+
+    tabla = platypus.Table(datos, colWidths=_anchos(p.columnas, doc.width), repeatRows=1)
+    tabla.setStyle(platypus.TableStyle(estilo))
+    elementos.append(tabla)
+
+    if p.firma:
+        centrado = estilos['Normal'].clone('centrado', alignment=1)
+        elementos += [platypus.Spacer(1, 60),
+                      platypus.Paragraph("_______________________________", centrado),
+                      platypus.Paragraph(p.firma, centrado)]
+    doc.build(elementos)
+    return buffer.getvalue()
+
+
+@functools.lru_cache(maxsize=None)
+def _clase_pdf_reporte():
+    """La clase hereda de FPDF, así que también se crea al primer uso."""
+    FPDF = cargar_modulo("fpdf").FPDF
+
+    class PDFReport(FPDF):
+        def header(self):
+            self.set_font('Arial', 'B', 14)
+            self.set_text_color(46, 125, 50) # Verde Finca
+            self.cell(0, 10, 'Finca App - Reporte Oficial', ln=True, align='C')
+            self.ln(5)
+
+        def footer(self):
+            self.set_y(-15)
+            self.set_font('Arial', 'I', 8)
+            self.set_text_color(128)
+            self.cell(0, 10, f'Pagina {self.page_no()}', 0, 0, 'C')
+
+    return PDFReport
+
+def _con_fpdf(p):
+    pdf = _clase_pdf_reporte()()
+    pdf.add_page()
+
+    # Título
+    pdf.set_font("Arial", 'B', 16)
+    pdf.set_text_color(0)
+    pdf.cell(0, 10, p.titulo, ln=True, align='C')
+    pdf.set_font("Arial", size=12)
+    for linea in p.lineas:
+        pdf.cell(0, 10, linea, ln=True, align='C')
+    pdf.ln(10)
+
+    # Tabla
+    anchos = _anchos(p.columnas, pdf.w - pdf.l_margin - pdf.r_margin)
+    pdf.set_fill_color(*p.color)
+    pdf.set_text_color(255)
+    pdf.set_font("Arial", 'B', 12)
+    for c, w in zip(p.columnas, anchos):
+        pdf.cell(w, 10, c.titulo, 1, 0, 'C', 1)
+    pdf.ln()
+
+    pdf.set_text_color(0)
+    pdf.set_font("Arial", size=12)
+    for fila in p.filas:
+        for v, c, w in zip(fila, p.columnas, anchos):
+            pdf.cell(w, 10, _celda(v, c), 1, 0, c.alinear)
+        pdf.ln()
+
+    if p.total:
+        pdf.set_fill_color(220, 220, 220)
+        pdf.set_font("Arial", 'B', 12)
+        for v, c, w in zip(p.total, p.columnas, anchos):
+            pdf.cell(w, 10, _celda(v, c), 1, 0, c.alinear, 1)
+        pdf.ln()
+
+    # Firma
+    if p.firma:
+        pdf.ln(25)
+        pdf.set_font("Arial", size=10)
+        pdf.cell(0, 5, "_______________________________", ln=True, align='C')
+        pdf.cell(0, 5, p.firma, ln=True, align='C')
+
+    return pdf.output(dest='S').encode('latin-1')
+
+MOTORES = {"reportlab": _con_reportlab, "fpdf": _con_fpdf}
+
+def renderizar(plantilla):
+    """Plantilla -> bytes del PDF con el motor que indique."""
+    return MOTORES[plantilla.motor](plantilla)
+
+
+# --- Caché por contenido ---
+
+def huella(datos, *periodo):
+    """Hash estable de los datos (DataFrame o cualquier cosa con repr) + periodo."""
+    h = hashlib.sha1()
+    if isinstance(datos, pd.DataFrame):
+        h.update(repr(list(datos.columns)).encode())
+        h.update(pd.util.hash_pandas_object(datos, index=False).values.tobytes())
+    else:
+        h.update(repr(datos).encode())
+    h.update(repr(periodo).encode())
+    return h.hexdigest()
+
+@st.cache_data(max_entries=64, show_spinner="Generando PDF...")
+def _pdf_en_cache(tipo, clave, _construir, _args):
+    # Solo `tipo` y `clave` forman la llave: los argumentos con "_" no se hashean
+    return renderizar(_construir(*_args))
+
+def _documento(construir, *args):
+    with seccion(f"pdf ({construir.__name__})"):
+        return _pdf_en_cache(construir.__name__, huella(*args), construir, args)
+
+
+# --- Documentos de la app ---
+
+def _plantilla_planilla_cosecha(df_resumen, f1, f2):
+    neto = df_resumen["Total ₡"] - df_resumen["Abono Deuda"]
+    filas = zip(df_resumen["Recolector"].str[:20], df_resumen["Cajuelas"],
+                df_resumen["Total ₡"], df_resumen["Abono Deuda"], neto)
+    return Plantilla(
+        titulo="Planilla de Recolección",
+        lineas=[f"Periodo: {f1} al {f2}"],
+        columnas=[Columna("Recolector", 150), Columna("Caj", 60, "R", "{:.2f}"),
+                  Columna("Bruto ₡", 80, "R", "{:,.0f}"), Columna("Rebajo ₡", 80, "R", "{:,.0f}"),
+                  Columna("NETO ₡", 90, "R", "{:,.0f}")],
+        filas=list(filas),
+        total=["TOTALES", df_resumen["Cajuelas"].sum(), None, None, f"₡{neto.sum():,.0f}"],
+        color=(139, 0, 0),
+        motor="reportlab",
+    )
+
+def _plantilla_planilla_pago(df_pago, inicio, fin):
+    return Plantilla(
+        titulo="PLANILLA DE PAGO SEMANAL",
+        lineas=[f"Periodo: {inicio.strftime('%d/%m/%Y')} al {fin.strftime('%d/%m/%Y')}"],
+        columnas=[Columna("Trabajador", 110), Columna("A Pagar (CRC)", 50, "R", "{:,.2f}")],
+        filas=[(f"  {t}", m or 0.0) for t, m in zip(df_pago["Trabajador"], df_pago["Total"])],
+        total=["TOTAL A DISPERSAR:", df_pago["Total"].fillna(0).sum()],
+        firma="Firma de Autorización",
+        color=(0, 230, 118),
+    )
+
+def _plantilla_financiero(res, ini, fin, owner):
+    return Plantilla(
+        titulo=f"Cierre Financiero: {ini} al {fin}",
+        lineas=[f"Generado por: {owner}"],
+        columnas=[Columna("Concepto", 100), Columna("Monto", 60, "R", "{:,.2f}")],
+        filas=[("Mano de Obra", res['ManoObra']), ("Insumos", res['Insumos']), ("Cosecha", res['Cosecha'])],
+        total=["TOTAL GENERAL", res['TotalGeneral']],
+        color=(46, 125, 50),
+    )
+
+def pdf_planilla_cosecha(df_resumen, f1, f2):
+    return _documento(_plantilla_planilla_cosecha, df_resumen, f1, f2)
+
+def pdf_planilla_pago(df_pago, inicio, fin):
+    """df_pago con columnas Trabajador, Total."""
+    return _documento(_plantilla_planilla_pago, df_pago, inicio, fin)
+
+def pdf_financiero(res, ini, fin, owner):
+    return _documento(_plantilla_financiero, res, ini, fin, owner)
+
+
+# --- Botón de descarga bajo demanda ---
+
+def boton_pdf(etiqueta, nombre_archivo, generar, *args, clave, contenedor=st, **kwargs):
+    """Primero un botón "Preparar"; el PDF solo se genera al pulsarlo.
+
+    Mientras los datos no cambien, el botón de descarga sigue visible (sale de
+    la caché). Si cambian, vuelve a pedirse la preparación.
+    """
+    actual = huella(*args)
+    if st.session_state.get(clave) != actual:
+        if not contenedor.button(f"⚙️ Preparar {etiqueta}", key=f"{clave}_preparar", **kwargs):
+            return
+        st.session_state[clave] = actual
+    contenedor.download_button(etiqueta, generar(*args), nombre_archivo, "application/pdf",
+                               key=f"{clave}_descargar", **kwargs)
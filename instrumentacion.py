@@ -0,0 +1,257 @@
+import os
+import sys
+import time
+import logging
+import datetime
+import threading
+import contextlib
+from collections import deque
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# ⏱️ INSTRUMENTACIÓN DE CONSULTAS
+# ==========================================
+# get_db_cursor entrega un CursorMedido: cada préstamo de conexión deja un
+# evento con espera del pool, ejecución, lectura y filas, nombrado por la
+# función de database.py (o del módulo) que pidió el cursor. Los eventos van
+# a un anillo en memoria (los últimos N) y a un histograma por función que
+# no se borra. Las consultas sobre FINCA_SLOW_QUERY_MS se anotan en el log
+# con la forma de sus parámetros (tipos, nunca valores).
+
+UMBRAL_LENTA_MS = float(os.getenv("FINCA_SLOW_QUERY_MS", "500"))
+TAM_ANILLO = int(os.getenv("FINCA_TRAZAS", "2000"))
+# Límites superiores (ms) de los cubos del histograma; el último es "más"
+CUBOS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+LARGO_SQL_LOG = 300
+
+# Funciones genéricas que no dan nombre a la consulta: se sigue subiendo en la pila
+_AUXILIARES = {
+    "get_db_cursor", "fetch_frame", "consultar", "ejecutar_preparada", "asegurar_preparada",
+    "_preparar_todas", "tarea", "__enter__", "__exit__", "run", "_run_once",
+}
+_ARCHIVOS_IGNORADOS = (os.path.basename(__file__), "contextlib.py", "threading.py", "thread.py")
+
+
+def nombre_llamador(profundidad=2):
+    """'funcion' si la pidió database.py, 'modulo.funcion' si vino de otro módulo."""
+    frame = sys._getframe(profundidad)
+    while frame is not None:
+        codigo = frame.f_code
+        archivo = os.path.basename(codigo.co_filename)
+        if archivo not in _ARCHIVOS_IGNORADOS and codigo.co_name not in _AUXILIARES:
+            modulo = archivo.rsplit(".", 1)[0]
+            return codigo.co_name if modulo == "database" else f"{modulo}.{codigo.co_name}"
+        frame = frame.f_back
+    return "desconocido"
+
+
+def forma_params(params):
+    """Forma de los parámetros para el log: tipos y largos, sin datos de la finca."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {k: forma_params(v) if isinstance(v, (list, tuple, dict)) else type(v).__name__
+                for k, v in params.items()}
+    if isinstance(params, (list, tuple)):
+        if len(params) > 10:
+            return f"{type(params).__name__}[{len(params)}]"
+        return [forma_params(v) if isinstance(v, (list, tuple, dict)) else type(v).__name__ for v in params]
+    return type(params).__name__
+
+
+# --- Medición de un préstamo ---
+
+class Medicion:
+    """Acumula lo que pasó con un cursor entre que se presta y se devuelve."""
+    __slots__ = ("funcion", "espera", "ejecucion", "lectura", "filas", "sentencias",
+                 "sql_lenta", "params_lenta", "seg_lenta", "error")
+
+    def __init__(self, funcion, espera=0.0):
+        self.funcion = funcion
+        self.espera = espera
+        self.ejecucion = self.lectura = 0.0
+        self.filas = self.sentencias = 0
+        self.sql_lenta, self.params_lenta, self.seg_lenta = None, None, -1.0
+        self.error = None
+
+    def sentencia(self, sql, params, seg):
+        self.ejecucion += seg
+        self.sentencias += 1
+        if seg > self.seg_lenta:
+            self.sql_lenta, self.params_lenta, self.seg_lenta = sql, params, seg
+
+
+class CursorMedido(psycopg2.extensions.cursor):
+    """Cursor que cronometra execute/fetch y cuenta filas en su Medicion."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.medicion = Medicion("desconocido")
+
+    def execute(self, query, vars=None):
+        if REGISTRO.captura is not None:
+            REGISTRO.capturar_sentencia(self.medicion.funcion, query, vars)
+        t0 = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self.medicion.sentencia(query, vars, time.perf_counter() - t0)
+            if self.description is None and self.rowcount > 0:
+                self.medicion.filas += self.rowcount
+
+    def executemany(self, query, vars_list):
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self.medicion.sentencia(query, vars_list, time.perf_counter() - t0)
+
+    def _leer(self, lectura, *args):
+        t0 = time.perf_counter()
+        filas = lectura(*args)
+        self.medicion.lectura += time.perf_counter() - t0
+        return filas
+
+    def fetchone(self):
+        fila = self._leer(super().fetchone)
+        if fila is not None:
+            self.medicion.filas += 1
+        return fila
+
+    def fetchmany(self, size=None):
+        filas = self._leer(super().fetchmany, self.arraysize if size is None else size)
+        self.medicion.filas += len(filas)
+        return filas
+
+    def fetchall(self):
+        filas = self._leer(super().fetchall)
+        self.medicion.filas += len(filas)
+        return filas
+
+
+# --- Registro del proceso ---
+
+class Registro:
+    """Anillo de eventos recientes + histograma acumulado por función (thread-safe)."""
+
+    def __init__(self, tam_anillo=TAM_ANILLO):
+        self._lock = threading.Lock()
+        self.eventos = deque(maxlen=tam_anillo)
+        self.por_funcion = {}
+        self.pool_agotado = 0
+        self.desde = datetime.datetime.now()
+        # Lista de (función, sql, params) mientras dure capturar(); None = apagado
+        self.captura = None
+
+    def registrar(self, m):
+        total = m.espera + m.ejecucion + m.lectura
+        evento = {
+            "hora": datetime.datetime.now(), "funcion": m.funcion,
+            "espera_ms": m.espera * 1000, "ejecucion_ms": m.ejecucion * 1000,
+            "lectura_ms": m.lectura * 1000, "total_ms": total * 1000,
+            "filas": m.filas, "sentencias": m.sentencias, "error": m.error,
+        }
+        cubo = _cubo(evento["ejecucion_ms"] + evento["lectura_ms"])
+        with self._lock:
+            self.eventos.append(evento)
+            s = self.por_funcion.get(m.funcion)
+            if s is None:
+                s = self.por_funcion[m.funcion] = {
+                    "llamadas": 0, "errores": 0, "total_ms": 0.0, "espera_ms": 0.0,
+                    "max_ms": 0.0, "filas": 0, "histograma": [0] * (len(CUBOS_MS) + 1),
+                }
+            s["llamadas"] += 1
+            s["errores"] += m.error is not None
+            s["total_ms"] += evento["ejecucion_ms"] + evento["lectura_ms"]
+            s["espera_ms"] += evento["espera_ms"]
+            s["max_ms"] = max(s["max_ms"], evento["ejecucion_ms"] + evento["lectura_ms"])
+            s["filas"] += m.filas
+            s["histograma"][cubo] += 1
+
+        # Cuenta todo el trabajo en la BD (muchas sentencias cortas o un fetch
+        # grande también son lentos); se muestra la sentencia más larga
+        if (m.ejecucion + m.lectura) * 1000 >= UMBRAL_LENTA_MS:
+            logger.warning(
+                "Consulta lenta en %s: %.0f ms (%d sentencias, la más larga %.0f ms; lectura %.0f ms; "
+                "espera %.0f ms, %d filas) params=%s sql=%s",
+                m.funcion, evento["ejecucion_ms"] + evento["lectura_ms"], m.sentencias, max(m.seg_lenta, 0) * 1000,
+                evento["lectura_ms"], evento["espera_ms"], m.filas,
+                forma_params(m.params_lenta), _sql_corto(m.sql_lenta))
+
+    def anotar_pool_agotado(self, funcion):
+        with self._lock:
+            self.pool_agotado += 1
+        logger.error("Pool de conexiones agotado (pedido por %s)", funcion)
+
+    def resumen(self):
+        """Filas por función con llamadas, media, p50/p95 aproximados del histograma, máximo..."""
+        with self._lock:
+            datos = {k: {**v, "histograma": list(v["histograma"])} for k, v in self.por_funcion.items()}
+        filas = []
+        for funcion, s in datos.items():
+            n = s["llamadas"]
+            filas.append({
+                "Función": funcion, "Llamadas": n, "Errores": s["errores"],
+                "Media (ms)": s["total_ms"] / n, "p50 (ms)": _percentil(s["histograma"], n, 0.50),
+                "p95 (ms)": _percentil(s["histograma"], n, 0.95), "Máx (ms)": s["max_ms"],
+                "Espera pool (ms)": s["espera_ms"] / n, "Filas/llamada": s["filas"] / n,
+                "Total (s)": s["total_ms"] / 1000,
+            })
+        return sorted(filas, key=lambda f: f["Total (s)"], reverse=True)
+
+    def recientes(self, n=200):
+        with self._lock:
+            return list(self.eventos)[-n:][::-1]
+
+    @contextlib.contextmanager
+    def capturar(self):
+        """Anota el SQL y los parámetros de todo lo que se ejecute (herramientas, no la app)."""
+        sentencias = []
+        with self._lock:
+            self.captura = sentencias
+        try:
+            yield sentencias
+        finally:
+            with self._lock:
+                self.captura = None
+
+    def capturar_sentencia(self, funcion, sql, params):
+        with self._lock:
+            if self.captura is not None:
+                self.captura.append((funcion, sql, params))
+
+    def limpiar(self):
+        with self._lock:
+            self.eventos.clear()
+            self.por_funcion.clear()
+            self.pool_agotado = 0
+            self.desde = datetime.datetime.now()
+
+
+def _cubo(ms):
+    for i, limite in enumerate(CUBOS_MS):
+        if ms <= limite:
+            return i
+    return len(CUBOS_MS)
+
+def _percentil(histograma, n, q):
+    """Límite superior del cubo donde cae el percentil q (el último cubo no tiene límite)."""
+    objetivo, acumulado = q * n, 0
+    for i, cuenta in enumerate(histograma):
+        acumulado += cuenta
+        if acumulado >= objetivo:
+            return float(CUBOS_MS[i]) if i < len(CUBOS_MS) else float("inf")
+    return float("inf")
+
+def _sql_corto(sql):
+    if isinstance(sql, bytes):
+        sql = sql.decode(errors="replace")
+    sql = " ".join(str(sql).split())
+    return sql if len(sql) <= LARGO_SQL_LOG else sql[:LARGO_SQL_LOG] + "…"
+
+
+# Uno por proceso: lo comparten todas las sesiones y los hilos de consulta
+REGISTRO = Registro()
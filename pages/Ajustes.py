@@ -3,22 +3,26 @@ import pandas as pd
 import json 
 import time 
 from io import BytesIO
-import folium
-from folium.plugins import Draw 
-from streamlit_folium import st_folium 
 
 from database import (
     add_finca, delete_finca, add_trabajador, 
     add_catalogo_producto, delete_catalogo_producto,
     add_catalogo_labor, delete_catalogo_labor, set_tarifas, get_tarifas,
+    get_precio_venta, set_precio_venta, update_finca_hectareas,
     get_export_jornadas, get_export_recolecciones, get_export_insumos,
     update_finca_coords, update_finca_polygon
 )
 # IMPORTANTE: Agregamos mostrar_encabezado para el botón de volver
 from utils import (
     check_login, cargar_fincas, cargar_personal, 
-    cargar_productos, cargar_labores, limpiar_cache, mostrar_encabezado
+    cargar_productos, cargar_labores, limpiar_cache, mostrar_encabezado, es_admin
 )
+# El mapa de dibujo (folium) se carga solo al entrar a "Fincas"
+from renderizado import mapa_satelital, herramienta_dibujo, st_folium
+from perfilador import perfilar_pagina
+
+# Modo perfil (?perfil=1): vuelve a correr esta página dentro de cProfile
+perfilar_pagina(__file__)
 
 # 1. VERIFICACIÓN DE SESIÓN
 OWNER = check_login()
@@ -30,6 +34,8 @@ mostrar_encabezado("⚙️ Configuración")
 # Usamos st.pills o st.radio horizontal que son muy cómodos en móvil
 # (Si tu Streamlit es antiguo y falla 'pills', cámbialo por st.radio(..., horizontal=True))
 opciones = ["Fincas", "Personal", "Listas", "Tarifas", "Respaldo"]
+if es_admin(OWNER):
+    opciones.append("Diagnóstico")
 tab = st.pills("Seleccione una opción:", opciones, default="Fincas")
 
 st.divider()
@@ -51,20 +57,25 @@ if tab == "Fincas":
         if df != "..." and c2.button("Borrar Lote"): 
             delete_finca(df, OWNER); limpiar_cache(); st.rerun()
 
+    # Área para costos por hectárea (si se deja en 0, se usa la del polígono dibujado)
+    with st.expander("📐 Área de Lotes (hectáreas)", expanded=False):
+        c1, c2 = st.columns(2)
+        lote_ha = c1.selectbox("Lote", fincas_disp, key="lote_ha")
+        ha = c2.number_input("Hectáreas", min_value=0.0, step=0.1, key="ha_lote")
+        if lote_ha and st.button("Guardar Área"):
+            update_finca_hectareas(lote_ha, ha, OWNER); limpiar_cache()
+            st.toast("Área actualizada")
+
     st.markdown("#### 🗺️ Dibujar Mapa Satelital")
     if fincas_disp:
         lote_target = st.selectbox("📍 ¿Qué lote vamos a dibujar?", fincas_disp)
         st.caption("Use el pentágono ⬠ en el mapa para dibujar los límites.")
         
         # 1. Crear Mapa
-        m_draw = folium.Map(location=[9.65, -84.02], zoom_start=15)
-        folium.TileLayer(
-            tiles='https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
-            attr='Esri', name='Satélite'
-        ).add_to(m_draw)
+        m_draw = mapa_satelital(9.65, -84.02, 15)
 
         # 2. Herramientas de Dibujo
-        draw = Draw(
+        draw = herramienta_dibujo(
             export=False,
             position='topleft',
             draw_options={'polyline': False, 'rectangle': False, 'circle': False, 'marker': False, 'circlemarker': False, 'polygon': True},
@@ -85,6 +96,7 @@ if tab == "Fincas":
                 if st.button(f"💾 Guardar Mapa de: {lote_target}", type="primary", use_container_width=True):
                     geojson_string = json.dumps(poly_data)
                     update_finca_polygon(lote_target, geojson_string, OWNER)
+                    limpiar_cache() # el área del polígono entra en la rentabilidad
                     st.toast("¡Mapa guardado exitosamente!", icon="🗺️")
                     time.sleep(1)
                     st.rerun()
@@ -136,14 +148,18 @@ elif tab == "Listas":
 elif tab == "Tarifas":
     st.markdown("#### 💰 Configuración de Pagos")
     td, th = get_tarifas(OWNER)
+    pv = get_precio_venta(OWNER)
     
     with st.container(border=True):
         st.caption("Estos valores se usarán por defecto en los jornales.")
         d = st.number_input("Pago por Día (Jornal) ₡", value=td, step=500.0)
         h = st.number_input("Pago por Hora Extra ₡", value=th, step=100.0)
+        v = st.number_input("Precio de Venta por Cajuela ₡ (para márgenes)", value=pv, step=100.0)
         
         if st.button("💾 Actualizar Tarifas Globales", type="primary", use_container_width=True):
             set_tarifas(OWNER, d, h)
+            set_precio_venta(OWNER, v)
+            limpiar_cache() # los márgenes en caché usan las tarifas viejas
             st.toast("Tarifas actualizadas")
 
 # --- SECCIÓN 5: RESPALDO ---
@@ -158,20 +174,70 @@ elif tab == "Respaldo":
 
     c1, c2, c3 = st.columns(3)
     
-    if jor:
-        df_j = pd.DataFrame(jor, columns=["ID","Fecha","Trabajador","Lote","Actividad","Días","Extras"])
+    if not jor.empty:
         b_j = BytesIO()
-        with pd.ExcelWriter(b_j, engine="xlsxwriter") as w: df_j.to_excel(w, index=False)
+        with pd.ExcelWriter(b_j, engine="xlsxwriter") as w: jor.to_excel(w, index=False)
         c1.download_button("📥 Jornadas", b_j.getvalue(), "jornadas.xlsx", use_container_width=True)
     
-    if cos:
-        df_c = pd.DataFrame(cos, columns=["ID","Fecha","Recolector","Lote","Cajuelas","Precio","Total"])
+    if not cos.empty:
         b_c = BytesIO()
-        with pd.ExcelWriter(b_c, engine="xlsxwriter") as w: df_c.to_excel(w, index=False)
+        with pd.ExcelWriter(b_c, engine="xlsxwriter") as w: cos.to_excel(w, index=False)
         c2.download_button("📥 Cosecha", b_c.getvalue(), "cosecha.xlsx", use_container_width=True)
         
-    if ins:
-        df_i = pd.DataFrame(ins, columns=["ID","Fecha","Lote","Tipo","Prod","Dosis","Cant","Precio","Total"])
+    if not ins.empty:
         b_i = BytesIO()
-        with pd.ExcelWriter(b_i, engine="xlsxwriter") as w: df_i.to_excel(w, index=False)
-        c3.download_button("📥 Insumos", b_i.getvalue(), "insumos.xlsx", use_container_width=True)
\ No newline at end of file
+        with pd.ExcelWriter(b_i, engine="xlsxwriter") as w: ins.to_excel(w, index=False)
+        c3.download_button("📥 Insumos", b_i.getvalue(), "insumos.xlsx", use_container_width=True)
+
+# --- SECCIÓN 6: DIAGNÓSTICO (OCULTA, ?admin=1) ---
+elif tab == "Diagnóstico":
+    from instrumentacion import REGISTRO, UMBRAL_LENTA_MS
+    from cache_backend import METRICAS, BACKEND, get_backend
+    from resiliencia import INTERRUPTOR
+    from cola_local import contar_escrituras_pendientes
+
+    st.markdown("#### ⏱️ Consultas a la Base de Datos")
+    st.caption(f"Desde {REGISTRO.desde:%d/%m %H:%M} · este proceso · lentas ≥ {UMBRAL_LENTA_MS:.0f} ms van al log")
+
+    resumen = pd.DataFrame(REGISTRO.resumen())
+    recientes = pd.DataFrame(REGISTRO.recientes())
+    k1, k2, k3 = st.columns(3)
+    k1.metric("Consultas", int(resumen["Llamadas"].sum()) if not resumen.empty else 0)
+    k2.metric("Tiempo en BD", f"{resumen['Total (s)'].sum():.1f} s" if not resumen.empty else "0 s")
+    k3.metric("Pool agotado", REGISTRO.pool_agotado)
+    estado_bd = INTERRUPTOR.resumen()
+    st.caption(f"Interruptor de BD: {estado_bd['estado']} · abierto {estado_bd['aperturas']} veces · "
+               f"{contar_escrituras_pendientes()} escrituras en la cola local")
+
+    if resumen.empty:
+        st.info("Todavía no hay consultas registradas.")
+    else:
+        ms = st.column_config.NumberColumn(format="%.1f")
+        st.dataframe(resumen, hide_index=True, use_container_width=True, column_config={
+            c: ms for c in ["Media (ms)", "p50 (ms)", "p95 (ms)", "Máx (ms)", "Espera pool (ms)", "Filas/llamada", "Total (s)"]
+        })
+        st.markdown("##### Últimas consultas")
+        st.dataframe(recientes, hide_index=True, use_container_width=True, column_config={
+            "hora": st.column_config.DatetimeColumn("Hora", format="HH:mm:ss"),
+        })
+
+    st.markdown("#### 🗃️ Caché de Lecturas")
+    tam = get_backend().tamano()
+    cache = pd.DataFrame(METRICAS.resumen())
+    aciertos = int(cache["Aciertos"].sum()) if not cache.empty else 0
+    total = aciertos + (int(cache["Fallos"].sum()) if not cache.empty else 0)
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Aciertos", f"{100 * aciertos / total:.0f} %" if total else "-")
+    c2.metric("Entradas", tam["entradas"])
+    c3.metric("Ocupado", f"{tam['bytes'] / 2**20:.1f} / {tam['max_bytes'] / 2**20:.0f} MB")
+    st.caption(f"Backend: {BACKEND} · aciertos y fallos de este proceso")
+    if not cache.empty:
+        st.dataframe(cache, hide_index=True, use_container_width=True, column_config={
+            c: st.column_config.NumberColumn(format="%.1f")
+            for c in ["% Aciertos", "Cálculo medio (ms)", "Ahorrado (s)", "Último tamaño (KB)"]
+        })
+
+    if st.button("🧹 Reiniciar contadores"):
+        REGISTRO.limpiar()
+        METRICAS.limpiar()
+        st.rerun()
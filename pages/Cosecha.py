@@ -1,61 +1,120 @@
 import streamlit as st
-import pandas as pd
 import datetime
 import time
-from io import BytesIO
-
-# Librerías para PDF
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
 
 # Base de datos
 from database import (
-    add_recoleccion_batch, get_reporte_cosecha_detallado, add_vale, get_saldo_global
+    get_reporte_cosecha_detallado, add_vale, get_saldo_global
+)
+# Cola local: cada toque queda guardado aunque se caiga la señal
+from cola_local import (
+    registrar_toque, get_resumen_carrito, vaciar_carrito, confirmar_carrito,
+    get_estado_sync, get_sincronizador, id_dispositivo
 )
 # Utils (Con la nueva navegación)
 from utils import check_login, cargar_fincas, cargar_personal, mostrar_encabezado
+# PDF: se genera solo al pedirlo y queda en caché mientras la tabla no cambie
+from documentos import pdf_planilla_cosecha, boton_pdf
+# Proyección de la temporada (curvas por lote, en caché hasta que entre cosecha nueva)
+from pronostico import proyectar_temporada
+from perfilador import perfilar_pagina
+
+# Modo perfil (?perfil=1): vuelve a correr esta página dentro de cProfile
+perfilar_pagina(__file__)
+
+# --- 1. PANELES DEL REGISTRO RÁPIDO (fragmentos) ---
+# Un toque de cantidad solo re-ejecuta su panel: no vuelve a inyectar CSS,
+# ni recargar catálogos, ni reconstruir el carrito entero.
+
+@st.fragment
+def panel_registro(recolectores, f_hoy, p_hoy, l_hoy):
+    if "resumen_carrito" not in st.session_state:
+        # Una sola lectura por sesión; de ahí en adelante se suma en memoria
+        st.session_state.resumen_carrito = get_resumen_carrito(OWNER, DISPOSITIVO, RECIENTES)
+    resumen = st.session_state.resumen_carrito
+
+    st.markdown("##### 👤 Seleccione Recolector:")
+    trabajador_actual = st.selectbox("Trabajador", recolectores, label_visibility="collapsed")
+
+    st.markdown("##### 📦 ¿Cuántas cajuelas trajo?")
+
+    def agregar_rapido(cantidad):
+        """Guarda el toque en la cola local y actualiza los totales sin recalcular"""
+        registrar_toque(OWNER, DISPOSITIVO, trabajador_actual, cantidad, p_hoy)
+        resumen["n"] += 1
+        resumen["cajuelas"] += cantidad
+        resumen["total"] += cantidad * p_hoy
+        resumen["recientes"].insert(0, {
+            "Hora": datetime.datetime.now().strftime("%H:%M"),
+            "Nombre": trabajador_actual,
+            "Cajuelas": cantidad,
+            "Total": cantidad * p_hoy,
+        })
+        del resumen["recientes"][RECIENTES:]
+        st.toast(f"✅ {trabajador_actual}: +{cantidad} cajuelas", icon="☕")
+
+    # Fila 1 de Botones
+    cb1, cb2, cb3, cb4 = st.columns(4)
+    with cb1: 
+        if st.button("0.25", use_container_width=True): agregar_rapido(0.25)
+    with cb2: 
+        if st.button("0.50", use_container_width=True): agregar_rapido(0.50)
+    with cb3: 
+        if st.button("1.0", use_container_width=True, type="primary"): agregar_rapido(1.0) # El 1.0 es el primario
+    with cb4: 
+        if st.button("1.5", use_container_width=True): agregar_rapido(1.5)
+        
+    # Fila 2 de Botones
+    cb5, cb6, cb7 = st.columns([1,1,2])
+    with cb5: 
+        if st.button("2.0", use_container_width=True): agregar_rapido(2.0)
+    with cb6: 
+        if st.button("3.0", use_container_width=True): agregar_rapido(3.0)
+    with cb7:
+        # Entrada Manual
+        with st.popover("🔢 Otra Cantidad", use_container_width=True):
+            cant_manual = st.number_input("Ingrese cantidad exacta", step=0.1)
+            if st.button("Agregar Manual"):
+                if cant_manual > 0: agregar_rapido(cant_manual); st.rerun(scope="fragment")
 
-# --- 1. FUNCIÓN PDF (Lógica de Reportes) ---
-def generar_pdf_planilla(df_resumen, f1, f2):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    styles = getSampleStyleSheet()
-
-    elements.append(Paragraph(f"Planilla de Recolección", styles['Title']))
-    elements.append(Paragraph(f"Periodo: {f1} al {f2}", styles['Normal']))
-    elements.append(Spacer(1, 12))
-
-    data = [['Recolector', 'Caj', 'Bruto ₡', 'Rebajo ₡', 'NETO ₡']]
-    total_caj = 0
-    total_pagar = 0
-
-    for _, row in df_resumen.iterrows():
-        neto = row["Total ₡"] - row["Abono Deuda"]
-        data.append([
-            row['Recolector'][:20], 
-            f"{row['Cajuelas']:.2f}", 
-            f"{row['Total ₡']:,.0f}", 
-            f"{row['Abono Deuda']:,.0f}", 
-            f"{neto:,.0f}"
-        ])
-        total_caj += row['Cajuelas']
-        total_pagar += neto
-
-    data.append(['TOTALES', f"{total_caj:.2f}", '', '', f"₡{total_pagar:,.0f}"])
-
-    t = Table(data, colWidths=[150, 60, 80, 80, 90])
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.darkred),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey)
-    ]))
-    elements.append(t)
-    doc.build(elements)
-    return buffer.getvalue()
+    st.divider()
+
+    # Carrito: totales acumulados + solo los últimos toques
+    if resumen["n"]:
+        m1, m2 = st.columns(2)
+        m1.metric("Total Cajuelas", f"{resumen['cajuelas']:.2f}")
+        m2.metric("Total a Pagar", f"₡{resumen['total']:,.0f}")
+
+        # BOTÓN GUARDAR (acciones sobre todo el carrito: recargan la página entera)
+        if st.button(f"💾 GUARDAR {resumen['n']} REGISTROS EN NUBE", type="primary", use_container_width=True):
+            n = confirmar_carrito(OWNER, DISPOSITIVO, f_hoy, l_hoy, p_hoy)
+            del st.session_state.resumen_carrito
+            st.toast(f"✅ {n} registros en cola de envío", icon="☁️")
+            st.rerun()
+
+        # Visualización simple
+        st.markdown(f"###### 📋 Registros en cola (últimos {len(resumen['recientes'])}):")
+        st.dataframe(resumen["recientes"], column_order=["Hora", "Nombre", "Cajuelas"], use_container_width=True, hide_index=True)
+
+        if st.button("🗑️ Borrar Lista (Empezar de cero)"):
+            vaciar_carrito(OWNER, DISPOSITIVO)
+            del st.session_state.resumen_carrito
+            st.rerun()
+    else:
+        st.info("👆 Seleccione trabajador y toque un botón de cantidad.")
+
+@st.fragment(run_every="15s")
+def estado_sincronizacion():
+    """Estado de envío a la nube; se refresca solo, sin tocar el resto de la página."""
+    sync = get_estado_sync(OWNER)
+    if sync["rechazadas"]:
+        st.error(f"⚠️ {sync['rechazadas']} registros rechazados por la base de datos: {sync['ultimo_error']}")
+    if sync["con_error"]:
+        st.warning(f"📡 Sin conexión: {sync['pendientes']} registros guardados en el teléfono, reintentando...")
+    elif sync["pendientes"]:
+        st.caption(f"⏳ Enviando {sync['pendientes']} registros a la nube...")
+    else:
+        st.caption("☁️ Todo sincronizado")
 
 # --- 2. INICIO DE PÁGINA ---
 OWNER = check_login()
@@ -63,13 +122,14 @@ OWNER = check_login()
 # AQUÍ ESTÁ EL CAMBIO IMPORTANTE: Botón de volver al menú
 mostrar_encabezado("☕ Control Cosecha") 
 
-# Inicializar "Carrito" de recolección
-if "temp_harvest" not in st.session_state:
-    st.session_state.temp_harvest = []
+# Hilo que sube la cola local a la nube (uno por servidor)
+get_sincronizador()
+DISPOSITIVO = id_dispositivo()
+RECIENTES = 15 # Toques que se muestran en el carrito
 
 # Tabs Superiores
 # Usamos radio horizontal o pills para navegar entre pestañas
-modo = st.pills("Seleccione Modo:", ["⚡ Registro Rápido", "💵 Planilla Semanal"], default="⚡ Registro Rápido")
+modo = st.pills("Seleccione Modo:", ["⚡ Registro Rápido", "💵 Planilla Semanal", "📈 Proyección"], default="⚡ Registro Rápido")
 
 st.divider()
 
@@ -92,13 +152,7 @@ if modo == "⚡ Registro Rápido":
     if not lista_recolectores:
         st.warning("⚠️ No hay recolectores registrados en Ajustes.")
         st.stop()
-        
-    st.markdown("##### 👤 Seleccione Recolector:")
-    trabajador_actual = st.selectbox("Trabajador", lista_recolectores, label_visibility="collapsed")
 
-    # C. BOTONERA DE VELOCIDAD (Aquí ocurre la magia)
-    st.markdown("##### 📦 ¿Cuántas cajuelas trajo?")
-    
     # CSS para hacer estos botones específicos muy grandes
     st.markdown("""
         <style>
@@ -111,77 +165,11 @@ if modo == "⚡ Registro Rápido":
         </style>
     """, unsafe_allow_html=True)
 
-    def agregar_rapido(cantidad):
-        """Agrega a la lista temporal sin recargar toda la UI"""
-        st.session_state.temp_harvest.insert(0, {
-            "Nombre": trabajador_actual,
-            "Cajuelas": cantidad,
-            "Total": cantidad * p_hoy,
-            "Hora": datetime.datetime.now().strftime("%H:%M")
-        })
-        st.toast(f"✅ {trabajador_actual}: +{cantidad} cajuelas", icon="☕")
-
-    # Fila 1 de Botones
-    cb1, cb2, cb3, cb4 = st.columns(4)
-    with cb1: 
-        if st.button("0.25", use_container_width=True): agregar_rapido(0.25)
-    with cb2: 
-        if st.button("0.50", use_container_width=True): agregar_rapido(0.50)
-    with cb3: 
-        if st.button("1.0", use_container_width=True, type="primary"): agregar_rapido(1.0) # El 1.0 es el primario
-    with cb4: 
-        if st.button("1.5", use_container_width=True): agregar_rapido(1.5)
-        
-    # Fila 2 de Botones
-    cb5, cb6, cb7 = st.columns([1,1,2])
-    with cb5: 
-        if st.button("2.0", use_container_width=True): agregar_rapido(2.0)
-    with cb6: 
-        if st.button("3.0", use_container_width=True): agregar_rapido(3.0)
-    with cb7:
-        # Entrada Manual
-        with st.popover("🔢 Otra Cantidad", use_container_width=True):
-            cant_manual = st.number_input("Ingrese cantidad exacta", step=0.1)
-            if st.button("Agregar Manual"):
-                if cant_manual > 0: agregar_rapido(cant_manual); st.rerun()
+    # C + D. Botonera y carrito: cada toque solo re-ejecuta este panel
+    panel_registro(lista_recolectores, f_hoy, p_hoy, l_hoy)
 
     st.divider()
-
-    # D. Lista de Registros (Carrito)
-    if st.session_state.temp_harvest:
-        df_temp = pd.DataFrame(st.session_state.temp_harvest)
-        
-        # Métricas Totales
-        tot_caj = df_temp["Cajuelas"].sum()
-        tot_din = df_temp["Total"].sum()
-        
-        m1, m2 = st.columns(2)
-        m1.metric("Total Cajuelas", f"{tot_caj:.2f}")
-        m2.metric("Total a Pagar", f"₡{tot_din:,.0f}")
-        
-        # BOTÓN GUARDAR
-        if st.button(f"💾 GUARDAR {len(df_temp)} REGISTROS EN NUBE", type="primary", use_container_width=True):
-            datos_db = []
-            for item in st.session_state.temp_harvest:
-                datos_db.append((str(f_hoy), item["Nombre"], l_hoy, float(item["Cajuelas"]), float(p_hoy), OWNER))
-            
-            if add_recoleccion_batch(datos_db):
-                st.success("✅ Datos guardados correctamente")
-                st.session_state.temp_harvest = []
-                time.sleep(1)
-                st.rerun()
-            else:
-                st.error("Error de conexión")
-
-        # Visualización simple
-        st.markdown("###### 📋 Registros en cola:")
-        st.dataframe(df_temp[["Hora", "Nombre", "Cajuelas"]], use_container_width=True, hide_index=True)
-        
-        if st.button("🗑️ Borrar Lista (Empezar de cero)"):
-            st.session_state.temp_harvest = []
-            st.rerun()
-    else:
-        st.info("👆 Seleccione trabajador y toque un botón de cantidad.")
+    estado_sincronizacion()
 
 
 # =======================================================
@@ -198,13 +186,9 @@ elif modo == "💵 Planilla Semanal":
         f2 = c_f2.date_input("Hasta", hoy)
 
     # Obtener Datos
-    raw = get_reporte_cosecha_detallado(f1, f2, OWNER)
+    df = get_reporte_cosecha_detallado(f1, f2, OWNER)
     
-    if raw:
-        df = pd.DataFrame(raw, columns=["Recolector", "Lote", "Cajuelas", "Total ₡"])
-        df["Cajuelas"] = pd.to_numeric(df["Cajuelas"])
-        df["Total ₡"] = pd.to_numeric(df["Total ₡"])
-        
+    if not df.empty:
         # Agrupar
         resumen = df.groupby("Recolector")[["Cajuelas", "Total ₡"]].sum().reset_index()
         
@@ -235,8 +219,8 @@ elif modo == "💵 Planilla Semanal":
         c_p1, c_p2 = st.columns(2)
         
         # PDF
-        pdf = generar_pdf_planilla(edited, f1, f2)
-        c_p1.download_button("📄 PDF", pdf, "planilla.pdf", "application/pdf", use_container_width=True)
+        boton_pdf("📄 PDF", "planilla.pdf", pdf_planilla_cosecha, edited, f1, f2,
+                  clave="pdf_planilla_cosecha", contenedor=c_p1, use_container_width=True)
         
         # Cerrar
         if c_p2.button("✅ Pagar y Cerrar", type="primary", use_container_width=True):
@@ -259,4 +243,30 @@ elif modo == "💵 Planilla Semanal":
         vm = st.number_input("Monto", step=1000)
         if st.button("Guardar Vale"):
             add_vale(hoy, vt, vm, "Adelanto", OWNER)
-            st.success("Guardado")
\ No newline at end of file
+            st.success("Guardado")
+
+
+# =======================================================
+# MODO 3: PROYECCIÓN DE TEMPORADA
+# =======================================================
+elif modo == "📈 Proyección":
+    st.caption("Estimación por lote de lo que falta por cosechar, según la curva de temporadas anteriores y lo recogido este año.")
+    dias_cuadrilla = st.slider("Planificar cuadrilla para los próximos (días)", 3, 30, 7)
+    proy = proyectar_temporada(OWNER, dias_cuadrilla=dias_cuadrilla)
+
+    if proy.empty:
+        st.info("Aún no hay suficiente historial de cosecha para proyectar.")
+    else:
+        k1, k2, k3 = st.columns(3)
+        k1.metric("Cosechado", f"{proy['Cosechado'].sum():,.0f} caj")
+        k2.metric("Faltan", f"{proy['Faltan (caj)'].sum():,.0f} caj")
+        k3.metric("Recolectores/día", f"{proy['Recolectores/día (próx.)'].sum():,.0f}")
+
+        st.dataframe(proy, hide_index=True, use_container_width=True, column_config={
+            "Cosechado": st.column_config.NumberColumn(format="%.1f"),
+            "Proyección Total": st.column_config.NumberColumn(format="%.1f"),
+            "Faltan (caj)": st.column_config.NumberColumn(format="%.1f"),
+            "Recolector-días": st.column_config.NumberColumn(format="%.0f"),
+            "Recolectores/día (próx.)": st.column_config.NumberColumn(format="%d"),
+            "Pico": st.column_config.DateColumn("Pico estimado", format="DD/MM/YYYY"),
+        })
@@ -1,15 +1,26 @@
 import streamlit as st
 import datetime
-import pandas as pd
-from database import add_insumo, add_analisis_suelo, get_analisis_suelo
+from database import add_insumo, add_analisis_suelo
+from resiliencia import ENCOLADA
+# Suelos: último por lote, historial paginado, tendencias y recomendaciones
+from suelos import (
+    ultimo_por_lote, historial, tendencias, get_notas_analisis,
+    get_recomendaciones, recalcular_recomendaciones
+)
+# Gasto/consumo/precio por mes desde el acumulado mensual
+from analitica_insumos import analitica_insumos, vista, resumen_por
 from utils import check_login, cargar_fincas, cargar_productos, smart_select, mostrar_encabezado
+from perfilador import perfilar_pagina
+
+# Modo perfil (?perfil=1): vuelve a correr esta página dentro de cProfile
+perfilar_pagina(__file__)
 
 # 1. VERIFICACIÓN Y ENCABEZADO
 OWNER = check_login()
 mostrar_encabezado("📦 Insumos & Suelos") # <--- Botón de volver al menú
 
 # 2. NAVEGACIÓN INTERNA
-opcion = st.pills("Seleccione módulo:", ["🛢️ Registro Insumos", "🧪 Análisis Suelo"], default="🛢️ Registro Insumos")
+opcion = st.pills("Seleccione módulo:", ["🛢️ Registro Insumos", "🧪 Análisis Suelo", "📊 Gasto Insumos"], default="🛢️ Registro Insumos")
 
 st.divider()
 
@@ -77,9 +88,13 @@ if opcion == "🛢️ Registro Insumos":
             if cant > 0 and precio_unit > 0:
                 try:
                     # NOTA: Guardamos total_calc como el precio final
-                    add_insumo(str(fecha), lote, tipo, "", prod, dosis, cant, precio_unit, OWNER) 
-                    st.success(f"✅ Guardado: {cant} {unidad_medida} de {prod}")
-                    st.toast("Registro exitoso", icon="📦")
+                    if add_insumo(str(fecha), lote, tipo, "", prod, dosis, cant, precio_unit, OWNER) is ENCOLADA:
+                        # Sin BD: la recomendación se recalcula cuando la cola lo reenvíe
+                        st.info(f"📥 {cant} {unidad_medida} de {prod} quedó en cola; no hace falta ingresarlo de nuevo")
+                    else:
+                        recalcular_recomendaciones(OWNER, lote)
+                        st.success(f"✅ Guardado: {cant} {unidad_medida} de {prod}")
+                        st.toast("Registro exitoso", icon="📦")
                 except Exception as e:
                     st.error(f"Error: {e}")
             else:
@@ -107,18 +122,52 @@ elif opcion == "🧪 Análisis Suelo":
             notas = st.text_area("Recomendación del Agrónomo", height=80)
             
             if st.button("Guardar Análisis", type="primary", use_container_width=True):
-                add_analisis_suelo(sl_fecha, sl_lote, ph, n, p, k, notas, OWNER)
-                st.success("Análisis guardado")
-                st.rerun()
+                if add_analisis_suelo(sl_fecha, sl_lote, ph, n, p, k, notas, OWNER) is ENCOLADA:
+                    st.info("📥 Análisis en cola: se guarda al volver la base de datos, no hace falta ingresarlo de nuevo")
+                else:
+                    recalcular_recomendaciones(OWNER, sl_lote)
+                    st.success("Análisis guardado")
+                    st.rerun()
         else:
             st.warning("No hay lotes configurados.")
 
-    # Tabla Histórica
+    # Estado actual: último análisis y recomendación de cada lote
+    st.divider()
+    st.markdown("#### 🌱 Estado por Lote")
+    recs = get_recomendaciones(OWNER)
+    if not recs.empty:
+        st.dataframe(recs, hide_index=True, use_container_width=True, column_config={
+            "pH": st.column_config.NumberColumn("pH", format="%.1f"),
+            "Análisis": st.column_config.DateColumn("Análisis", format="DD/MM/YYYY"),
+            "Último Abono": st.column_config.DateColumn("Último Abono", format="DD/MM/YYYY"),
+            "Última Cal": st.column_config.DateColumn("Última Cal", format="DD/MM/YYYY"),
+        })
+    else:
+        ultimos = ultimo_por_lote(OWNER)
+        if not ultimos.empty:
+            st.dataframe(ultimos, hide_index=True, use_container_width=True)
+
+    # Tendencia del lote (calculada en SQL)
+    fincas = cargar_fincas(OWNER)
+    if fincas:
+        lote_t = st.selectbox("📈 Tendencia del lote", fincas, key="lote_tendencia")
+        tend = tendencias(OWNER, lote_t)
+        if len(tend) >= 2:
+            ultima = tend.iloc[-1]
+            m1, m2, m3, m4 = st.columns(4)
+            for col, n in zip([m1, m2, m3, m4], ["pH", "N", "P", "K"]):
+                col.metric(n, f"{ultima[n]:.1f}", f"{ultima[f'{n}/año']:+.2f}/año")
+            st.line_chart(tend, x="Fecha", y=["pH media", "N media", "P media", "K media"])
+        elif len(tend) == 1:
+            st.caption("Solo hay un análisis de este lote: aún no hay tendencia.")
+
+    # Historial paginado (notas recortadas; completas al elegir un análisis)
     st.divider()
     st.markdown("#### 📉 Historial")
-    hist = get_analisis_suelo(OWNER)
-    if hist:
-        df = pd.DataFrame(hist, columns=["ID","Fecha","Lote","pH","N","P","K","Notas"])
+    POR_PAGINA = 20
+    pagina = st.session_state.get("pagina_suelo", 0)
+    df, total = historial(OWNER, pagina, POR_PAGINA)
+    if not df.empty:
         # Formato condicional simple para pH (Rojo si es muy ácido)
         st.dataframe(
             df, 
@@ -129,5 +178,48 @@ elif opcion == "🧪 Análisis Suelo":
                 "Fecha": st.column_config.DateColumn("Fecha", format="DD/MM/YYYY")
             }
         )
+        paginas = max(1, -(-total // POR_PAGINA))
+        c_ant, c_pag, c_sig = st.columns([1, 2, 1])
+        if c_ant.button("⬅️", disabled=pagina == 0, key="suelo_ant"):
+            st.session_state.pagina_suelo = pagina - 1; st.rerun()
+        c_pag.caption(f"Página {pagina + 1} de {paginas} ({total} análisis)")
+        if c_sig.button("➡️", disabled=pagina + 1 >= paginas, key="suelo_sig"):
+            st.session_state.pagina_suelo = pagina + 1; st.rerun()
+
+        id_notas = st.selectbox("📝 Ver notas completas", ["..."] + df["ID"].tolist())
+        if id_notas != "...":
+            st.info(get_notas_analisis(int(id_notas), OWNER) or "Sin notas.")
     else:
-        st.info("No hay análisis registrados aún.")
\ No newline at end of file
+        st.info("No hay análisis registrados aún.")
+
+# ---------------------------------------------------------
+# MÓDULO 3: ANALÍTICA DE GASTO EN INSUMOS
+# ---------------------------------------------------------
+elif opcion == "📊 Gasto Insumos":
+    hoy = datetime.date.today()
+    meses = st.select_slider("Periodo (meses hacia atrás)", [3, 6, 12, 24, 36], value=12)
+    desde = (hoy.replace(day=1) - datetime.timedelta(days=31 * (meses - 1))).replace(day=1)
+    df = analitica_insumos(OWNER, desde, hoy)
+
+    if df.empty:
+        st.info("No hay insumos registrados en el periodo.")
+    else:
+        total = df[df["Dimensión"] == "total"]
+        k1, k2 = st.columns(2)
+        k1.metric("Gasto del Periodo", f"₡{total['Gasto'].sum():,.0f}")
+        k2.metric("Promedio Mensual", f"₡{total['Gasto'].mean():,.0f}")
+
+        dimension = st.radio("Ver por:", ["producto", "tipo", "lote"], horizontal=True,
+                             format_func=lambda d: {"producto": "Producto", "tipo": "Tipo", "lote": "Lote"}[d])
+        st.bar_chart(vista(df, dimension))
+
+        moneda = st.column_config.NumberColumn(format="₡%d")
+        st.dataframe(resumen_por(df, dimension), hide_index=True, use_container_width=True, column_config={
+            "Valor": st.column_config.TextColumn(dimension.capitalize()),
+            "Cantidad": st.column_config.NumberColumn(format="%.1f"),
+            "Gasto": moneda, "Precio Medio": moneda, "Último Precio": moneda, "Var. Último Mes": moneda,
+        })
+
+        if dimension == "producto":
+            st.markdown("##### 💲 Tendencia de Precio")
+            st.line_chart(vista(df, "producto", "Precio Medio"))
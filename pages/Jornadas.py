@@ -1,10 +1,13 @@
 import streamlit as st
 import datetime
 import time
-import pandas as pd
 from database import add_jornada, get_jornadas_between, get_tarifas, add_vale, get_saldo_global
 # Importamos la nueva función de encabezado
 from utils import check_login, cargar_fincas, cargar_personal, cargar_labores, smart_select, mostrar_encabezado
+from perfilador import perfilar_pagina
+
+# Modo perfil (?perfil=1): vuelve a correr esta página dentro de cProfile
+perfilar_pagina(__file__)
 
 # 1. VERIFICACIÓN Y ENCABEZADO
 OWNER = check_login()
@@ -93,16 +96,11 @@ elif opcion == "💰 Planilla y Pagos":
         fin = c_f2.date_input("Hasta", hoy)
     
     # Obtener datos
-    raw = get_jornadas_between(ini, fin, OWNER)
+    df = get_jornadas_between(ini, fin, OWNER)
     td, th = get_tarifas(OWNER) # Tarifa Día, Tarifa Hora Extra
     saldo_global = get_saldo_global(OWNER)
     
-    if raw:
-        # Procesar Datos
-        df = pd.DataFrame(raw, columns=["ID","Trab","Fecha","Lote","Act","Días","HN","Ext"])
-        df["Días"] = pd.to_numeric(df["Días"])
-        df["Ext"] = pd.to_numeric(df["Ext"])
-        
+    if not df.empty:
         # Agrupar por Trabajador
         res = df.groupby("Trab")[["Días","Ext"]].sum().reset_index()
         
@@ -1,10 +1,14 @@
 import streamlit as st
-import folium
 import json 
-from streamlit_folium import st_folium
 from database import get_fincas_full_data, get_estado_lote
 # Importamos mostrar_encabezado para la navegación
 from utils import check_login, mostrar_encabezado
+# folium / streamlit_folium se cargan recién al dibujar el mapa
+from renderizado import folium, mapa_satelital, st_folium
+from perfilador import perfilar_pagina
+
+# Modo perfil (?perfil=1): vuelve a correr esta página dentro de cProfile
+perfilar_pagina(__file__)
 
 # 1. VERIFICACIÓN Y ENCABEZADO
 OWNER = check_login()
@@ -38,22 +42,17 @@ if lote_actual:
     geojson_str = lote_actual[3]
     
     # Coordenadas: Si son 0.0 (default), usamos una coordenada central de Costa Rica aprox
-    lat_center = float(lote_actual[1]) if float(lote_actual[1]) != 0.0 else 9.65
-    lon_center = float(lote_actual[2]) if float(lote_actual[2]) != 0.0 else -84.02
+    lat_center = lote_actual[1] or 9.65
+    lon_center = lote_actual[2] or -84.02
 
     # Obtener estado (Color Inteligente)
     color, estado = get_estado_lote(nombre, OWNER)
 
     # 4. CONFIGURAR MAPA
     # zoom_start=17 es muy cerca, ideal para ver matas de café
-    m = folium.Map(location=[lat_center, lon_center], zoom_start=17, control_scale=True)
-
-    # Capa Satelital (Esri World Imagery)
-    folium.TileLayer(
-        tiles='https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
-        attr='Esri World Imagery',
-        name='Satélite'
-    ).add_to(m)
+    # con capa satelital (Esri World Imagery)
+    m = mapa_satelital(lat_center, lon_center, 17, attr='Esri World Imagery', control_scale=True)
+    fl = folium()
 
     # 5. DIBUJAR POLÍGONO
     try:
@@ -69,7 +68,7 @@ if lote_actual:
                 'dashArray': '5, 5'    # Borde punteado
             }
 
-        folium.GeoJson(
+        fl.GeoJson(
             geojson_data,
             name=nombre,
             style_function=style_function,
@@ -77,16 +76,16 @@ if lote_actual:
         ).add_to(m)
         
         # Marcador con información
-        folium.Marker(
+        fl.Marker(
             [lat_center, lon_center],
             tooltip=f"{nombre}",
-            icon=folium.Icon(color=color, icon="info-sign"),
-            popup=folium.Popup(f"<b>{nombre}</b><br>Estado: {estado}", max_width=200)
+            icon=fl.Icon(color=color, icon="info-sign"),
+            popup=fl.Popup(f"<b>{nombre}</b><br>Estado: {estado}", max_width=200)
         ).add_to(m)
 
         # Centrar mapa en el polígono automáticamente
         # (Truco para que no tengas que adivinar coordenadas)
-        folium.FitBounds(m.get_bounds(), padding=(30, 30)).add_to(m)
+        fl.FitBounds(m.get_bounds(), padding=(30, 30)).add_to(m)
 
     except Exception as e:
         st.error(f"Error mostrando el mapa: {e}")
@@ -11,6 +11,10 @@ from utils import (
     check_login, cargar_fincas, cargar_personal, 
     cargar_labores, cargar_productos, smart_select, mostrar_encabezado
 )
+from perfilador import perfilar_pagina
+
+# Modo perfil (?perfil=1): vuelve a correr esta página dentro de cProfile
+perfilar_pagina(__file__)
 
 # 1. VERIFICACIÓN Y ENCABEZADO
 OWNER = check_login()
@@ -62,7 +66,7 @@ if "edit_mode_plan" in st.session_state:
                 prods = cargar_productos(OWNER)
                 idx_pr = prods.index(old_pr) if old_pr in prods else 0
                 n_pr = st.selectbox("Producto", prods, index=idx_pr)
-                n_ct = st.number_input("Cantidad", value=float(old_ct) if old_ct else 0.0)
+                n_ct = st.number_input("Cantidad", value=old_ct or 0.0)
 
             col_save, col_cancel = st.columns(2)
             if col_save.button("💾 Guardar Cambios", type="primary", use_container_width=True):
@@ -0,0 +1,176 @@
+import os
+import io
+import glob
+import time
+import runpy
+import pstats
+import cProfile
+import datetime
+import threading
+import contextlib
+
+import streamlit as st
+
+# ==========================================
+# 🔬 PERFIL POR RERUN (OPCIONAL)
+# ==========================================
+# Con ?perfil=1&admin=1 (solo admins, ver utils.es_admin; queda activo en la
+# sesión) o FINCA_PERFIL=1 en el servidor, cada página
+# vuelve a ejecutarse dentro de cProfile: perfilar_pagina(__file__) corre el
+# archivo con runpy y detiene la ejecución original. Al terminar se guarda
+# el .prof (abrir con snakeviz o pstats) y un .txt en FINCA_PERFIL_DIR, y se
+# muestran los puntos calientes al pie de la página. Por página se guardan
+# solo los últimos MAX_REPORTES. Sin el modo activo, perfilar_pagina y
+# seccion no hacen nada.
+#
+# Las consultas que corren en hilos de en_paralelo no entran en cProfile
+# (es por hilo): su tiempo aparece como espera en Future.result.
+
+DIRECTORIO = os.getenv("FINCA_PERFIL_DIR", ".perfiles")
+TOP_PUNTOS = 15
+MAX_REPORTES = int(os.getenv("FINCA_PERFIL_MAX", "20"))   # por página
+
+# Categorías por archivo de origen, para ver en qué se fue el rerun
+CATEGORIAS = (
+    ("BD", ("database.py", "psycopg2", "instrumentacion.py")),
+    ("pandas/numpy", ("pandas", "numpy")),
+    ("PDF", ("fpdf", "reportlab", "documentos.py", "boletas.py")),
+    ("Mapas/gráficos", ("folium", "streamlit_folium", "plotly", "renderizado.py")),
+    ("Streamlit", ("streamlit",)),
+)
+
+_local = threading.local()
+
+
+def activo():
+    """¿Está pedido el modo perfil en esta sesión? Por URL, solo para admins."""
+    from utils import es_admin   # utils importa este módulo
+    if os.getenv("FINCA_PERFIL") == "1":
+        return True
+    usuario = st.session_state.get("user")
+    if st.query_params.get("perfil") == "1" and usuario and es_admin(usuario):
+        st.session_state.perfil = usuario
+    elif st.query_params.get("perfil") == "0":
+        st.session_state.perfil = None
+    # Queda pegado al usuario que lo pidió: otro login en la sesión no lo hereda
+    return bool(usuario) and st.session_state.get("perfil") == usuario
+
+
+@contextlib.contextmanager
+def seccion(nombre):
+    """Cronómetro de un bloque de la página; solo anota si hay perfil en curso."""
+    tiempos = getattr(_local, "secciones", None)
+    if tiempos is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        tiempos[nombre] = tiempos.get(nombre, 0.0) + time.perf_counter() - t0
+
+
+def perfilar_pagina(archivo):
+    """
+    Llamar al inicio de cada página con __file__. Si el modo perfil está
+    activo, corre la página completa perfilada y corta la ejecución original.
+    """
+    if getattr(_local, "secciones", None) is not None or not activo():
+        return  # ya estamos dentro de la corrida perfilada, o modo apagado
+
+    pagina = os.path.splitext(os.path.basename(archivo))[0]
+    perfil = cProfile.Profile()
+    try:
+        perfil.enable()
+    except ValueError:
+        perfil = None  # otra sesión ya tiene el perfilador del proceso: solo secciones
+    _local.secciones = {}
+    t0 = time.perf_counter()
+    completa = False
+    try:
+        runpy.run_path(archivo, run_name="__main__")
+        completa = True
+    finally:
+        if perfil:
+            perfil.disable()
+        total = time.perf_counter() - t0
+        secciones, _local.secciones = _local.secciones, None
+        reporte = _guardar(pagina, perfil, total, secciones)
+    # st.rerun / st.stop / switch_page salen como excepción: ahí no se dibuja nada
+    if completa:
+        _mostrar(reporte)
+    st.stop()
+
+
+# --- Reporte ---
+
+def _categoria(archivo):
+    for nombre, patrones in CATEGORIAS:
+        if any(p in archivo for p in patrones):
+            return nombre
+    return "Página/otros"
+
+def _analizar(perfil):
+    """Puntos calientes (por tiempo propio) y tiempo propio sumado por categoría."""
+    stats = pstats.Stats(perfil)
+    filas, categorias = [], {}
+    for (archivo, linea, funcion), (_, llamadas, propio, acumulado, _) in stats.stats.items():
+        cat = _categoria(archivo)
+        categorias[cat] = categorias.get(cat, 0.0) + propio
+        filas.append({
+            "Función": funcion, "Origen": f"{os.path.basename(archivo)}:{linea}", "Categoría": cat,
+            "Llamadas": llamadas, "Propio (ms)": propio * 1000, "Acumulado (ms)": acumulado * 1000,
+        })
+    filas.sort(key=lambda f: f["Propio (ms)"], reverse=True)
+    return filas[:TOP_PUNTOS], {k: v * 1000 for k, v in sorted(categorias.items(), key=lambda kv: -kv[1])}
+
+def _guardar(pagina, perfil, total, secciones):
+    os.makedirs(DIRECTORIO, exist_ok=True)
+    base = os.path.join(DIRECTORIO, f"{pagina}-{datetime.datetime.now():%Y%m%d-%H%M%S-%f}")
+    puntos, categorias = _analizar(perfil) if perfil else ([], {})
+    reporte = {"pagina": pagina, "total_ms": total * 1000, "archivo": base,
+               "secciones": {k: v * 1000 for k, v in secciones.items()},
+               "categorias": categorias, "puntos": puntos}
+
+    texto = io.StringIO()
+    texto.write(f"{pagina}: {total * 1000:.0f} ms\n\nSecciones:\n")
+    for k, v in reporte["secciones"].items():
+        texto.write(f"  {k:<30} {v:>9.1f} ms\n")
+    if perfil:
+        perfil.dump_stats(base + ".prof")
+        texto.write("\nPor categoría (tiempo propio):\n")
+        for k, v in categorias.items():
+            texto.write(f"  {k:<30} {v:>9.1f} ms\n")
+        texto.write("\n")
+        pstats.Stats(perfil, stream=texto).sort_stats("cumulative").print_stats(40)
+    with open(base + ".txt", "w") as f:
+        f.write(texto.getvalue())
+    _podar(pagina)
+    return reporte
+
+def _podar(pagina):
+    """Borra los reportes de la página más viejos que los últimos MAX_REPORTES."""
+    bases = sorted({os.path.splitext(r)[0] for r in glob.glob(os.path.join(DIRECTORIO, f"{pagina}-[0-9]*"))})
+    for base in bases[:-MAX_REPORTES]:
+        for extension in (".prof", ".txt"):
+            with contextlib.suppress(OSError):
+                os.remove(base + extension)
+
+def _mostrar(reporte):
+    with st.expander(f"🔬 Perfil: {reporte['total_ms']:.0f} ms", expanded=False):
+        st.caption(f"Guardado en {reporte['archivo']}.txt")
+        if reporte["secciones"]:
+            st.markdown("**Secciones**")
+            st.dataframe([{"Sección": k, "ms": round(v, 1)} for k, v in reporte["secciones"].items()],
+                         hide_index=True, use_container_width=True)
+        if reporte["categorias"]:
+            st.markdown("**Por categoría**")
+            st.bar_chart({k: [v] for k, v in reporte["categorias"].items()}, stack=False)
+        if reporte["puntos"]:
+            st.markdown("**Puntos calientes**")
+            st.dataframe(reporte["puntos"], hide_index=True, use_container_width=True, column_config={
+                "Propio (ms)": st.column_config.NumberColumn(format="%.1f"),
+                "Acumulado (ms)": st.column_config.NumberColumn(format="%.1f"),
+            })
+        else:
+            st.caption("cProfile ocupado por otra sesión: solo hay tiempos por sección.")
@@ -0,0 +1,126 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from cache_backend import cache_compartido
+from database import fetch_frame, ttl_lecturas, MES_INICIO_TEMPORADA, temporada_de, rango_temporada
+
+# ==========================================
+# 📈 PROYECCIÓN DE COSECHA
+# ==========================================
+# La cosecha diaria de un lote sube, hace pico y baja: se modela como una
+# campana log(y) = a + b·t + c·t² sobre el día de temporada (t en años).
+# El ajuste es mínimos cuadrados ponderados, todos los lotes a la vez: las
+# sumas de la ecuación normal salen con bincount y los sistemas 3x3 se
+# resuelven apilados con np.linalg.solve. La forma sale de todas las
+# temporadas; la escala, de lo cosechado en la temporada actual.
+
+DIAS_TEMPORADA = 366
+TEMPORADAS_HISTORIA = 4
+MIN_DIAS_AJUSTE = 5       # menos días con cosecha: se usa la curva de toda la finca
+
+def _series_diarias(owner, desde):
+    """Serie diaria por lote (columnar): cajuelas y recolectores distintos por día."""
+    return fetch_frame("""
+        SELECT COALESCE(lote, 'Sin lote') AS lote, fecha, SUM(cajuelas) AS cajuelas,
+               COUNT(DISTINCT trabajador) AS recolectores
+        FROM recolecciones WHERE owner = %s AND fecha >= %s
+        GROUP BY 1, fecha
+    """, (owner, desde))
+
+def _dia_de_temporada(fechas):
+    """(temporada, día desde el 1 de octubre) para una serie de fechas."""
+    f = pd.to_datetime(fechas)
+    temporada = f.dt.year - (f.dt.month < MES_INICIO_TEMPORADA).astype(int)
+    inicio = pd.to_datetime(pd.DataFrame({"year": temporada, "month": MES_INICIO_TEMPORADA, "day": 1}))
+    return temporada.to_numpy(), (f - inicio).dt.days.to_numpy()
+
+def _ajustar_campanas(grupo, t, y, n_grupos):
+    """
+    Ajuste ponderado (peso = y) de log y = a + b·t + c·t² por grupo.
+    Retorna (coef[n_grupos, 3], válido[n_grupos]).
+    """
+    w, ly = y, np.log(y)
+    S = np.stack([np.bincount(grupo, w * t ** k, n_grupos) for k in range(5)], axis=1)
+    T = np.stack([np.bincount(grupo, w * ly * t ** k, n_grupos) for k in range(3)], axis=1)
+    M = np.stack([S[:, 0:3], S[:, 1:4], S[:, 2:5]], axis=1)       # (n, 3, 3)
+
+    n_dias = np.bincount(grupo, minlength=n_grupos)
+    valido = (n_dias >= MIN_DIAS_AJUSTE) & (np.abs(np.linalg.det(M)) > 1e-12)
+    coef = np.zeros((n_grupos, 3))
+    if valido.any():
+        coef[valido] = np.linalg.solve(M[valido], T[valido][..., None])[..., 0]
+    # Sin pico (c >= 0) la curva no sirve para proyectar
+    valido &= coef[:, 2] < 0
+    return coef, valido
+
+@cache_compartido(ttl=ttl_lecturas, tablas=("recolecciones",))
+def _modelo(owner, temporada_actual):
+    """Parámetros por lote + lo observado en la temporada actual. Se invalida con cada cambio en recolecciones."""
+    desde = rango_temporada(temporada_actual - TEMPORADAS_HISTORIA)[0]
+    df = _series_diarias(owner, desde)
+    df = df[df["cajuelas"] > 0]
+    if df.empty:
+        return pd.DataFrame()
+
+    temporada, dia = _dia_de_temporada(df["fecha"])
+    lotes, grupo = np.unique(df["lote"].to_numpy(), return_inverse=True)
+    y = df["cajuelas"].to_numpy(dtype=float)
+    t = dia / 365.0
+
+    coef, valido = _ajustar_campanas(grupo, t, y, len(lotes))
+    # Curva de toda la finca para los lotes con pocos datos
+    coef_finca, finca_ok = _ajustar_campanas(np.zeros(len(y), dtype=int), t, y, 1)
+    if finca_ok[0]:
+        coef[~valido] = coef_finca[0]
+        valido[:] = True
+
+    actual = temporada == temporada_actual
+    recolectores = df["recolectores"].to_numpy(dtype=float)
+    return pd.DataFrame({
+        "lote": lotes, "a": coef[:, 0], "b": coef[:, 1], "c": coef[:, 2], "valido": valido,
+        # Cajuelas por recolector-día, con todo el historial del lote
+        "productividad": np.bincount(grupo, y, len(lotes)) / np.maximum(np.bincount(grupo, recolectores, len(lotes)), 1),
+        "obs_temporada": np.bincount(grupo[actual], y[actual], len(lotes)),
+    })
+
+def proyectar_temporada(owner, hoy=None, dias_cuadrilla=7):
+    """
+    Por lote: cosechado, proyección total, cajuelas que faltan, recolector-días
+    que faltan y recolectores sugeridos para los próximos `dias_cuadrilla` días.
+    """
+    hoy = hoy or datetime.date.today()
+    temporada = temporada_de(hoy)
+    p = _modelo(owner, temporada)
+    if p.empty:
+        return pd.DataFrame()
+    p = p[p["valido"]]
+
+    # Curvas de todos los lotes en una matriz (lotes x días de temporada)
+    inicio = rango_temporada(temporada)[0]
+    hoy_d = min((hoy - inicio).days, DIAS_TEMPORADA - 1)
+    dias = np.arange(DIAS_TEMPORADA)
+    t = dias / 365.0
+    a, b, c = (p[k].to_numpy()[:, None] for k in "abc")
+    curva = np.exp(a + b * t + c * t ** 2)
+
+    hasta_hoy = curva[:, :hoy_d + 1].sum(axis=1)
+    resto = curva[:, hoy_d + 1:]
+    # Escala: lo cosechado este año contra lo que la curva esperaba a la fecha
+    obs = p["obs_temporada"].to_numpy()
+    escala = np.where((obs > 0) & (hasta_hoy > 0), obs / np.where(hasta_hoy > 0, hasta_hoy, 1), 1.0)
+    faltan = escala * resto.sum(axis=1)
+    proximos = escala * resto[:, :dias_cuadrilla].mean(axis=1) if resto.shape[1] else np.zeros(len(p))
+    prod = p["productividad"].to_numpy()
+    pico = np.clip(-b[:, 0] / (2 * c[:, 0]) * 365, 0, DIAS_TEMPORADA - 1).round()
+
+    return pd.DataFrame({
+        "Lote": p["lote"].to_numpy(),
+        "Cosechado": obs,
+        "Proyección Total": obs + faltan,
+        "Faltan (caj)": faltan,
+        "Recolector-días": faltan / prod,
+        "Recolectores/día (próx.)": np.ceil(proximos / prod),
+        "Pico": [inicio + datetime.timedelta(days=int(d)) for d in pico],
+    }).sort_values("Faltan (caj)", ascending=False, ignore_index=True)
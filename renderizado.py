@@ -0,0 +1,50 @@
+import importlib
+import functools
+
+from perfilador import seccion
+
+# ==========================================
+# 🎨 SERVICIO DE RENDERIZADO (CARGA PEREZOSA)
+# ==========================================
+# plotly, folium y los motores PDF (ver documentos.py) tardan en importarse.
+# Las páginas no los importan arriba: piden lo que necesitan aquí y el módulo
+# se carga la primera vez que alguien realmente dibuja un gráfico, mapa o PDF.
+
+@functools.lru_cache(maxsize=None)
+def cargar_modulo(nombre):
+    """import perezoso: la primera llamada importa, las siguientes salen de caché."""
+    return importlib.import_module(nombre)
+
+def plotly_express():
+    return cargar_modulo("plotly.express")
+
+def folium():
+    return cargar_modulo("folium")
+
+def st_folium(mapa, **kwargs):
+    with seccion("mapa (st_folium)"):
+        return cargar_modulo("streamlit_folium").st_folium(mapa, **kwargs)
+
+
+# --- GRÁFICOS ---
+
+def grafico_pastel(df, valores, nombres, titulo, hueco=0.4):
+    fig = plotly_express().pie(df, values=valores, names=nombres, hole=hueco, title=titulo)
+    fig.update_layout(margin=dict(t=30, b=0, l=0, r=0))
+    return fig
+
+
+# --- MAPAS ---
+
+ESRI_SATELITE = 'https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}'
+
+def mapa_satelital(lat, lon, zoom, attr='Esri', **kwargs):
+    """folium.Map con la capa satelital de Esri ya agregada."""
+    fl = folium()
+    m = fl.Map(location=[lat, lon], zoom_start=zoom, **kwargs)
+    fl.TileLayer(tiles=ESRI_SATELITE, attr=attr, name='Satélite').add_to(m)
+    return m
+
+def herramienta_dibujo(**kwargs):
+    return cargar_modulo("folium.plugins").Draw(**kwargs)
+
@@ -0,0 +1,176 @@
+import json
+import math
+import datetime
+
+import pandas as pd
+
+from cache_backend import cache_compartido
+from database import (
+    get_db_cursor, fetch_frame, get_fincas_full_data,
+    ttl_lecturas, MES_INICIO_TEMPORADA, temporada_de, rango_temporada
+)
+
+# ==========================================
+# 💹 RENTABILIDAD POR LOTE Y TEMPORADA
+# ==========================================
+# Una sola consulta junta cosecha, jornales (con horas extra), insumos y
+# volumen por lote y temporada, y calcula costo por cajuela, por hectárea y
+# margen. Las temporadas cerradas casi no cambian: van a la caché compartida
+# sin vencimiento, invalidadas por las tablas que leen (una corrección tardía
+# o un cambio de tarifas o áreas las borra en todas las réplicas) y, si
+# existe y está al día, se leen del acumulado diario: una corrección tardía
+# deja su día en resumen_diario_sucio (trigger) y la temporada vuelve a las
+# tablas crudas hasta el próximo `archivar.py resumen`. Solo la temporada en
+# curso se recalcula.
+
+_TEMPORADA_SQL = f"EXTRACT(YEAR FROM fecha - INTERVAL '{MES_INICIO_TEMPORADA - 1} months')::int"
+
+_MOVIMIENTOS = {
+    "crudo": """
+        SELECT lote, fecha, cajuelas, total_pagar AS costo_cosecha, 0 AS dias, 0 AS horas_extra, 0 AS costo_insumos
+        FROM recolecciones WHERE owner = %(o)s AND fecha >= %(i)s AND fecha < %(f)s
+        UNION ALL
+        SELECT lote, fecha, 0, 0, dias, horas_extra, 0
+        FROM jornadas WHERE owner = %(o)s AND fecha >= %(i)s AND fecha < %(f)s
+        UNION ALL
+        SELECT lote, fecha, 0, 0, 0, 0, costo_total
+        FROM insumos WHERE owner = %(o)s AND fecha >= %(i)s AND fecha < %(f)s
+    """,
+    "resumen": """
+        SELECT lote, fecha, cajuelas, costo_cosecha, dias, horas_extra, costo_insumos
+        FROM resumen_diario_lote WHERE owner = %(o)s AND fecha >= %(i)s AND fecha < %(f)s
+    """,
+}
+
+_SQL_RENTABILIDAD = """
+    WITH t AS (
+        SELECT COALESCE(MAX(pago_dia), 0) AS dia, COALESCE(MAX(pago_hora_extra), 0) AS extra,
+               COALESCE(MAX(precio_venta_cajuela), 0) AS venta
+        FROM tarifas WHERE owner = %(o)s
+    ), m AS ({movimientos}
+    ), g AS (
+        SELECT COALESCE(lote, 'Sin lote') AS lote, {temporada} AS temporada,
+               SUM(cajuelas) AS cajuelas, SUM(costo_cosecha) AS costo_cosecha,
+               SUM(dias) AS dias, SUM(horas_extra) AS horas_extra, SUM(costo_insumos) AS costo_insumos
+        FROM m GROUP BY 1, 2
+    ), c AS (
+        SELECT g.*, f.hectareas, g.cajuelas * t.venta AS ingreso,
+               g.dias * t.dia + g.horas_extra * t.extra AS costo_mano_obra,
+               g.costo_cosecha + g.dias * t.dia + g.horas_extra * t.extra + g.costo_insumos AS costo_total
+        FROM g CROSS JOIN t
+        LEFT JOIN fincas f ON f.owner = %(o)s AND f.nombre = g.lote
+    )
+    SELECT lote AS "Lote", temporada AS "Temporada", cajuelas AS "Cajuelas", hectareas AS "Hectáreas",
+           costo_cosecha AS "Cosecha", costo_mano_obra AS "Mano Obra", costo_insumos AS "Insumos",
+           costo_total AS "Costo Total", ingreso AS "Ingreso", ingreso - costo_total AS "Margen",
+           costo_total / NULLIF(cajuelas, 0) AS "Costo/Cajuela",
+           costo_total / NULLIF(hectareas, 0) AS "Costo/Ha",
+           (ingreso - costo_total) / NULLIF(hectareas, 0) AS "Margen/Ha"
+    FROM c ORDER BY temporada, lote
+"""
+
+def _consultar(owner, ini, fin, fuente="crudo"):
+    sql = _SQL_RENTABILIDAD.format(movimientos=_MOVIMIENTOS[fuente], temporada=_TEMPORADA_SQL)
+    return fetch_frame(sql, {"o": owner, "i": ini, "f": fin})
+
+def _hay_resumen(owner, ini, fin):
+    """¿Hay acumulado del rango y ningún día cambió después de armarlo?"""
+    with get_db_cursor() as (cur, _):
+        cur.execute("""SELECT EXISTS (SELECT 1 FROM resumen_diario_lote WHERE owner=%(o)s AND fecha >= %(i)s AND fecha < %(f)s)
+                          AND NOT EXISTS (SELECT 1 FROM resumen_diario_sucio WHERE owner=%(o)s AND fecha >= %(i)s AND fecha < %(f)s)""",
+                    {"o": owner, "i": ini, "f": fin})
+        return cur.fetchone()[0]
+
+@cache_compartido(tablas=("recolecciones", "jornadas", "insumos", "tarifas", "fincas"))
+def _temporada_cerrada(owner, temporada):
+    ini, fin = rango_temporada(temporada)
+    return _consultar(owner, ini, fin, "resumen" if _hay_resumen(owner, ini, fin) else "crudo")
+
+@cache_compartido(ttl=ttl_lecturas, tablas=("recolecciones", "jornadas", "insumos", "tarifas", "fincas"))
+def _temporada_en_curso(owner, temporada):
+    return _consultar(owner, *rango_temporada(temporada))
+
+
+# --- Áreas ---
+
+def area_poligono_ha(geojson_str):
+    """Área aproximada (ha) de un polígono GeoJSON; proyección local, basta para lotes."""
+    try:
+        geo = json.loads(geojson_str)
+        anillo = geo["coordinates"][0]
+    except (TypeError, ValueError, KeyError, IndexError):
+        return None
+    if len(anillo) < 3:
+        return None
+    lat0 = math.radians(sum(p[1] for p in anillo) / len(anillo))
+    pts = [(lon * 111_320 * math.cos(lat0), lat * 110_540) for lon, lat in anillo]
+    m2 = abs(sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(pts, pts[1:] + pts[:1]))) / 2
+    return m2 / 10_000
+
+def _completar_hectareas(df, owner):
+    """Lotes sin hectáreas cargadas: se usa el área del polígono dibujado."""
+    faltan = df["Hectáreas"].isna()
+    if not faltan.any():
+        return df
+    areas = {nombre: area_poligono_ha(geo) for nombre, _, _, geo in get_fincas_full_data(owner) if geo}
+    df.loc[faltan, "Hectáreas"] = df.loc[faltan, "Lote"].map(areas)
+    ha = df.loc[faltan, "Hectáreas"].where(df.loc[faltan, "Hectáreas"] > 0)
+    df.loc[faltan, "Costo/Ha"] = df.loc[faltan, "Costo Total"] / ha
+    df.loc[faltan, "Margen/Ha"] = df.loc[faltan, "Margen"] / ha
+    return df
+
+
+# --- API ---
+
+def temporadas_disponibles(owner):
+    """Temporadas desde la primera cosecha registrada hasta la actual (la más reciente primero)."""
+    actual = temporada_de(datetime.date.today())
+    with get_db_cursor() as (cur, _):
+        cur.execute("SELECT MIN(fecha) FROM recolecciones WHERE owner=%s", (owner,))
+        primera = cur.fetchone()[0]
+    desde = temporada_de(primera) if primera else actual
+    return list(range(actual, desde - 1, -1))
+
+def rentabilidad_por_lote(owner, temporadas):
+    """DataFrame con costos, ingreso, margen y costos unitarios por lote y temporada."""
+    actual = temporada_de(datetime.date.today())
+    partes = [_temporada_cerrada(owner, t) if t < actual else _temporada_en_curso(owner, t)
+              for t in sorted(set(temporadas)) if t <= actual]
+    partes = [p for p in partes if not p.empty]
+    if not partes:
+        return pd.DataFrame()
+    return _completar_hectareas(pd.concat(partes, ignore_index=True), owner)
+
+
+# --- Acumulado diario ---
+
+def refrescar_resumen_diario(desde, hasta, owner=None):
+    """
+    Recalcula resumen_diario_lote para [desde, hasta) desde las tablas crudas.
+    Pensado para temporadas cerradas (ver `python archivar.py resumen`).
+    Retorna cuántas filas quedaron.
+    """
+    filtro_owner = "AND owner = %(o)s" if owner else ""
+    params = {"o": owner, "i": desde, "f": hasta}
+    with get_db_cursor(clase="masiva") as (cur, conn):
+        cur.execute(f"DELETE FROM resumen_diario_lote WHERE fecha >= %(i)s AND fecha < %(f)s {filtro_owner}", params)
+        cur.execute(f"DELETE FROM resumen_diario_sucio WHERE fecha >= %(i)s AND fecha < %(f)s {filtro_owner}", params)
+        cur.execute(f"""
+            INSERT INTO resumen_diario_lote (owner, lote, fecha, cajuelas, costo_cosecha, dias, horas_extra, costo_insumos)
+            SELECT owner, COALESCE(lote, 'Sin lote'), fecha, SUM(cajuelas), SUM(costo_cosecha),
+                   SUM(dias), SUM(horas_extra), SUM(costo_insumos)
+            FROM (
+                SELECT owner, lote, fecha, cajuelas, total_pagar AS costo_cosecha, 0 AS dias, 0 AS horas_extra, 0 AS costo_insumos
+                FROM recolecciones WHERE fecha >= %(i)s AND fecha < %(f)s {filtro_owner}
+                UNION ALL
+                SELECT owner, lote, fecha, 0, 0, dias, horas_extra, 0
+                FROM jornadas WHERE fecha >= %(i)s AND fecha < %(f)s {filtro_owner}
+                UNION ALL
+                SELECT owner, lote, fecha, 0, 0, 0, 0, costo_total
+                FROM insumos WHERE fecha >= %(i)s AND fecha < %(f)s {filtro_owner}
+            ) m
+            GROUP BY owner, COALESCE(lote, 'Sin lote'), fecha
+        """, params)
+        filas = cur.rowcount
+        conn.commit()
+    return filas
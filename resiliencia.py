@@ -0,0 +1,191 @@
+import os
+import time
+import uuid
+import random
+import logging
+import threading
+import functools
+import contextlib
+
+import psycopg2
+import psycopg2.errors
+from psycopg2 import pool
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# 🛟 RESILIENCIA DEL ACCESO A LA BD
+# ==========================================
+# Tres piezas que usa database.get_db_cursor:
+#   * statement_timeout por clase de operación (get_db_cursor(clase=...)):
+#     una consulta de reporte desbocada no retiene una conexión del pool
+#     mientras el registro rápido espera.
+#   * reintentar: reintento con backoff y jitter para fallas pasajeras (SSL
+#     caído, reinicio del servidor, pool lleno, serialización). Solo para
+#     lecturas y escrituras con llave de idempotencia.
+#   * INTERRUPTOR: tras varias caídas seguidas deja de intentar por un rato
+#     (BDNoDisponible al instante, sin esperar connect_timeout) y deja pasar
+#     una prueba cuando se enfría. Las escrituras de captura marcadas con
+#     encolar_si_caida van entonces a la cola local (cola_local).
+
+# Clase -> statement_timeout (ms). 0 = sin límite.
+TIMEOUTS_MS = {
+    "interactiva": int(os.getenv("FINCA_TIMEOUT_INTERACTIVA_MS", "5000")),
+    "reporte": int(os.getenv("FINCA_TIMEOUT_REPORTE_MS", "30000")),
+    "masiva": int(os.getenv("FINCA_TIMEOUT_MASIVA_MS", "300000")),
+}
+INTENTOS = 3
+ESPERA_BASE_S = 0.2
+ESPERA_TOPE_S = 2.0
+FALLOS_PARA_ABRIR = 5
+ENFRIAMIENTO_S = 30
+
+
+class BDNoDisponible(Exception):
+    """El interruptor está abierto: la BD se cayó hace poco y no se intentó nada."""
+
+# Lo que retorna una escritura de encolar_si_caida que quedó en la cola local:
+# la página no debe seguir con pasos que necesitan la BD (ni pedir que se repita)
+ENCOLADA = "encolada"
+
+
+def timeout_ms(clase):
+    if clase not in TIMEOUTS_MS:
+        raise ValueError(f"Clase de operación desconocida: {clase}")
+    return TIMEOUTS_MS[clase]
+
+
+# SQLSTATE de OperationalError que sí son caídas: conexión (08...) y servidor apagándose
+_CODIGOS_CAIDA = ("08", "57P01", "57P02", "57P03")
+
+def es_caida(exc):
+    """
+    ¿La conexión o el servidor fallaron? Un statement_timeout, un conflicto
+    de serialización o un deadlock no cuentan: la BD respondió (psycopg2 los
+    hereda de OperationalError, igual que los errores de red, que no traen
+    SQLSTATE).
+    """
+    if isinstance(exc, (psycopg2.errors.QueryCanceled, psycopg2.extensions.TransactionRollbackError)):
+        return False
+    if isinstance(exc, psycopg2.InterfaceError):
+        return True
+    if not isinstance(exc, psycopg2.OperationalError):
+        return False
+    return exc.pgcode is None or exc.pgcode.startswith(_CODIGOS_CAIDA)
+
+def es_transitorio(exc):
+    """¿Vale la pena repetir? Caídas, pool lleno, conflictos de serialización o deadlock."""
+    return es_caida(exc) or isinstance(exc, (
+        pool.PoolError, psycopg2.errors.SerializationFailure, psycopg2.errors.DeadlockDetected))
+
+
+# --- Interruptor (circuit breaker) ---
+
+class Interruptor:
+    """cerrado -> (N caídas seguidas) abierto -> (enfriamiento) semiabierto: una prueba a la vez."""
+
+    def __init__(self, fallos_para_abrir=FALLOS_PARA_ABRIR, enfriamiento=ENFRIAMIENTO_S):
+        self.fallos_para_abrir, self.enfriamiento = fallos_para_abrir, enfriamiento
+        self._lock = threading.Lock()
+        self.estado = "cerrado"
+        self.fallos = 0
+        self.abierto_desde = 0.0
+        self.aperturas = 0
+        self._probando = False
+
+    def permitir(self):
+        """Lanza BDNoDisponible si hay que fallar rápido."""
+        with self._lock:
+            if self.estado == "cerrado":
+                return
+            restante = self.abierto_desde + self.enfriamiento - time.time()
+            if restante > 0 or self._probando:
+                raise BDNoDisponible(f"La base de datos no responde. Reintente en {max(restante, 1):.0f} s.")
+            # Enfriado: pasa esta como prueba
+            self.estado = "semiabierto"
+            self._probando = True
+
+    def exito(self):
+        with self._lock:
+            if self.estado != "cerrado":
+                logger.info("BD disponible otra vez: interruptor cerrado")
+            self.estado, self.fallos, self._probando = "cerrado", 0, False
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            self._probando = False
+            if self.estado == "semiabierto" or self.fallos >= self.fallos_para_abrir:
+                if self.estado != "abierto":
+                    self.aperturas += 1
+                    logger.error("BD caída (%d fallos seguidos): interruptor abierto %d s",
+                                 self.fallos, self.enfriamiento)
+                self.estado = "abierto"
+                self.abierto_desde = time.time()
+
+    def resumen(self):
+        with self._lock:
+            return {"estado": self.estado, "fallos": self.fallos, "aperturas": self.aperturas}
+
+# Uno por proceso: lo comparten todas las sesiones
+INTERRUPTOR = Interruptor()
+
+
+# --- Reintentos ---
+
+def reintentar(intentos=INTENTOS, base=ESPERA_BASE_S, tope=ESPERA_TOPE_S):
+    """
+    Repite la función ante fallas pasajeras con backoff exponencial y jitter
+    completo. Solo para operaciones idempotentes: lecturas, o escrituras que
+    el servidor descarta si se repiten (llave de idempotencia).
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            for intento in range(intentos):
+                try:
+                    return funcion(*args, **kwargs)
+                except Exception as e:
+                    if intento == intentos - 1 or not es_transitorio(e):
+                        raise
+                    espera = random.uniform(0, min(tope, base * 2 ** intento))
+                    logger.warning("%s falló (%s), reintento %d en %.2f s",
+                                   funcion.__name__, type(e).__name__, intento + 1, espera)
+                    time.sleep(espera)
+        return envoltura
+    return decorador
+
+
+# --- Escrituras a la cola local ---
+
+_reenvio = threading.local()
+
+@contextlib.contextmanager
+def reenviando():
+    """Al vaciar la cola local: si la BD sigue caída, que falle en vez de volver a encolar."""
+    _reenvio.activo = True
+    try:
+        yield
+    finally:
+        _reenvio.activo = False
+
+def encolar_si_caida(funcion):
+    """
+    Escrituras de captura (jornadas, insumos, vales...): si el interruptor
+    está abierto no se mandó nada a la BD, así que se guardan en la cola
+    local y se reenvían cuando vuelva. La función tiene que aceptar
+    `clave_idem`: se fija al encolar, y si un reenvío se corta después del
+    COMMIT, el siguiente no duplica la fila (ON CONFLICT DO NOTHING).
+    """
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        try:
+            return funcion(*args, **kwargs)
+        except BDNoDisponible:
+            if getattr(_reenvio, "activo", False):
+                raise
+            from cola_local import encolar_escritura   # cola_local importa database
+            encolar_escritura(funcion.__name__, args, {**kwargs, "clave_idem": uuid.uuid4().hex})
+            logger.warning("%s quedó en la cola local (BD no disponible)", funcion.__name__)
+            return ENCOLADA
+    return envoltura
@@ -0,0 +1,137 @@
+from database import get_db_cursor, fetch_frame
+
+# ==========================================
+# 🧪 SUELOS: ÚLTIMO ANÁLISIS, HISTORIAL Y RECOMENDACIONES
+# ==========================================
+# Todo se apoya en el índice (owner, lote, fecha DESC) de analisis_suelo:
+# el último análisis por lote sale con DISTINCT ON, el historial se pagina y
+# las tendencias se calculan en SQL con funciones de ventana. La
+# recomendación de abonado se precalcula (tabla recomendaciones_suelo) cada
+# vez que entra un análisis o un insumo del lote, no en cada render. Como
+# "abono reciente" depende de la fecha, al leerlas se rehacen las que tienen
+# más de HORAS_VIGENCIA (y la primera vez, si el dueño aún no tiene ninguna).
+# Para llenar la tabla de una vez: python archivar.py recomendaciones
+
+# Umbrales de referencia para café (ajustar a las unidades del laboratorio)
+UMBRALES = {"ph_min": 5.0, "n_min": 0.2, "p_min": 10.0, "k_min": 0.2}
+DIAS_INSUMOS = 365          # ventana de insumos que se mira para recomendar
+DIAS_ABONO_RECIENTE = 90
+HORAS_VIGENCIA = 24
+LARGO_NOTAS = 100           # en listas solo se muestra el inicio de las notas
+
+def ultimo_por_lote(owner):
+    """Análisis más reciente de cada lote."""
+    return fetch_frame(f"""
+        SELECT DISTINCT ON (lote) lote AS "Lote", fecha AS "Fecha", ph AS "pH", nitrogeno AS "N",
+               fosforo AS "P", potasio AS "K", LEFT(notas, {LARGO_NOTAS}) AS "Notas"
+        FROM analisis_suelo WHERE owner = %s
+        ORDER BY lote, fecha DESC
+    """, (owner,))
+
+def historial(owner, pagina=0, por_pagina=20, lote=None):
+    """Una página del historial (más reciente primero). Retorna (DataFrame, total de filas)."""
+    filtro = "AND lote = %(l)s" if lote else ""
+    df = fetch_frame(f"""
+        SELECT id AS "ID", fecha AS "Fecha", lote AS "Lote", ph AS "pH", nitrogeno AS "N",
+               fosforo AS "P", potasio AS "K", LEFT(notas, {LARGO_NOTAS}) AS "Notas",
+               COUNT(*) OVER () AS total
+        FROM analisis_suelo WHERE owner = %(o)s {filtro}
+        ORDER BY fecha DESC, id DESC
+        LIMIT %(n)s OFFSET %(desde)s
+    """, {"o": owner, "l": lote, "n": por_pagina, "desde": pagina * por_pagina})
+    total = int(df["total"].iloc[0]) if not df.empty else 0
+    return df.drop(columns="total"), total
+
+def get_notas_analisis(analisis_id, owner):
+    """Notas completas de un análisis (en las listas van recortadas)."""
+    with get_db_cursor() as (cur, _):
+        cur.execute("SELECT notas FROM analisis_suelo WHERE id=%s AND owner=%s", (analisis_id, owner))
+        res = cur.fetchone()
+        return res[0] if res else None
+
+def tendencias(owner, lote):
+    """
+    Serie de pH/N/P/K del lote con cambio contra el análisis anterior, media
+    móvil de 3 y pendiente por año (regresión sobre todo el historial).
+    """
+    nutrientes = [("ph", "pH"), ("nitrogeno", "N"), ("fosforo", "P"), ("potasio", "K")]
+    columnas = ",\n".join(
+        f"""{c} AS "{n}", {c} - LAG({c}) OVER w AS "Δ {n}",
+            AVG({c}) OVER (w ROWS BETWEEN 2 PRECEDING AND CURRENT ROW) AS "{n} media",
+            regr_slope({c}, EXTRACT(EPOCH FROM fecha::timestamp) / 31557600) OVER () AS "{n}/año\""""
+        for c, n in nutrientes)
+    return fetch_frame(f"""
+        SELECT fecha AS "Fecha", {columnas}
+        FROM analisis_suelo WHERE owner = %s AND lote = %s
+        WINDOW w AS (ORDER BY fecha, id)
+        ORDER BY fecha, id
+    """, (owner, lote))
+
+
+# --- Recomendaciones precalculadas ---
+
+def recalcular_recomendaciones(owner, lote=None):
+    """
+    Recalcula (upsert) la recomendación de un lote, o de todos si lote=None
+    (de todos los dueños si además owner=None): último análisis + insumos
+    recientes del lote, en una sola sentencia. Retorna cuántas quedaron.
+    """
+    condiciones = (["owner = %(o)s"] if owner else []) + (["lote = %(l)s"] if lote else [])
+    filtro = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    params = {"o": owner, "l": lote, "dias": DIAS_INSUMOS, "dias_abono": DIAS_ABONO_RECIENTE, **UMBRALES}
+    with get_db_cursor() as (cur, conn):
+        cur.execute(f"""
+            INSERT INTO recomendaciones_suelo (owner, lote, fecha_analisis, ph, nitrogeno, fosforo, potasio,
+                                               ultimo_abono, ultima_cal, abono_reciente, recomendacion, actualizado)
+            SELECT a.owner, a.lote, a.fecha, a.ph, a.nitrogeno, a.fosforo, a.potasio,
+                   i.ultimo_abono, i.ultima_cal, COALESCE(i.abono_reciente, 0),
+                   COALESCE(NULLIF(concat_ws('; ',
+                       CASE WHEN a.ph < %(ph_min)s AND (i.ultima_cal IS NULL OR i.ultima_cal < a.fecha)
+                            THEN 'Encalar: pH bajo y sin cal desde el análisis' END,
+                       CASE WHEN a.nitrogeno < %(n_min)s AND COALESCE(i.abono_reciente, 0) = 0
+                            THEN 'Abonar con nitrógeno (sin abono reciente)' END,
+                       CASE WHEN a.fosforo < %(p_min)s THEN 'Reforzar fósforo en el próximo abono' END,
+                       CASE WHEN a.potasio < %(k_min)s THEN 'Reforzar potasio en el próximo abono' END
+                   ), ''), 'Sin acciones pendientes'),
+                   NOW()
+            FROM (
+                SELECT DISTINCT ON (owner, lote) owner, lote, fecha, ph, nitrogeno, fosforo, potasio
+                FROM analisis_suelo {filtro}
+                ORDER BY owner, lote, fecha DESC
+            ) a
+            LEFT JOIN LATERAL (
+                SELECT MAX(fecha) FILTER (WHERE tipo = 'Abono') AS ultimo_abono,
+                       MAX(fecha) FILTER (WHERE tipo = 'Cal') AS ultima_cal,
+                       SUM(cantidad) FILTER (WHERE tipo = 'Abono' AND fecha >= CURRENT_DATE - %(dias_abono)s) AS abono_reciente
+                FROM insumos
+                WHERE owner = a.owner AND lote = a.lote AND fecha >= CURRENT_DATE - %(dias)s
+            ) i ON TRUE
+            ON CONFLICT (owner, lote) DO UPDATE SET
+                fecha_analisis = EXCLUDED.fecha_analisis, ph = EXCLUDED.ph, nitrogeno = EXCLUDED.nitrogeno,
+                fosforo = EXCLUDED.fosforo, potasio = EXCLUDED.potasio, ultimo_abono = EXCLUDED.ultimo_abono,
+                ultima_cal = EXCLUDED.ultima_cal, abono_reciente = EXCLUDED.abono_reciente,
+                recomendacion = EXCLUDED.recomendacion, actualizado = EXCLUDED.actualizado
+        """, params)
+        filas = cur.rowcount
+        conn.commit()
+    return filas
+
+def _hay_vencidas(owner):
+    """¿Alguna recomendación pasó HORAS_VIGENCIA, o hay análisis y todavía ninguna recomendación?"""
+    with get_db_cursor() as (cur, _):
+        cur.execute("""
+            SELECT EXISTS (SELECT 1 FROM recomendaciones_suelo
+                           WHERE owner = %(o)s AND actualizado < NOW() - make_interval(hours => %(h)s))
+                OR (NOT EXISTS (SELECT 1 FROM recomendaciones_suelo WHERE owner = %(o)s)
+                    AND EXISTS (SELECT 1 FROM analisis_suelo WHERE owner = %(o)s))
+        """, {"o": owner, "h": HORAS_VIGENCIA})
+        return cur.fetchone()[0]
+
+def get_recomendaciones(owner):
+    if _hay_vencidas(owner):
+        recalcular_recomendaciones(owner)
+    return fetch_frame("""
+        SELECT lote AS "Lote", fecha_analisis AS "Análisis", ph AS "pH", ultimo_abono AS "Último Abono",
+               ultima_cal AS "Última Cal", recomendacion AS "Recomendación"
+        FROM recomendaciones_suelo WHERE owner = %s ORDER BY lote
+    """, (owner,))
@@ -0,0 +1,122 @@
+import pytest
+
+import cache_backend
+from cache_backend import (
+    CacheMemoria, CacheSQLite, cache_compartido, invalidar, invalidar_owner, invalida_tablas, sin_cache,
+)
+
+
+@pytest.fixture(params=["memoria", "sqlite"])
+def backend(request, tmp_path, monkeypatch):
+    """Un backend nuevo por prueba; cache_compartido lo toma de get_backend."""
+    if request.param == "memoria":
+        b = CacheMemoria(max_bytes=1024)
+    else:
+        b = CacheSQLite(ruta=str(tmp_path / "cache.sqlite3"), max_bytes=1024)
+    monkeypatch.setattr(cache_backend, "get_backend", lambda: b)
+    return b
+
+
+# --- Invalidación por versión ---
+
+def _contador(tablas):
+    llamadas = []
+
+    @cache_compartido(tablas=tablas)
+    def lectura(owner, x=0):
+        llamadas.append((owner, x))
+        return [owner, x, len(llamadas)]
+    return lectura, llamadas
+
+def test_acierto_devuelve_copia(backend):
+    lectura, llamadas = _contador(("jornadas",))
+    primero = lectura("finca", 1)
+    primero.append("tocado")
+    assert lectura("finca", 1) == ["finca", 1, 1]
+    assert len(llamadas) == 1
+
+def test_invalidar_solo_afecta_la_tabla_declarada(backend):
+    lectura, llamadas = _contador(("jornadas",))
+    lectura("finca")
+    invalidar("finca", "insumos")
+    lectura("finca")
+    assert len(llamadas) == 1
+    invalidar("finca", "jornadas")
+    lectura("finca")
+    assert len(llamadas) == 2
+
+def test_invalidar_no_afecta_a_otro_dueno(backend):
+    lectura, llamadas = _contador(("jornadas",))
+    lectura("finca")
+    lectura("vecina")
+    invalidar("vecina", "jornadas")
+    lectura("finca")
+    assert llamadas == [("finca", 0), ("vecina", 0)]
+
+def test_sin_tablas_declaradas_cualquier_cambio_invalida(backend):
+    lectura, llamadas = _contador(None)
+    lectura("finca")
+    invalidar("finca", "vales")
+    lectura("finca")
+    assert len(llamadas) == 2
+
+def test_invalidar_owner_invalida_todo_el_dueno(backend):
+    lectura, llamadas = _contador(("jornadas",))
+    lectura("finca")
+    invalidar_owner("finca")
+    lectura("finca")
+    assert len(llamadas) == 2
+
+def test_invalida_tablas_tras_escribir(backend):
+    lectura, llamadas = _contador(("vales",))
+
+    @invalida_tablas("vales")
+    def add_vale(monto, owner):
+        return monto
+
+    lectura("finca")
+    add_vale(100, owner="finca")
+    lectura("finca")
+    assert len(llamadas) == 2
+
+def test_sin_cache_va_siempre_a_la_funcion(backend):
+    lectura, llamadas = _contador(("jornadas",))
+    with sin_cache():
+        lectura("finca")
+        lectura("finca")
+    assert len(llamadas) == 2
+    assert backend.tamano()["entradas"] == 0
+
+
+# --- Desalojo LRU ---
+
+def test_lru_desaloja_lo_menos_usado(backend):
+    for clave in "abc":
+        backend.guardar(clave, "finca", b"x" * 400)
+    # 1200 bytes > 1024: se fue "a", la más vieja
+    assert backend.leer("a") is None
+    assert backend.leer("b") is not None and backend.leer("c") is not None
+    assert backend.tamano()["bytes"] <= 1024
+
+def test_lru_lectura_renueva_la_entrada(backend, monkeypatch):
+    reloj = iter(range(1000, 2000))
+    monkeypatch.setattr(cache_backend.time, "time", lambda: next(reloj))
+    backend.guardar("a", "finca", b"x" * 400)
+    backend.guardar("b", "finca", b"x" * 400)
+    backend.leer("a")
+    backend.guardar("c", "finca", b"x" * 400)
+    assert backend.leer("b") is None
+    assert backend.leer("a") is not None
+
+def test_entrada_vencida_no_se_lee(backend, monkeypatch):
+    monkeypatch.setattr(cache_backend.time, "time", lambda: 100.0)
+    backend.guardar("a", "finca", b"dato", expira=50.0)
+    assert backend.leer("a") is None
+
+def test_entrada_demasiado_grande_no_se_guarda(backend):
+    @cache_compartido()
+    def lectura(owner):
+        return b"x" * 600   # más de FRACCION_MAX_ENTRADA del total
+
+    lectura("finca")
+    assert backend.tamano()["entradas"] == 0
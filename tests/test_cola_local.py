@@ -0,0 +1,138 @@
+import sqlite3
+
+import psycopg2
+import psycopg2.errors
+import pytest
+
+import cola_local
+import database
+from resiliencia import BDNoDisponible
+
+
+class _HiloQuieto:
+    def despertar(self):
+        pass
+
+
+@pytest.fixture
+def cola(tmp_path, monkeypatch):
+    """Cola local en un SQLite temporal, sin hilo de sincronización ni toasts."""
+    monkeypatch.setattr(cola_local, "RUTA_COLA", str(tmp_path / "cola.sqlite3"))
+    monkeypatch.setattr(cola_local, "_esquema_listo", False)
+    monkeypatch.setattr(cola_local, "get_sincronizador", lambda: _HiloQuieto())
+    monkeypatch.setattr(cola_local.st, "toast", lambda *a, **k: None)
+    return cola_local
+
+def _filas(cola, sql):
+    with sqlite3.connect(cola.RUTA_COLA) as conn:
+        return conn.execute(sql).fetchall()
+
+def _vencer_esperas(cola):
+    with sqlite3.connect(cola.RUTA_COLA) as conn:
+        conn.execute("UPDATE recolecciones_pendientes SET proximo_intento = 0")
+
+
+# --- Escrituras encoladas ---
+
+def test_reenvio_repetido_usa_la_misma_llave(cola, monkeypatch):
+    """Si el COMMIT llegó pero la respuesta no, el siguiente intento lleva la misma clave_idem."""
+    llaves = []
+
+    def add_vale(fecha, trabajador, monto, owner, clave_idem=None):
+        llaves.append(clave_idem)
+        if len(llaves) == 1:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+    monkeypatch.setattr(database, "add_vale", add_vale)
+
+    cola.encolar_escritura("add_vale", ("2025-01-10", "Ana", 5000, "finca"), {"clave_idem": "k1"})
+    assert cola.sincronizar_escrituras() == 0
+    assert _filas(cola, "SELECT estado, intentos FROM escrituras_pendientes") == [("pendiente", 1)]
+    assert cola.sincronizar_escrituras() == 1
+    assert llaves == ["k1", "k1"]
+    assert _filas(cola, "SELECT estado FROM escrituras_pendientes") == [("sincronizado",)]
+    assert cola.sincronizar_escrituras() == 0   # no se vuelve a mandar
+
+def test_sin_llave_y_corte_ambiguo_pasa_a_error(cola, monkeypatch):
+    def add_vale(fecha, trabajador, monto, owner, clave_idem=None):
+        raise psycopg2.OperationalError("SSL SYSCALL error: EOF detected")
+    monkeypatch.setattr(database, "add_vale", add_vale)
+
+    cola.encolar_escritura("add_vale", ("2025-01-10", "Ana", 5000, "finca"), {})
+    cola.sincronizar_escrituras()
+    assert _filas(cola, "SELECT estado FROM escrituras_pendientes") == [("error",)]
+
+def test_bd_aun_caida_conserva_el_orden(cola, monkeypatch):
+    enviadas = []
+
+    def add_vale(fecha, trabajador, monto, owner, clave_idem=None):
+        if monto == 1:
+            raise BDNoDisponible("abierto")
+        enviadas.append(monto)
+    monkeypatch.setattr(database, "add_vale", add_vale)
+
+    for monto in (1, 2):
+        cola.encolar_escritura("add_vale", ("2025-01-10", "Ana", monto, "finca"), {"clave_idem": f"k{monto}"})
+    assert cola.sincronizar_escrituras() == 0
+    assert enviadas == []   # la segunda espera a que pase la primera
+    assert _filas(cola, "SELECT estado FROM escrituras_pendientes ORDER BY id") == [("pendiente",), ("pendiente",)]
+
+def test_rechazo_de_la_bd_no_tranca_las_demas(cola, monkeypatch):
+    def add_vale(fecha, trabajador, monto, owner, clave_idem=None):
+        if monto < 0:
+            raise psycopg2.errors.CheckViolation("monto inválido")
+    monkeypatch.setattr(database, "add_vale", add_vale)
+
+    cola.encolar_escritura("add_vale", ("2025-01-10", "Ana", -1, "finca"), {"clave_idem": "k1"})
+    cola.encolar_escritura("add_vale", ("2025-01-10", "Ana", 5, "finca"), {"clave_idem": "k2"})
+    assert cola.sincronizar_escrituras() == 1
+    assert _filas(cola, "SELECT estado, ultimo_error FROM escrituras_pendientes ORDER BY id") == [
+        ("error", "monto inválido"), ("sincronizado", None)]
+
+def test_solo_se_encolan_escrituras_de_captura(cola):
+    with pytest.raises(ValueError):
+        cola.encolar_escritura("delete_jornada", (), {})
+
+
+# --- Recolecciones del carrito ---
+
+def _confirmar(cola, *trabajadores):
+    for t in trabajadores:
+        cola.registrar_toque("finca", "tel1", t, 2, 1000)
+    return cola.confirmar_carrito("finca", "tel1", "2025-01-10", "Lote 1", 1000)
+
+def test_lote_sube_con_sus_llaves(cola, monkeypatch):
+    subidos = []
+    monkeypatch.setattr(cola, "add_recoleccion_batch", lambda datos, relanzar=False: subidos.extend(datos))
+    _confirmar(cola, "Ana", "Luis")
+    assert cola.sincronizar_lote() == 2
+    claves = {c for (c,) in _filas(cola, "SELECT clave FROM recolecciones_pendientes")}
+    assert {d[6] for d in subidos} == claves
+    assert cola.sincronizar_lote() == 0   # ya no quedan pendientes
+
+def test_caida_deja_pendiente_con_el_error(cola, monkeypatch):
+    def lote(datos, relanzar=False):
+        raise psycopg2.OperationalError("could not connect to server")
+    monkeypatch.setattr(cola, "add_recoleccion_batch", lote)
+    _confirmar(cola, "Ana")
+    for _ in range(cola.MAX_RECHAZOS + 1):
+        cola.sincronizar_lote()
+        _vencer_esperas(cola)
+    # Una caída se reintenta sin límite
+    assert _filas(cola, "SELECT estado, ultimo_error FROM recolecciones_pendientes") == [
+        ("pendiente", "could not connect to server")]
+    assert cola.get_estado_sync("finca")["con_error"] == 1
+
+def test_fila_rechazada_no_frena_el_lote_y_termina_en_error(cola, monkeypatch):
+    def lote(datos, relanzar=False):
+        if any(d[1] == "Malo" for d in datos):
+            raise psycopg2.errors.NotNullViolation("null value in column")
+    monkeypatch.setattr(cola, "add_recoleccion_batch", lote)
+    _confirmar(cola, "Ana", "Malo", "Luis")
+
+    assert cola.sincronizar_lote() == 2   # fila por fila: pasan las buenas
+    for _ in range(cola.MAX_RECHAZOS - 1):
+        _vencer_esperas(cola)
+        cola.sincronizar_lote()
+    assert _filas(cola, "SELECT trabajador, estado FROM recolecciones_pendientes WHERE estado != 'sincronizado'") == [
+        ("Malo", "error")]
+    assert cola.get_estado_sync("finca")["rechazadas"] == 1
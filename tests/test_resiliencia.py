@@ -0,0 +1,213 @@
+import time
+
+import psycopg2
+import psycopg2.errors
+import pytest
+from psycopg2 import pool
+
+import resiliencia
+from resiliencia import (
+    Interruptor, BDNoDisponible, ENCOLADA, es_caida, es_transitorio,
+    reintentar, reenviando, encolar_si_caida,
+)
+
+
+# --- Interruptor ---
+
+def test_interruptor_abre_tras_n_caidas():
+    i = Interruptor(fallos_para_abrir=3, enfriamiento=30)
+    for _ in range(2):
+        i.fallo()
+        i.permitir()   # sigue cerrado
+    i.fallo()
+    assert i.estado == "abierto" and i.aperturas == 1
+    with pytest.raises(BDNoDisponible):
+        i.permitir()
+
+def test_interruptor_exito_reinicia_la_cuenta():
+    i = Interruptor(fallos_para_abrir=2)
+    i.fallo()
+    i.exito()
+    i.fallo()
+    assert i.estado == "cerrado"
+
+def test_interruptor_semiabierto_deja_pasar_una_sola_prueba():
+    i = Interruptor(fallos_para_abrir=1, enfriamiento=30)
+    i.fallo()
+    i.abierto_desde = time.time() - 31   # ya se enfrió
+    i.permitir()
+    assert i.estado == "semiabierto"
+    with pytest.raises(BDNoDisponible):
+        i.permitir()   # la prueba sigue en curso
+
+def test_interruptor_prueba_exitosa_cierra():
+    i = Interruptor(fallos_para_abrir=1, enfriamiento=30)
+    i.fallo()
+    i.abierto_desde = time.time() - 31
+    i.permitir()
+    i.exito()
+    assert i.resumen() == {"estado": "cerrado", "fallos": 0, "aperturas": 1}
+
+def test_interruptor_prueba_fallida_reabre():
+    i = Interruptor(fallos_para_abrir=5, enfriamiento=30)
+    for _ in range(5):
+        i.fallo()
+    i.abierto_desde = time.time() - 31
+    i.permitir()
+    i.fallo()   # en semiabierto basta un fallo
+    assert i.estado == "abierto" and i.aperturas == 2
+    with pytest.raises(BDNoDisponible):
+        i.permitir()
+
+
+# --- Clasificación de errores ---
+
+@pytest.mark.parametrize("exc, caida, transitorio", [
+    (psycopg2.OperationalError("server closed the connection"), True, True),
+    (psycopg2.InterfaceError("connection already closed"), True, True),
+    (psycopg2.errors.QueryCanceled("statement timeout"), False, False),
+    (pool.PoolError("connection pool exhausted"), False, True),
+    (psycopg2.errors.SerializationFailure("could not serialize"), False, True),
+    (psycopg2.errors.DeadlockDetected("deadlock"), False, True),
+    (psycopg2.errors.UniqueViolation("duplicate key"), False, False),
+    (ValueError("otra cosa"), False, False),
+])
+def test_clasificacion(exc, caida, transitorio):
+    assert es_caida(exc) is caida
+    assert es_transitorio(exc) is transitorio
+
+
+# --- Reintentos ---
+
+@pytest.fixture
+def sin_esperas(monkeypatch):
+    esperas = []
+    monkeypatch.setattr(resiliencia.time, "sleep", esperas.append)
+    return esperas
+
+def test_reintentar_repite_fallas_pasajeras(sin_esperas):
+    llamadas = []
+
+    @reintentar(intentos=3, base=0.1, tope=1)
+    def lectura():
+        llamadas.append(1)
+        if len(llamadas) < 3:
+            raise psycopg2.OperationalError("SSL SYSCALL error")
+        return "ok"
+
+    assert lectura() == "ok"
+    assert len(llamadas) == 3 and len(sin_esperas) == 2
+    assert all(0 <= e <= 1 for e in sin_esperas)
+
+def test_reintentar_no_repite_errores_de_sql(sin_esperas):
+    llamadas = []
+
+    @reintentar()
+    def lectura():
+        llamadas.append(1)
+        raise psycopg2.errors.QueryCanceled("statement timeout")
+
+    with pytest.raises(psycopg2.errors.QueryCanceled):
+        lectura()
+    assert len(llamadas) == 1 and not sin_esperas
+
+def test_reintentar_se_rinde_al_agotar_intentos(sin_esperas):
+    @reintentar(intentos=2)
+    def lectura():
+        raise pool.PoolError("connection pool exhausted")
+
+    with pytest.raises(pool.PoolError):
+        lectura()
+    assert len(sin_esperas) == 1
+
+
+# --- Escrituras a la cola local ---
+
+def test_encolar_si_caida_pone_llave_y_retorna_encolada(monkeypatch):
+    import cola_local
+    encoladas = []
+    monkeypatch.setattr(cola_local, "encolar_escritura", lambda f, a, k: encoladas.append((f, a, k)))
+
+    @encolar_si_caida
+    def add_vale(fecha, trabajador, monto, owner, clave_idem=None):
+        raise BDNoDisponible("abierto")
+
+    assert add_vale("2025-01-10", "Ana", 5000, "finca") is ENCOLADA
+    (funcion, args, kwargs), = encoladas
+    assert funcion == "add_vale" and args == ("2025-01-10", "Ana", 5000, "finca")
+    assert len(kwargs["clave_idem"]) == 32
+
+def test_encolar_si_caida_no_reencola_al_reenviar():
+    @encolar_si_caida
+    def add_vale(owner, clave_idem=None):
+        raise BDNoDisponible("abierto")
+
+    with reenviando(), pytest.raises(BDNoDisponible):
+        add_vale("finca", clave_idem="abc")
+
+
+# --- get_db_cursor y el interruptor ---
+
+@pytest.fixture
+def interruptor_probando(monkeypatch):
+    """Interruptor enfriado: el próximo préstamo es la prueba semiabierta."""
+    import database
+    i = Interruptor(fallos_para_abrir=1, enfriamiento=30)
+    i.fallo()
+    i.abierto_desde = time.time() - 31
+    monkeypatch.setattr(database, "INTERRUPTOR", i)
+    return i
+
+def test_clase_desconocida_no_gasta_la_prueba(interruptor_probando):
+    import database
+    with pytest.raises(ValueError):
+        with database.get_db_cursor(clase="rapidisima"):
+            pass
+    assert interruptor_probando.estado == "abierto" and not interruptor_probando._probando
+
+def test_pool_que_no_se_construye_reabre(interruptor_probando, monkeypatch):
+    import database
+
+    def pool_roto():
+        raise psycopg2.OperationalError("could not connect to server")
+    monkeypatch.setattr(database, "get_connection_pool", pool_roto)
+    with pytest.raises(psycopg2.OperationalError):
+        with database.get_db_cursor():
+            pass
+    # La prueba terminó en fallo(): vuelve a abierto, no queda probando para siempre
+    assert interruptor_probando.estado == "abierto" and not interruptor_probando._probando
+
+
+# --- Pool con espera y hilos de consulta ---
+
+class _ConexionFalsa:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+def _pool_falso(monkeypatch, maxconn, espera):
+    import database
+    monkeypatch.setattr(psycopg2, "connect", lambda *a, **k: _ConexionFalsa())
+    return database.PoolConEspera(0, maxconn, espera=espera)
+
+def test_pool_lleno_espera_y_luego_presta(monkeypatch):
+    import threading
+    p = _pool_falso(monkeypatch, maxconn=1, espera=5)
+    conn = p.getconn()
+    threading.Timer(0.1, p.putconn, args=(conn,)).start()
+    assert p.getconn() is not None   # esperó el cupo en vez de fallar
+
+def test_pool_lleno_se_rinde_tras_la_espera(monkeypatch):
+    p = _pool_falso(monkeypatch, maxconn=1, espera=0.05)
+    p.getconn()
+    with pytest.raises(pool.PoolError):
+        p.getconn()
+
+def test_lanzar_suelta_el_contexto_de_la_sesion(monkeypatch):
+    import database
+    ctx = object()
+    monkeypatch.setattr(database, "get_script_run_ctx", lambda: ctx)
+    monkeypatch.setattr(database, "add_script_run_ctx", lambda hilo, c: setattr(hilo, "ctx_prueba", c))
+    hilo = database.lanzar(lambda: __import__("threading").current_thread()).result()
+    assert not hasattr(hilo, "ctx_prueba")
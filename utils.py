@@ -1,8 +1,12 @@
+import os
 import streamlit as st
-from decimal import Decimal
+from perfilador import seccion
+from auth import restaurar_sesion, recordar_sesion
+from cache_backend import invalidar_owner
 from database import (
     get_all_fincas, get_all_trabajadores, get_trabajadores_por_tipo,
-    get_catalogo_productos, get_catalogo_labores
+    get_catalogo_productos, get_catalogo_labores,
+    get_resumen_semanal, calcular_resumen_periodo
 )
 
 # ==========================================
@@ -10,14 +14,27 @@ from database import (
 # ==========================================
 
 def check_login():
-    """Verifica si el usuario entró. Si no, lo manda al inicio."""
+    """Verifica si el usuario entró (o trae token en la URL). Si no, lo manda al inicio."""
     if "logged_in" not in st.session_state or not st.session_state.logged_in:
-        st.switch_page("app.py")
+        if not restaurar_sesion():
+            st.switch_page("app.py")
+    recordar_sesion()
     return st.session_state.user
 
+def es_admin(usuario):
+    """
+    Secciones ocultas (diagnóstico): solo con ?admin=1 en la URL y solo para
+    los usuarios de FINCA_ADMINS (separados por coma). Sin FINCA_ADMINS, nadie.
+    """
+    if st.query_params.get("admin") != "1":
+        return False
+    admins = {u.strip() for u in os.getenv("FINCA_ADMINS", "").split(",") if u.strip()}
+    return usuario in admins
+
 def mostrar_encabezado(titulo="Finca App"):
     """Muestra el botón de volver y el título de la página con estilo moderno."""
-    aplicar_estilos_css() # Inyectamos el diseño aquí
+    with seccion("estilos css"):
+        aplicar_estilos_css() # Inyectamos el diseño aquí
     
     # Grid: Botón Volver (pequeño) | Título (Grande)
     c1, c2 = st.columns([1, 4], gap="small")
@@ -119,33 +136,42 @@ def aplicar_estilos_css():
 # 3. LÓGICA DE DATOS (Cache y Utilidades)
 # ==========================================
 
-def normalize_decimal(value):
-    """Convierte Decimals de la BD a float para que Python no falle."""
-    if isinstance(value, Decimal): return float(value)
-    if isinstance(value, (list, tuple)): return type(value)(normalize_decimal(v) for v in value)
-    return value
+# Las lecturas de database.py ya pasan por la caché compartida (cache_backend,
+# versiones por dueño y tabla); estos loaders solo agregan el spinner y los
+# valores por defecto de las páginas.
 
-@st.cache_data(ttl=60, show_spinner=False)
 def cargar_fincas(owner):
-    return normalize_decimal(get_all_fincas(owner))
+    return get_all_fincas(owner)
 
-@st.cache_data(ttl=60, show_spinner=False)
 def cargar_personal(owner, tipo=None):
     if tipo:
-        try: return normalize_decimal(get_trabajadores_por_tipo(owner, tipo))
+        try: return get_trabajadores_por_tipo(owner, tipo)
         except: return []
-    return normalize_decimal(get_all_trabajadores(owner))
+    return get_all_trabajadores(owner)
 
-@st.cache_data(ttl=60, show_spinner=False)
 def cargar_productos(owner):
     return get_catalogo_productos(owner)
 
-@st.cache_data(ttl=60, show_spinner=False)
 def cargar_labores(owner):
     return get_catalogo_labores(owner)
 
-def limpiar_cache():
+# --- Reportes: llave = (owner, rango de fechas) ---
+# Cada sección de Reportes pide solo su reporte; volver a la misma sección o
+# al mismo rango sale de la caché en vez de repetir los GROUP BY. st.spinner
+# solo aparece si tarda: un acierto de caché no parpadea.
+
+def cargar_resumen_semanal(owner, ini, fin):
+    with st.spinner("Calculando planilla..."):
+        return get_resumen_semanal(owner, ini, fin)
+
+def cargar_resumen_periodo(owner, ini, fin):
+    with st.spinner("Calculando gastos..."):
+        return calcular_resumen_periodo(ini, fin, owner)
+
+def limpiar_cache(owner=None):
+    """Tras guardar: limpia st.cache_data local y sube la versión del dueño en la caché compartida."""
     st.cache_data.clear()
+    invalidar_owner(owner or st.session_state.get("user"))
 
 def smart_select(label, options, key_name):
     """Crea un selectbox que recuerda qué elegiste la última vez."""